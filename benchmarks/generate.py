@@ -0,0 +1,95 @@
+'''
+Synthetic gsd trajectories of random-walk polymers for the benchmarks.
+
+Chains are random walks of unit bonds at random positions in a cubic box.
+From frame to frame every chain diffuses by a Gaussian step and every bead
+fluctuates around its place in the chain, so bonds stay short. The
+positions are wrapped into the periodic box, image flags and bonds are
+written, so both unwrapping methods can be measured.
+'''
+
+import argparse
+
+import gsd.hoomd
+import numpy as np
+
+def random_walk_gsd(gsd_fn, nchains=10, length=100, nframes=100, box=None, seed=0,
+                    diffusion=0.1, bond_length=1.0):
+    '''Write a trajectory of random-walk polymers.
+
+    Parameters
+    ----------
+    gsd_fn : str
+    nchains : int
+    length : int
+        Beads per chain.
+    nframes : int
+    box : float, optional
+        Edge of the cubic box, default gives a bead density of 0.5.
+    seed : int
+    diffusion : float
+        Standard deviation of the chain displacements between two frames.
+    bond_length : float
+
+    Returns
+    -------
+    gsd_fn : str
+    '''
+
+    rng = np.random.default_rng(seed)
+    natoms = nchains*length
+    if box is None:
+        box = (natoms/0.5)**(1/3)
+
+    bonds = np.arange(natoms, dtype=np.uint32).reshape(nchains, length)
+    bonds = np.stack([bonds[:, :-1].ravel(), bonds[:, 1:].ravel()], axis=1)
+
+    steps = rng.normal(size=(nchains, length, 3))
+    steps *= bond_length/np.linalg.norm(steps, axis=-1, keepdims=True)
+    steps[:, 0] = rng.uniform(-box/2, box/2, size=(nchains, 3))
+    chains = np.cumsum(steps, axis=1)
+    offsets = np.zeros((nchains, 1, 3))
+
+    with gsd.hoomd.open(gsd_fn, 'w') as f:
+        for t in range(nframes):
+
+            if t > 0:
+                offsets += rng.normal(scale=diffusion, size=offsets.shape)
+            jitter = rng.normal(scale=0.1*bond_length, size=chains.shape)
+            positions = (chains + offsets + jitter).reshape(natoms, 3)
+            images = np.floor(positions/box + 0.5).astype(np.int32)
+
+            frame = gsd.hoomd.Frame()
+            frame.configuration.step = t*1000
+            frame.configuration.box = [box, box, box, 0, 0, 0]
+            frame.particles.N = natoms
+            frame.particles.types = ['A', 'B']
+            frame.particles.typeid = (np.arange(natoms) % length == 0).astype(np.uint32)
+            frame.particles.mass = np.ones(natoms, dtype=np.float32)
+            frame.particles.position = (positions - images*box).astype(np.float32)
+            frame.particles.image = images
+            frame.bonds.N = len(bonds)
+            frame.bonds.types = ['b']
+            frame.bonds.typeid = np.zeros(len(bonds), dtype=np.uint32)
+            frame.bonds.group = bonds
+            f.append(frame)
+
+    return gsd_fn
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description='Write a random-walk polymer trajectory.')
+
+    parser.add_argument('-out', type=str, default='polymers.gsd', help='output ".gsd" file.')
+    parser.add_argument('-nchains', type=int, default=10, help='number of chains.')
+    parser.add_argument('-length', type=int, default=100, help='beads per chain.')
+    parser.add_argument('-nframes', type=int, default=100, help='number of frames.')
+    parser.add_argument('-box', type=float, default=None, help='edge of the cubic box.')
+    parser.add_argument('-seed', type=int, default=0, help='random seed.')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = parse_args()
+    random_walk_gsd(args.out, args.nchains, args.length, args.nframes, args.box, args.seed)
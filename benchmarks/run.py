@@ -0,0 +1,241 @@
+'''
+Time and peak memory of loading, unwrapping and the analyses of mdtrj.
+
+Every case runs on synthetic random-walk polymers (see ``generate.py``) of
+several sizes. A case is run once to compile the numba kernels and warm
+the page cache. Then each repeat is timed, and the peak memory of one
+repeat is traced by ``tracemalloc``. tracemalloc counts numpy buffers, but
+not the scratch arrays of numba kernels. Results are written as JSON, and
+two result files are compared with ``-compare``:
+
+    $ python benchmarks/run.py -sizes small medium -out new.json
+    $ python benchmarks/run.py -compare base.json new.json
+'''
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+from importlib import metadata
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mdtrj
+
+from generate import random_walk_gsd
+
+'''
+Systems of the benchmarks, (nchains, length, nframes).
+'''
+sizes = {'small' : (10, 100, 100),
+         'medium' : (100, 100, 500),
+         'large' : (500, 100, 1000)}
+
+def _file(fn):
+    return (fn,)
+
+def _wrapped(fn):
+    return (mdtrj.load(fn),)
+
+def _unwrapped(fn):
+    return (mdtrj.load(fn, parse_boundary='image'),)
+
+def _analyzed(fn):
+    '''An unwrapped trajectory whose gyration analysis is in the results cache.'''
+
+    trj = mdtrj.load(fn, parse_boundary='image')
+    mdtrj.gyration_analyze(trj)
+
+    return (trj,)
+
+def _chain_ends(fn):
+    '''A wrapped trajectory and the (first, last) atoms of every chain.'''
+
+    trj = mdtrj.load(fn)
+    molecules = trj.topology.get_molecules()
+    _, first = np.unique(molecules, return_index=True)
+    _, last = np.unique(molecules[::-1], return_index=True)
+
+    return trj, np.stack([first, len(molecules)-1-last], axis=1)
+
+'''
+Benchmark cases, name: (setup, run). setup(fn) prepares the arguments of
+run outside of the measurements, it is called before every repeat.
+'''
+cases = {
+    'load' : (_file, lambda fn: mdtrj.load(fn)),
+    'load_image' : (_file, lambda fn: mdtrj.load(fn, parse_boundary='image')),
+    'parse_boundary' : (_wrapped, lambda trj: trj.parse_boundary()),
+    'gyration_analyze' : (_unwrapped, lambda trj: mdtrj.gyration_analyze(trj, cache=False)),
+    'gyration_cache_miss' : (_unwrapped, lambda trj: mdtrj.gyration_analyze(trj)),
+    'gyration_cache_hit' : (_analyzed, lambda trj: mdtrj.gyration_analyze(trj)),
+    'compute_distance' : (_chain_ends, lambda trj, pairs: mdtrj.compute_distance(trj, pairs,
+                                                                                 periodic=True)),
+    'compute_rcm' : (_unwrapped, lambda trj: mdtrj.compute_rcm(trj)),
+    'compute_molecule_rcm' : (_unwrapped, lambda trj: mdtrj.compute_molecule_rcm(trj)),
+    'compute_msd' : (_unwrapped, lambda trj: mdtrj.compute_msd(trj, mode='molecule')),
+}
+
+def system_file(size, data_dir):
+    '''The gsd file of a size, generated if it does not exist.'''
+
+    nchains, length, nframes = sizes[size]
+    fn = os.path.join(data_dir, f'polymers_{nchains}x{length}_{nframes}.gsd')
+
+    if not os.path.exists(fn):
+        os.makedirs(data_dir, exist_ok=True)
+        random_walk_gsd(fn + '.tmp', nchains, length, nframes)
+        os.replace(fn + '.tmp', fn)
+
+    return fn
+
+def measure(setup, run, fn, repeat=3):
+    '''Times of every repeat and the peak traced memory of one run.
+
+    Returns
+    -------
+    times : list of float
+        In seconds.
+    peak : int
+        In bytes.
+    '''
+
+    run(*setup(fn))
+
+    times = []
+    for _ in range(repeat):
+        args = setup(fn)
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+        del args
+
+    args = setup(fn)
+    tracemalloc.start()
+    run(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return times, peak
+
+def run_benchmarks(size_names, case_names, repeat=3, data_dir=None):
+    '''Run the cases on the systems of the sizes.
+
+    Returns
+    -------
+    report : dict
+        ``{'meta' : {...}, 'results' : [{...}, ]}``, one result per case and size.
+    '''
+
+    data_dir = data_dir or os.path.join(tempfile.gettempdir(), 'mdtrj_benchmarks')
+    results = []
+
+    for size in size_names:
+        fn = system_file(size, data_dir)
+        nchains, length, nframes = sizes[size]
+
+        for name in case_names:
+            setup, run = cases[name]
+            times, peak = measure(setup, run, fn, repeat)
+            results.append({'case' : name,
+                            'size' : size,
+                            'natoms' : nchains*length,
+                            'nframes' : nframes,
+                            'times' : times,
+                            'best' : min(times),
+                            'median' : float(np.median(times)),
+                            'peak_bytes' : peak})
+            print(f'{size:>8} {name:>22} {np.median(times):10.4f} s {peak/1024**2:10.1f} MB',
+                  flush=True)
+
+    return {'meta' : _metadata(repeat), 'results' : results}
+
+def compare(base_fn, new_fn, threshold=1.2):
+    '''Print the ratios new/base of the median times and the peak memory.
+
+    Returns
+    -------
+    regressions : list
+        (case, size) whose time or memory ratio exceeds threshold.
+    '''
+
+    with open(base_fn, 'r') as f:
+        base = {(r['case'], r['size']) : r for r in json.load(f)['results']}
+    with open(new_fn, 'r') as f:
+        new = {(r['case'], r['size']) : r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f'{"size":>8} {"case":>22} {"time":>8} {"memory":>8}')
+    for key in sorted(base.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        time_ratio = new[key]['median']/max(base[key]['median'], 1e-12)
+        memory_ratio = new[key]['peak_bytes']/max(base[key]['peak_bytes'], 1)
+        # Differences below a millisecond are timing noise
+        slower = time_ratio > threshold and new[key]['median'] - base[key]['median'] > 1e-3
+        flag = ''
+        if slower or memory_ratio > threshold:
+            regressions.append(key)
+            flag = '  <- regression'
+        print(f'{key[1]:>8} {key[0]:>22} {time_ratio:8.2f} {memory_ratio:8.2f}{flag}')
+
+    return regressions
+
+def _metadata(repeat):
+
+    packages = {}
+    for name in ['numpy', 'numba', 'gsd', 'scipy']:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {'commit' : commit,
+            'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python' : platform.python_version(),
+            'packages' : packages,
+            'platform' : platform.platform(),
+            'cpu_count' : os.cpu_count(),
+            'repeat' : repeat}
+
+def parse_args():
+
+    parser = argparse.ArgumentParser(description='Benchmarks of mdtrj.')
+
+    parser.add_argument('-sizes', nargs='+', default=['small', 'medium'], choices=list(sizes),
+                        help='system sizes to run.')
+    parser.add_argument('-cases', nargs='+', default=list(cases), choices=list(cases),
+                        help='cases to run.')
+    parser.add_argument('-repeat', type=int, default=3, help='timed repeats of every case.')
+    parser.add_argument('-dir', type=str, default=None, help='directory of the generated files.')
+    parser.add_argument('-out', type=str, default='benchmarks.json', help='output ".json" file.')
+    parser.add_argument('-compare', nargs=2, default=None, metavar=('BASE', 'NEW'),
+                        help='compare two result files instead of running.')
+    parser.add_argument('-threshold', type=float, default=1.2,
+                        help='ratio new/base reported as a regression.')
+
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = parse_args()
+
+    if args.compare is not None:
+        regressions = compare(*args.compare, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    report = run_benchmarks(args.sizes, args.cases, args.repeat, args.dir)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -1,7 +1,20 @@
 from .core.topology import *
 from .core.trajectory import *
+from .core.cache import clear_cache
+from .core.selection import Selection
 from .configuration.gyration import *
+from .configuration.rdf import RDF
+from .configuration.rdf import compute_rdf
+from .dynamics.correlation import correlate
+from .dynamics.correlation import compute_vacf
+from .dynamics.correlation import compute_gyration_acf
+from .dynamics.correlation import compute_end_to_end_acf
+from .dynamics.msd import compute_msd
 from .geometry.distance import *
+from .geometry.neighbors import neighbor_search
+from .geometry.neighbors import compute_contact_map
 from .geometry.rcm import compute_rcm
+from .geometry.rcm import compute_molecule_rcm
 from .geometry.area import compute_area_3d
-from .geometry.area import compute_normal_vector_3d
\ No newline at end of file
+from .geometry.area import compute_normal_vector_3d
+from .geometry.area import compute_loop_geometry
\ No newline at end of file
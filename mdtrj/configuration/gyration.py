@@ -1,23 +1,24 @@
-
 import numpy as np
 from numba import njit, prange
-from multiprocessing import Pool
-import copy
 
-import mdtrj.settings as set
+from mdtrj.core.topology import molecule_segments
+from mdtrj.core.selection import Selection, as_index
+from mdtrj.core.results import results_cache, trajectory_fingerprint, array_key
+from mdtrj.core.executor import get_executor
 
-def release_gyration_memory():
+'''
+Keys of the gyration analysis results.
+'''
+gyration_keys = ['gyration tensor', 'Rg', 'tan2XG', 'Asphericity', 'Acylindericity', 'Anistropy']
 
-    set.gyration_results_collector = {
-    'gyration tensor':None,
-    'Rg' : None,
-    'tan2XG' : None,
-    'Asphericity' : None,
-    'Acylindericity' : None,
-    'Anistropy' : None,
-}
+def release_gyration_memory():
+    '''Release the cached gyration analysis results.'''
+    
+    results_cache.clear('gyration')
+    results_cache.clear('molecule gyration')
 
-def gyration_analyze(trajectory, atom_selections=[], parallel=False, processes=10):
+def gyration_analyze(trajectory, atom_selections=[], parallel=False, processes=None, 
+                     mass_weighted=False, dtype=float, cache=True):
 
     '''
     
@@ -25,12 +26,22 @@ def gyration_analyze(trajectory, atom_selections=[], parallel=False, processes=1
     ----------
     trajectory : mdtrj.trajectory or [mdtrj.trajecotry, ]
         A mdtrj.trajectory object or a list of trajecory.
-    atom_selections : list
-        The atom ids for gyration analyzing.
+    atom_selections : list or mdtrj.core.selection.Selection
+        The atom ids for gyration analyzing, e.g. ``topology.select(types=0)``.
+        For a list of trajectories, a list with one selection (Selection,
+        list or 1D numpy array, of any lengths) per trajectory, otherwise
+        the same atoms of every trajectory.
     parallel : bool
         Using parallel for calculation.
-    processes : int
-        Number of processes for parallel.
+    processes : int, optional
+        Number of processes for parallel, default reuses the running
+        workers, see ``mdtrj.core.executor.get_executor``.
+    mass_weighted : bool
+        Weight the atoms with ``Topology.masses``.
+    dtype : numpy dtype
+        Precision of the accumulation, float32 or float64.
+    cache : bool
+        Reuse and keep the results in ``mdtrj.core.results.results_cache``.
         
     Returns
     -------
@@ -42,75 +53,189 @@ def gyration_analyze(trajectory, atom_selections=[], parallel=False, processes=1
     '''
     
     results = {}
-    for key in set.gyration_results_collector.keys():
-        results.update({key:[]})
-        
-    for key in results.keys():
+    for key in gyration_keys:
         results[key] = []
         
     if not isinstance(trajectory, list):
-        _results = _perform_gyration_compute(trajectory, atom_selections)
+        _results = _cached_gyration_compute([trajectory], [atom_selections], mass_weighted, 
+                                            dtype, cache)[0]
         for key,i in zip(results.keys(), range(len(results.keys()))):
             results[key] = _results[i]
         
     else:
-        if np.array(atom_selections, dtype=int).ndim != 2:
+        if not _per_trajectory(atom_selections, len(trajectory)):
             atom_selections = [atom_selections]*len(trajectory)
-        if parallel:
-            params = []
-            for i, trj in enumerate(trajectory):
-                params.append([trj, atom_selections[i]])
-            with Pool(processes=processes) as pool:
-                multi_results = pool.starmap(_perform_gyration_compute, params)
-                pool.close()
-                pool.join()
-        else:
-            multi_results = []
-            for i, trj in enumerate(trajectory):
-                multi_results.append(_perform_gyration_compute(trj, atom_selections[i]))
+        multi_results = _cached_gyration_compute(trajectory, atom_selections, mass_weighted, 
+                                                 dtype, cache, parallel, processes)
         
         for res in multi_results:
             for key,i in zip(results.keys(), range(len(results.keys()))):
                 results[key].append(res[i])
-                
-    # set.gyration_results_collector = copy.deepcopy(results)
-    # set.gyration_atom_selections = atom_selections
         
     return results
 
-def compute_gyration_tensor(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_gyration_tensor(trajectory, atom_selections=[], parallel=False, processes=None, 
+                            mass_weighted=False, dtype=float):
     ''''A function computes the gyration tensors for a trajectory.'''
-    set.gyration_results_collector = gyration_analyze(trajectory, atom_selections, parallel, processes)
-    return set.gyration_results_collector['gyration tensor']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['gyration tensor']
 
-def compute_rg(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_rg(trajectory, atom_selections=[], parallel=False, processes=None, 
+               mass_weighted=False, dtype=float):
     '''A function computes the radius of gyration for a trajectory.'''
-    return set.gyration_results_collector['Rg']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['Rg']
     
-def compute_tan2xg(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_tan2xg(trajectory, atom_selections=[], parallel=False, processes=None, 
+                   mass_weighted=False, dtype=float):
     '''A function computes the alignment of gyration tensor for a trajectory.'''
-    return set.gyration_results_collector['tan2XG']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['tan2XG']
 
-def compute_asphericity(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_asphericity(trajectory, atom_selections=[], parallel=False, processes=None, 
+                        mass_weighted=False, dtype=float):
     '''A function computes the asphericity for a trajectory.'''
-    return set.gyration_results_collector['Asphericity']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['Asphericity']
     
-def compute_acylindericity(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_acylindericity(trajectory, atom_selections=[], parallel=False, processes=None, 
+                           mass_weighted=False, dtype=float):
     '''A function computes the acylindericity for a trajectory.'''
-    return set.gyration_results_collector['Acylindericity']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['Acylindericity']
 
-def compute_anistropy(trajectory, atom_selections=[], parallel=False, processes=8):
+def compute_anistropy(trajectory, atom_selections=[], parallel=False, processes=None, 
+                      mass_weighted=False, dtype=float):
     '''A function computes the anistropy for a trajectory.'''
-    return set.gyration_results_collector['Anistropy']
+    return gyration_analyze(trajectory, atom_selections, parallel, processes, 
+                            mass_weighted, dtype)['Anistropy']
+
+def _per_trajectory(atom_selections, ntrajectories):
+    '''Whether ``atom_selections`` holds one selection per trajectory.'''
+    
+    # A flat list of atom ids, or all atoms
+    if isinstance(atom_selections, Selection) or len(atom_selections) == 0 or \
+       np.ndim(atom_selections[0]) == 0:
+        return False
+    
+    if len(atom_selections) != ntrajectories:
+        raise ValueError(f'{len(atom_selections)} atom selections given for {ntrajectories} '
+                         'trajectories')
+    
+    return True
+
+def _cached_gyration_compute(trajectories, atom_selections, mass_weighted=False, dtype=float, 
+                             cache=True, parallel=False, processes=None):
+    '''Compute the gyration analysis of trajectories, only missed in the cache.'''
+    
+    # Hashing the coordinates is skipped without the cache
+    keys = [None]*len(trajectories)
+    if cache:
+        keys = [('gyration', trajectory_fingerprint(trj), array_key(sel), mass_weighted, 
+                 np.dtype(dtype).str) for trj, sel in zip(trajectories, atom_selections)]
+    
+    multi_results = [results_cache.get(key) if cache else None for key in keys]
+    missed = [i for i, res in enumerate(multi_results) if res is None]
+    
+    params = []
+    for i in missed:
+        params.append([trajectories[i], atom_selections[i], mass_weighted, dtype])
+    
+    if parallel and len(missed) > 1:
+        computed = get_executor(processes).starmap(_perform_gyration_compute, params)
+    else:
+        computed = [_perform_gyration_compute(*param) for param in params]
+        
+    for i, res in zip(missed, computed):
+        res = tuple(res)
+        if cache:
+            results_cache.put(keys[i], res, owner=trajectories[i].coords)
+        multi_results[i] = res
+        
+    return multi_results
+
+def molecule_gyration_analyze(trajectory, molecules=None, mass_weighted=False, dtype=float, 
+                              cache=True):
+    '''Gyration analysis of every molecule in one pass.
+    
+    Parameters
+    ----------
+    trajectory : mdtrj.trajectory
+    molecules : 1D numpy array, optional
+        Molecule id of every atom, default is ``Topology.get_molecules()``,
+        i.e. the connected components of bonds.
+    mass_weighted : bool
+        Weight the atoms with ``Topology.masses``.
+    dtype : numpy dtype
+        Precision of the accumulation, float32 or float64.
+    cache : bool
+        Reuse and keep the results in ``mdtrj.core.results.results_cache``.
+        
+    Returns
+    -------
+    results : dict
+        The same keys as ``gyration_analyze`` and 'COM', every result has
+        the shape (nframes, nmolecules, ...). Molecules are in the order of
+        ``np.unique(molecules)``.
+    '''
+    
+    if molecules is None:
+        molecules = trajectory.topology.get_molecules()
+        
+    if not cache:
+        return _perform_molecule_gyration_compute(trajectory, molecules, mass_weighted, dtype)
+        
+    key = ('molecule gyration', trajectory_fingerprint(trajectory), array_key(molecules), 
+           mass_weighted, np.dtype(dtype).str)
+    results = results_cache.get_or_compute(key, _perform_molecule_gyration_compute, trajectory, 
+                                           molecules, mass_weighted, dtype, 
+                                           owner=trajectory.coords)
+    
+    return dict(results)
 
+def _perform_molecule_gyration_compute(trajectory, molecules, mass_weighted=False, dtype=float):
+    '''Perform the gyration analysis of every molecule.'''
+    
+    order, offsets = molecule_segments(molecules)
+    
+    natoms = trajectory.coords.shape[1]
+    if mass_weighted:
+        weights = _atom_weights(trajectory.topology, natoms)[order]
+    else:
+        weights = np.ones(natoms)
+    weights = np.ascontiguousarray(weights, dtype=dtype)
+        
+    # Atoms sorted by molecules already need no gather
+    if np.array_equal(order, np.arange(natoms)):
+        order = slice(None)
+    
+    gyrations = []
+    rcms = []
+    for coords in trajectory.iter_chunks():
+        coords = np.ascontiguousarray(coords[:, order], dtype=dtype)
+        gyr, rcm = _cal_gyra_tensors(coords, offsets, weights)
+        gyrations.append(gyr)
+        rcms.append(rcm)
+        
+    gyrations = np.concatenate(gyrations)
+    
+    results = {}
+    for key, res in zip(gyration_keys, 
+                        (gyrations,)+_cal_gyra_shapes(gyrations)):
+        results[key] = res
+    results['COM'] = np.concatenate(rcms)
+    
+    return results
 
-def _perform_gyration_compute(trajectory, atom_selections=[]):
+def _perform_gyration_compute(trajectory, atom_selections=[], mass_weighted=False, dtype=float):
     '''Compute the gyration tensor of polymer
     
     Parameters:
     trajectory : mdtrj.Trajectory
-    atom_selections : 1d Numpy Array, optional
+    atom_selections : 1d Numpy Array or mdtrj.core.selection.Selection, optional
         If selections are not sepcified, the whole polymer will be considered.
+    mass_weighted : bool, optional
+    dtype : numpy dtype, optional
     
     Returns:
     results : list
@@ -118,35 +243,52 @@ def _perform_gyration_compute(trajectory, atom_selections=[]):
     '''
     results = []
     
-    coords = []
+    # A slice for contiguous atoms, gathers are views then
+    index = as_index(atom_selections)
+        
+    weights = None
+    if mass_weighted:
+        weights = _atom_weights(trajectory.topology, trajectory.coords.shape[1])
+        if index is not None:
+            weights = weights[index]
     
-    if len(atom_selections) != 0:
-        atom_selections = np.array(atom_selections, dtype=int)
-
-        for crd in trajectory.coords:
-            coords.append(crd[atom_selections])
+    # Only one chunk of frames is kept in memory for lazy trajectories
+    for coords in trajectory.iter_chunks():
+        
+        if index is not None:
+            coords = coords[:, index]
             
-        coords = np.array(coords, dtype=float)
-    
-    else:
-        coords = trajectory.coords
+        results.append(_cal_gyra_full(coords, weights, dtype))
    
-    results = list(_cal_gyra_full(coords)) 
-    
-    for i in range(len(results)):
-        results[i] = np.array(results[i], dtype=float)
+    results = [np.concatenate(res) for res in zip(*results)]
         
     return results
 
-# @njit(cache=True)
-def _cal_gyra_full(coords):
+def _atom_weights(topology, natoms):
+    '''Masses of all atoms as a 1D array.'''
+    
+    masses = topology.masses
+    
+    if isinstance(masses, (float, int)):
+        return np.full(natoms, float(masses))
+    
+    return np.array(masses, dtype=float)
+
+def _cal_gyra_full(coords, weights=None, dtype=float):
 
     ''''A function calculates the gyrations of a trajectory.
     
+    All frames are computed at one time, the gyration tensors by a parallel
+    numba kernel and the eigen values by a batched symmetric solver.
+    
     Parameters
     ----------
     coords : 3D numpy array
         First dimension must be the time line.
+    weights : 1D numpy array, optional
+        Weights of atoms, e.g. masses. Default is uniform.
+    dtype : numpy dtype, optional
+        Precision of the accumulation.
         
     Returns
     -------
@@ -163,75 +305,108 @@ def _cal_gyra_full(coords):
     anisos : 1D Numpy array
         Anistropy of gyration tensors.
     '''
-
-    nsteps = coords.shape[0]
     
-    gyrations = np.zeros((nsteps, 3, 3))
-    Rgs = np.zeros(nsteps)
-    tan2XGs = np.zeros((nsteps, 3))
-    asphers = np.zeros(nsteps)
-    acylinds = np.zeros(nsteps)
-    anisos = np.zeros(nsteps)
+    coords = np.ascontiguousarray(coords, dtype=dtype)
     
-    # for step_id in prange(coords.shape[0]):
-    for step_id in range(coords.shape[0]):
-        coords_i = coords[step_id]
-        res = _cal_gyra(coords_i)
-        
-        gyrations[step_id] = res[0]
-        Rgs[step_id] = res[1]
-        tan2XGs[step_id] = res[2]
-        asphers[step_id] = res[3]
-        acylinds[step_id] = res[4]
-        anisos[step_id] = res[5]
+    if weights is None:
+        weights = np.ones(coords.shape[1], dtype=dtype)
+    else:
+        weights = np.ascontiguousarray(weights, dtype=dtype)
     
-    return gyrations, Rgs, tan2XGs, asphers, acylinds, anisos
-        
+    offsets = np.array([0, coords.shape[1]], dtype=np.int64)
+    gyrations = _cal_gyra_tensors(coords, offsets, weights)[0][:, 0]
     
-@njit(cache=True)
-def _cal_gyra(coords):
-    '''Calculate gyration of polymer at specific step.
+    return (gyrations,) + _cal_gyra_shapes(gyrations)
+
+def _cal_gyra_shapes(gyrations):
+    '''Calculate the shape descriptors of gyration tensors.
     
-    Parameters:
-        coords : 2D Numpy array
+    Parameters
+    ----------
+    gyrations : numpy array
+        Gyration tensors, the last two dimensions are [3x3].
         
-    Returns:
-        gyration : 2D [3x3] numpy array.
+    Returns
+    -------
+    Rgs, tan2XGs, asphers, acylinds, anisos : numpy array
     '''
     
-    gyration = np.zeros((3,3)) # Gyration tensor
-    Rg = 0.0 # Radius of gyration tensor
-    tan2XG = np.zeros(3) # Alignment angle of gyration tensor
-    b = 0.0 # Asphericity
-    c = 0.0 # Acylindricity
-    k_sq = 0.0 # Anisotropy 
+    gxx, gyy, gzz = gyrations[...,0,0], gyrations[...,1,1], gyrations[...,2,2]
+    gxy, gxz, gyz = gyrations[...,0,1], gyrations[...,0,2], gyrations[...,1,2]
     
-    rcm = np.sum(coords, axis=0)/coords.shape[0]
-    r_to_rcm = coords - rcm
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tan2XGs = np.stack([2*gxy/(gxx-gyy), 2*gxz/(gxx-gzz), 2*gyz/(gyy-gzz)], axis=-1)
     
-    for atom_id in prange(coords.shape[0]):
-        for i in prange(3):
-            for j in prange(3):
-                vec = r_to_rcm[atom_id]
-                gyration[i, j] += vec[i]*vec[j]
-                
-    gyration = gyration/coords.shape[0]
+        # Eigen values in ascending order
+        eigs = np.linalg.eigvalsh(gyrations)
+        ex, ey, ez = eigs[...,0], eigs[...,1], eigs[...,2]
+        Rg_sq = ex + ey + ez
+        Rgs = np.sqrt(Rg_sq)
+        
+        asphers = ez - (ex + ey)/2
+        acylinds = ey - ex
+        anisos = (asphers*asphers + (3/4)*acylinds*acylinds)/(Rg_sq*Rg_sq)
     
-    gxx, gyy, gzz = gyration[0,0], gyration[1,1], gyration[2,2]
-    gxy, gxz, gyz = gyration[0,1], gyration[0,2], gyration[1,2]
-    tan2XG[0] = 2*gxy/(gxx-gyy)
-    tan2XG[1] = 2*gxz/(gxx-gzz)
-    tan2XG[2] = 2*gyz/(gyy-gzz)
+    return Rgs, tan2XGs, asphers, acylinds, anisos
+        
+@njit(parallel=True, cache=True)
+def _cal_gyra_tensors(coords, offsets, weights):
+    '''Calculate the gyration tensors of all frames and molecules.
     
-    ex, ey, ez = np.sort(np.linalg.eigvals(gyration))
-    Rg_sq = ex + ey +ez
-    Rg = np.sqrt(Rg_sq)
+    Parameters:
+        coords : 3D Numpy array
+            Atoms must be sorted by molecules.
+        offsets : 1D Numpy array
+            Atoms of molecule i are coords[:, offsets[i]:offsets[i+1]].
+        weights : 1D Numpy array
+        
+    Returns:
+        gyrations : 4D [frames x molecules x 3 x 3] numpy array.
+        rcms : 3D [frames x molecules x 3] numpy array.
+    '''
     
-    b = ez - (ex + ey)/2
-    c = ey - ex
-    k_sq = (b*b + (3/4)*c*c)/(Rg_sq*Rg_sq)
-
-    return gyration, Rg, tan2XG, b, c, k_sq
+    nsteps, nmols = coords.shape[0], offsets.shape[0]-1
+    gyrations = np.zeros((nsteps, nmols, 3, 3), dtype=coords.dtype)
+    rcms = np.zeros((nsteps, nmols, 3), dtype=coords.dtype)
     
-            
-    
\ No newline at end of file
+    for k in prange(nsteps*nmols):
+        
+        step_id, mol_id = k//nmols, k%nmols
+        a0, a1 = offsets[mol_id], offsets[mol_id+1]
+        
+        # Accumulated in the precision of coords
+        acc = np.zeros(10, dtype=coords.dtype)
+        
+        for atom_id in range(a0, a1):
+            w = weights[atom_id]
+            acc[0] += w*coords[step_id, atom_id, 0]
+            acc[1] += w*coords[step_id, atom_id, 1]
+            acc[2] += w*coords[step_id, atom_id, 2]
+            acc[3] += w
+        rx, ry, rz, total = acc[0]/acc[3], acc[1]/acc[3], acc[2]/acc[3], acc[3]
+        
+        for atom_id in range(a0, a1):
+            w = weights[atom_id]
+            x = coords[step_id, atom_id, 0] - rx
+            y = coords[step_id, atom_id, 1] - ry
+            z = coords[step_id, atom_id, 2] - rz
+            acc[4] += w*x*x
+            acc[5] += w*y*y
+            acc[6] += w*z*z
+            acc[7] += w*x*y
+            acc[8] += w*x*z
+            acc[9] += w*y*z
+        
+        gyr = gyrations[step_id, mol_id]
+        gyr[0, 0] = acc[4]/total
+        gyr[1, 1] = acc[5]/total
+        gyr[2, 2] = acc[6]/total
+        gyr[0, 1] = gyr[1, 0] = acc[7]/total
+        gyr[0, 2] = gyr[2, 0] = acc[8]/total
+        gyr[1, 2] = gyr[2, 1] = acc[9]/total
+        
+        rcms[step_id, mol_id, 0] = rx
+        rcms[step_id, mol_id, 1] = ry
+        rcms[step_id, mol_id, 2] = rz
+    
+    return gyrations, rcms
@@ -0,0 +1,224 @@
+import numpy as np
+from numba import njit, prange
+
+from mdtrj.core.executor import get_executor
+from mdtrj.core.selection import as_index
+from mdtrj.geometry.boundary import as_box, minimum_image
+from mdtrj.geometry.neighbors import _cell_grid, _bin_atoms, _stencil
+
+class RDF(object):
+    '''
+        Histograms of the radial distribution functions of type pairs.
+
+        Frames are accumulated incrementally, and the partial histograms of
+        several trajectories (e.g. computed in parallel) can be merged.
+    '''
+
+    def __init__(self, r_max, nbins=100, type_pairs=None):
+        '''
+        Parameters
+        ----------
+        r_max : float
+            The cutoff of the histograms, not larger than half of the box width.
+        nbins : int
+        type_pairs : list of tuple, optional
+            Pairs of atom types, default is all pairs of types in the first
+            accumulated trajectory.
+        '''
+
+        self.r_max = r_max
+        self.nbins = nbins
+        self.edges = np.linspace(0, r_max, nbins+1)
+        self.type_pairs = None if type_pairs is None else [tuple(p) for p in type_pairs]
+
+        self.nframes = 0
+        self.counts = None
+        self.norms = None
+
+    @property
+    def r(self):
+        '''Centers of the bins.'''
+        return (self.edges[1:] + self.edges[:-1])/2
+
+    @property
+    def rdf(self):
+        '''The radial distribution functions, shape (ntype_pairs, nbins).'''
+
+        shells = 4/3*np.pi*(self.edges[1:]**3 - self.edges[:-1]**3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.counts/(self.norms[:, None]*shells)
+
+    def accumulate(self, trajectory, atom_selections=None):
+        '''Add the frames of a trajectory to the histograms.
+
+        Parameters
+        ----------
+        trajectory : mdtrj.Trajectory
+        atom_selections : 1D list or numpy array or Selection, optional
+            Only count the pairs in these atoms, default is all atoms.
+
+        Returns
+        -------
+        self : RDF
+        '''
+
+        types = np.asarray(trajectory.topology.atom_types).astype(np.int64)
+        types = np.broadcast_to(types, (trajectory.coords.shape[1],))
+        index = as_index(atom_selections)
+        if index is not None:
+            types = types[index]
+        types = np.ascontiguousarray(types)
+
+        if self.type_pairs is None:
+            uniq = np.unique(types)
+            self.type_pairs = [(a, b) for i, a in enumerate(uniq.tolist()) for b in uniq[i:].tolist()]
+        if self.counts is None:
+            self.counts = np.zeros((len(self.type_pairs), self.nbins))
+            self.norms = np.zeros(len(self.type_pairs))
+
+        pair_index = np.full((types.max()+1,)*2, -1, dtype=np.int64)
+        for p, (a, b) in enumerate(self.type_pairs):
+            if a <= types.max() and b <= types.max():
+                pair_index[a, b] = pair_index[b, a] = p
+
+        box = as_box(trajectory.topology.box)
+        volume = box[0]*box[1]*box[2]
+
+        # Ideal numbers of unordered pairs per volume
+        numbers = np.bincount(types, minlength=types.max()+1)
+        ideal = np.zeros(len(self.type_pairs))
+        for p, (a, b) in enumerate(self.type_pairs):
+            na = numbers[a] if a < len(numbers) else 0
+            nb = numbers[b] if b < len(numbers) else 0
+            ideal[p] = na*(na-1)/2 if a == b else na*nb
+        ideal /= volume
+
+        for coords in trajectory.iter_chunks():
+
+            if index is not None:
+                coords = coords[:, index]
+            coords = np.ascontiguousarray(coords, dtype=float)
+
+            hinv, origin, ncell = _cell_grid(coords, box, self.r_max, True)
+            hist = np.zeros((len(coords), len(self.type_pairs), self.nbins))
+            _rdf_histograms(coords, types, pair_index, hinv, box, origin, ncell, self.r_max, hist)
+
+            self.counts += np.sum(hist, axis=0)
+            self.norms += ideal*len(coords)
+            self.nframes += len(coords)
+
+        return self
+
+    def merge(self, other):
+        '''Add the histograms of another RDF with the same bins and type pairs.
+
+        Returns
+        -------
+        self : RDF
+        '''
+
+        if other.counts is None:
+            return self
+        if self.counts is None:
+            self.type_pairs = self.type_pairs or other.type_pairs
+            self.counts = np.zeros_like(other.counts)
+            self.norms = np.zeros_like(other.norms)
+
+        if not np.allclose(self.edges, other.edges) or self.type_pairs != other.type_pairs:
+            raise ValueError('RDFs with different bins or type pairs can not be merged')
+
+        self.counts += other.counts
+        self.norms += other.norms
+        self.nframes += other.nframes
+
+        return self
+
+def compute_rdf(trajectory, r_max, nbins=100, type_pairs=None, atom_selections=None, parallel=False,
+                processes=None):
+    '''Compute the radial distribution functions g(r) of type pairs.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+        Histograms of a list of trajectories are merged.
+    r_max : float
+    nbins : int
+    type_pairs : list of tuple, optional
+        Pairs of ``Topology.atom_types``, default is all pairs.
+    atom_selections : 1D list or numpy array or Selection, optional
+    parallel : bool
+        Accumulate the trajectories of a list in worker processes.
+    processes : int, optional
+        Default reuses the running workers.
+
+    Returns
+    -------
+    rdf : RDF
+        ``rdf.r`` are the bin centers and ``rdf.rdf`` the g(r) of every type pair.
+    '''
+
+    if not isinstance(trajectory, list):
+        trajectory = [trajectory]
+
+    if type_pairs is None:
+        types = np.concatenate([np.unique(trj.topology.atom_types) for trj in trajectory])
+        uniq = np.unique(types).astype(np.int64).tolist()
+        type_pairs = [(a, b) for i, a in enumerate(uniq) for b in uniq[i:]]
+
+    if parallel and len(trajectory) > 1:
+        params = [[trj, r_max, nbins, type_pairs, atom_selections] for trj in trajectory]
+        partials = get_executor(processes).starmap(_accumulate_rdf, params)
+    else:
+        partials = [_accumulate_rdf(trj, r_max, nbins, type_pairs, atom_selections)
+                    for trj in trajectory]
+
+    rdf = RDF(r_max, nbins, type_pairs)
+    for partial in partials:
+        rdf.merge(partial)
+
+    return rdf
+
+def _accumulate_rdf(trajectory, r_max, nbins, type_pairs, atom_selections):
+    return RDF(r_max, nbins, type_pairs).accumulate(trajectory, atom_selections)
+
+@njit(parallel=True, cache=True)
+def _rdf_histograms(coords, types, pair_index, hinv, box, origin, ncell, r_max, hist):
+    '''Histograms of the pair distances of each frame, counted with cell lists.'''
+
+    nx, ny, nz = ncell[0], ncell[1], ncell[2]
+    nbins = hist.shape[2]
+    dr = r_max/nbins
+    r_max2 = r_max*r_max
+
+    for step_id in prange(coords.shape[0]):
+        pos = coords[step_id]
+        cell_of, start, atoms = _bin_atoms(pos, hinv, origin, ncell, True)
+        lo, hi = _stencil(ncell, True)
+
+        for a in range(pos.shape[0]):
+            c = cell_of[a]
+            ix, iy, iz = c//(ny*nz), (c//nz)%ny, c%nz
+            for ox in range(lo[0], hi[0]):
+                jx = (ix + ox)%nx
+                for oy in range(lo[1], hi[1]):
+                    jy = (iy + oy)%ny
+                    for oz in range(lo[2], hi[2]):
+                        jz = (iz + oz)%nz
+                        cc = (jx*ny + jy)*nz + jz
+                        for k in range(start[cc], start[cc+1]):
+                            b = atoms[k]
+                            if b <= a:
+                                continue
+                            p = pair_index[types[a], types[b]]
+                            if p < 0:
+                                continue
+                            dx, dy, dz = minimum_image(pos[b, 0]-pos[a, 0], pos[b, 1]-pos[a, 1],
+                                                       pos[b, 2]-pos[a, 2], box)
+                            r2 = dx*dx + dy*dy + dz*dz
+                            if r2 >= r_max2:
+                                continue
+                            i = int(np.sqrt(r2)/dr)
+                            if i < nbins:
+                                hist[step_id, p, i] += 1
+
+    return hist
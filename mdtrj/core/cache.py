@@ -0,0 +1,244 @@
+'''
+A persistent on-disk cache of decoded trajectories.
+
+Every entry is a group of sidecar files in ``settings.cache_dir``:
+``<key>.coords.npy`` (and ``<key>.velos.npy``), ``<key>.topo.pkl`` and a
+``<key>.json`` metadata file, which is written at last and marks a complete
+entry. Cached arrays are returned as copy-on-write ``np.memmap``.
+'''
+
+import os
+import json
+import time
+import pickle
+import hashlib
+
+import numpy as np
+
+import mdtrj.settings as set
+
+def cache_key(fn, **options):
+    '''Generate the cache key of a trajectory file.
+    
+    Parameters
+    ----------
+    fn : str
+        Trajectory file name.
+    options : dict
+        Loading options, e.g. start, end, skip, parse_boundary.
+        
+    Returns
+    -------
+    key : str
+    '''
+    
+    stat = os.stat(fn)
+    info = {'path' : os.path.abspath(fn),
+            'size' : stat.st_size,
+            'mtime' : stat.st_mtime_ns,
+            'options' : options}
+    
+    return hashlib.sha1(json.dumps(info, sort_keys=True, default=str).encode()).hexdigest()
+
+def load_cached(fn, **options):
+    '''Load a cached trajectory.
+    
+    Returns
+    -------
+    coords : np.memmap
+    velos : np.memmap or None
+    topo : mdtrj.Topology
+    
+    None is returned if the trajectory is not cached.
+    '''
+    
+    key = cache_key(fn, **options)
+    meta_fn = _entry_path(key, 'json')
+    
+    if not os.path.exists(meta_fn):
+        return None
+    
+    try:
+        with open(meta_fn, 'r') as f:
+            meta = json.load(f)
+        results = _open_entry(key, meta)
+    except (OSError, ValueError, pickle.UnpicklingError):
+        _remove_entry(key)
+        return None
+    
+    # Mark as recently used
+    os.utime(meta_fn)
+    
+    return results
+
+def store_cached(fn, trajectory, **options):
+    '''Write a trajectory into the cache.
+    
+    The coordinates are written chunk by chunk, so a lazy trajectory is never
+    fully loaded into memory.
+    
+    Parameters
+    ----------
+    fn : str
+        The file that trajectory is loaded from.
+    trajectory : mdtrj.Trajectory
+    options : dict
+        Loading options, the same as ``load_cached``.
+        
+    Returns
+    -------
+    coords, velos, topo : the same as ``load_cached``
+    '''
+    
+    os.makedirs(set.cache_dir, exist_ok=True)
+    
+    # Entries of the old versions of this file can not be hit anymore
+    stat = os.stat(fn)
+    for _key, meta in _list_entries():
+        if meta.get('path') == os.path.abspath(fn) and \
+           (meta.get('size'), meta.get('mtime')) != (stat.st_size, stat.st_mtime_ns):
+            _remove_entry(_key)
+    
+    key = cache_key(fn, **options)
+    files = ['coords.npy', 'topo.pkl']
+    
+    _write_array(_entry_path(key, 'coords.npy'), trajectory.coords)
+    if trajectory.velos is not None:
+        _write_array(_entry_path(key, 'velos.npy'), trajectory.velos)
+        files.append('velos.npy')
+        
+    tmp_fn = _entry_path(key, f'topo.pkl.{os.getpid()}')
+    with open(tmp_fn, 'wb') as f:
+        pickle.dump(trajectory.topology, f)
+    os.replace(tmp_fn, _entry_path(key, 'topo.pkl'))
+    
+    meta = {'path' : os.path.abspath(fn),
+            'size' : stat.st_size,
+            'mtime' : stat.st_mtime_ns,
+            'options' : options,
+            'files' : files,
+            'created' : time.time()}
+    tmp_fn = _entry_path(key, f'json.{os.getpid()}')
+    with open(tmp_fn, 'w') as f:
+        json.dump(meta, f, default=str)
+    os.replace(tmp_fn, _entry_path(key, 'json'))
+    
+    # The new entry is kept even if it alone exceeds the size
+    evict_cache(keep=[key])
+    
+    return _open_entry(key, meta)
+
+def clear_cache(fn=None):
+    '''Invalidate the cache.
+    
+    Parameters
+    ----------
+    fn : str, optional
+        Only remove the entries of this file, default is removing all entries.
+    '''
+    
+    path = None if fn is None else os.path.abspath(fn)
+    
+    for key, meta in _list_entries():
+        if path is None or meta.get('path') == path:
+            _remove_entry(key)
+
+def evict_cache(max_bytes=None, keep=()):
+    '''Remove the least recently used entries until the cache fits the size.
+    
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Default is ``settings.cache_max_bytes``.
+    keep : list of str, optional
+        Keys of the entries never removed, e.g. an entry about to be opened.
+    '''
+    
+    if max_bytes is None:
+        max_bytes = set.cache_max_bytes
+    
+    entries = []
+    total = 0
+    for key, meta in _list_entries():
+        size = _entry_size(key, meta)
+        entries.append((os.path.getmtime(_entry_path(key, 'json')), key, size))
+        total += size
+        
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        _remove_entry(key)
+        total -= size
+    
+def _entry_path(key, ext):
+    return os.path.join(set.cache_dir, f'{key}.{ext}')
+
+def _open_entry(key, meta):
+    
+    coords = np.load(_entry_path(key, 'coords.npy'), mmap_mode='c')
+    velos = None
+    if 'velos.npy' in meta['files']:
+        velos = np.load(_entry_path(key, 'velos.npy'), mmap_mode='c')
+    with open(_entry_path(key, 'topo.pkl'), 'rb') as f:
+        topo = pickle.load(f)
+        
+    return coords, velos, topo
+
+def _write_array(fn, arr):
+    
+    tmp_fn = f'{fn}.{os.getpid()}'
+    out = np.lib.format.open_memmap(tmp_fn, mode='w+', dtype=getattr(arr, 'dtype', float), 
+                                    shape=tuple(arr.shape))
+    
+    if hasattr(arr, 'iter_chunks'):
+        chunks = arr.iter_chunks()
+    else:
+        chunk_size = set.trajectory_chunk_size
+        chunks = (arr[i:i+chunk_size] for i in range(0, len(arr), chunk_size))
+        
+    i = 0
+    for chunk in chunks:
+        out[i:i+len(chunk)] = chunk
+        i += len(chunk)
+    
+    out.flush()
+    del out
+    os.replace(tmp_fn, fn)
+
+def _list_entries():
+    
+    if not os.path.isdir(set.cache_dir):
+        return []
+    
+    entries = []
+    for name in os.listdir(set.cache_dir):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(set.cache_dir, name), 'r') as f:
+                entries.append((name[:-5], json.load(f)))
+        except (OSError, ValueError):
+            continue
+        
+    return entries
+
+def _entry_size(key, meta):
+    
+    size = 0
+    for ext in meta.get('files', []) + ['json']:
+        try:
+            size += os.path.getsize(_entry_path(key, ext))
+        except OSError:
+            pass
+        
+    return size
+    
+def _remove_entry(key):
+    
+    for ext in ['coords.npy', 'velos.npy', 'topo.pkl', 'json']:
+        try:
+            os.remove(_entry_path(key, ext))
+        except OSError:
+            pass
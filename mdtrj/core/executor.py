@@ -0,0 +1,375 @@
+'''
+A reusable process pool sharing trajectory arrays with its workers.
+
+Coordinates are placed in ``multiprocessing.shared_memory`` (read-only memmaps
+are referred to by their files), so only small descriptors are pickled between
+processes.
+Large arrays returned by workers come back through shared memory too.
+
+Workers are forked when possible. After numba has launched its TBB threads,
+forking is not safe, and workers are started by 'forkserver' instead (see
+``settings.executor_start_method``), which requires scripts to guard their
+entry point with ``if __name__ == '__main__':``.
+'''
+
+import copy
+import atexit
+import weakref
+
+import numba
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+
+import mdtrj.settings as set
+
+'''
+Arrays smaller than this are pickled as usual.
+'''
+min_shared_bytes = 1024*64
+
+class SharedArray(object):
+    '''
+        A picklable descriptor of an array in shared memory or a memmap file.
+    '''
+
+    def __init__(self, name, shape, dtype, filename=None, offset=0):
+
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+        self.filename = filename
+        self.offset = offset
+
+    @classmethod
+    def create(cls, shape, dtype=float):
+        '''Allocate an array in shared memory.
+
+        Returns
+        -------
+        desc : SharedArray
+        arr : numpy array
+            The array is valid until ``desc.release()`` is called.
+        '''
+
+        nbytes = max(int(np.prod(shape))*np.dtype(dtype).itemsize, 1)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        _segments[shm.name] = shm
+
+        desc = cls(shm.name, shape, dtype)
+
+        return desc, desc.attach()
+
+    @classmethod
+    def from_array(cls, arr):
+        '''Describe an array, copying it into shared memory if necessary.'''
+
+        # Copy-on-write and writable maps may differ from the file, e.g. the
+        # arrays of mdtrj.core.cache, only read-only maps are sent by file
+        if isinstance(arr, np.memmap) and arr.mode == 'r' and arr.filename is not None and \
+           arr.base is not None and arr.flags.c_contiguous:
+            offset = arr.offset + _memmap_shift(arr)
+            return cls(None, arr.shape, arr.dtype, arr.filename, offset), False
+
+        # Arrays (or contiguous views of them) already in shared memory
+        base = arr
+        while isinstance(base, np.ndarray):
+            desc = _shared_arrays.get(id(base))
+            if desc is not None and desc[1]() is base:
+                if base is arr:
+                    return desc[0], False
+                if arr.flags.c_contiguous:
+                    offset = desc[0].offset + arr.__array_interface__['data'][0] - \
+                             base.__array_interface__['data'][0]
+                    return cls(desc[0].name, arr.shape, arr.dtype, offset=offset), False
+                break
+            base = base.base
+
+        desc, out = cls.create(arr.shape, arr.dtype)
+        out[...] = arr
+
+        return desc, True
+
+    def attach(self):
+        '''Get the described array.'''
+
+        if self.filename is not None:
+            return np.memmap(self.filename, dtype=self.dtype, mode='c',
+                             offset=self.offset, shape=self.shape)
+
+        shm = _segments.get(self.name)
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=self.name)
+            _segments[self.name] = shm
+
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf, offset=self.offset)
+
+    def adopt(self):
+        '''Get the described array and own the shared memory.
+
+        The memory is released when the returned array is garbage collected.
+        '''
+
+        arr = self.attach()
+        if self.filename is None and self.name in _segments:
+            _shared_arrays[id(arr)] = (self, weakref.ref(arr))
+            weakref.finalize(arr, _release_segment, self.name, id(arr))
+
+        return arr
+
+    def release(self):
+        '''Free the shared memory.'''
+
+        if self.filename is None:
+            _release_segment(self.name)
+
+class Executor(object):
+    '''
+        A process pool kept warm across analyses.
+    '''
+
+    def __init__(self, processes=None):
+
+        self.processes = processes
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # Workers must share the resource tracker of this process,
+            # otherwise it unlinks the segments created by them.
+            resource_tracker.ensure_running()
+            self._pool = mp.get_context(_start_method()).Pool(processes=self.processes)
+        return self._pool
+
+    def share(self, arr):
+        '''Move an array into shared memory.
+
+        Trajectories holding the returned array are sent to workers without
+        any copy.
+
+        Returns
+        -------
+        arr : numpy array
+        '''
+
+        desc, copied = SharedArray.from_array(arr)
+        if not copied:
+            return arr
+
+        return desc.adopt()
+
+    def share_trajectory(self, trajectory):
+        '''Move the coordinates and velocities of a trajectory into shared memory.'''
+
+        for attr in ['coords', 'velos']:
+            arr = getattr(trajectory, attr)
+            if isinstance(arr, np.ndarray):
+                setattr(trajectory, attr, self.share(arr))
+
+        return trajectory
+
+    def starmap(self, func, params):
+        '''Like ``Pool.starmap``, with trajectories and arrays sent by descriptors.
+
+        Parameters
+        ----------
+        func : callable
+            A module level function.
+        params : list of list
+            Arguments of each call.
+
+        Returns
+        -------
+        results : list
+        '''
+
+        temporary = []
+        packed = [[_pack(arg, temporary) for arg in args] for args in params]
+
+        try:
+            results = self.pool.starmap(_worker_call, [(func, args) for args in packed])
+        finally:
+            for desc in temporary:
+                desc.release()
+
+        return [_unpack(res) for res in results]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+_executor = None
+
+def get_executor(processes=None):
+    '''Get the shared executor.
+
+    Parameters
+    ----------
+    processes : int, optional
+        The workers are restarted only if another number is asked for.
+        Default reuses the running workers, whatever their number, or starts
+        ``settings.executor_processes`` workers.
+
+    Returns
+    -------
+    executor : Executor
+    '''
+
+    global _executor
+
+    if _executor is None or (processes is not None and processes != _executor.processes):
+        if _executor is not None:
+            _executor.close()
+        _executor = Executor(processes if processes is not None else set.executor_processes)
+
+    return _executor
+
+@atexit.register
+def _close_executor():
+    if _executor is not None:
+        _executor.close()
+
+def _start_method():
+
+    if set.executor_start_method is not None:
+        return set.executor_start_method
+
+    if 'fork' not in mp.get_all_start_methods():
+        return None
+
+    try:
+        layer = numba.threading_layer()
+    except ValueError:
+        layer = None
+
+    # A process forked after TBB threads are launched hangs at exit
+    return 'forkserver' if layer == 'tbb' else 'fork'
+
+class _TrajectoryDescriptor(object):
+
+    def __init__(self, coords, topology, velos):
+        self.coords = coords
+        self.topology = topology
+        self.velos = velos
+
+'''
+Shared memory segments opened in this process, and the arrays owning them.
+'''
+_segments = {}
+_shared_arrays = {}
+
+def _release_segment(name, arr_id=None):
+
+    if arr_id is not None:
+        _shared_arrays.pop(arr_id, None)
+
+    shm = _segments.pop(name, None)
+    if shm is None:
+        return
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+def _close_segments():
+    '''Close the segments attached by a worker, but keep them for the owner.'''
+
+    for name in list(_segments.keys()):
+        try:
+            _segments[name].close()
+        except BufferError:
+            continue
+        _segments.pop(name)
+
+def _memmap_shift(arr):
+    '''Byte offset of a memmap view from the start of its mapped buffer.'''
+
+    base = arr
+    while isinstance(base.base, np.memmap):
+        base = base.base
+
+    return arr.__array_interface__['data'][0] - base.__array_interface__['data'][0]
+
+def _pack(obj, temporary):
+    '''Replace arrays in obj by descriptors.'''
+
+    from mdtrj.core.trajectory import Trajectory
+    from mdtrj.core.view import GatheredArray, ConcatenatedArray
+
+    if isinstance(obj, Trajectory):
+        return _TrajectoryDescriptor(_pack(obj.coords, temporary), obj.topology,
+                                     _pack(obj.velos, temporary))
+
+    # A lazy gather sends its base, not the gathered frames
+    if isinstance(obj, GatheredArray):
+        obj = copy.copy(obj)
+        obj.base = _pack(obj.base, temporary)
+        return obj
+    if isinstance(obj, ConcatenatedArray):
+        obj = copy.copy(obj)
+        obj.arrays = _pack(obj.arrays, temporary)
+        return obj
+
+    if isinstance(obj, np.ndarray) and (obj.nbytes >= min_shared_bytes or
+                                        isinstance(obj, np.memmap)):
+        desc, copied = SharedArray.from_array(obj)
+        if copied:
+            temporary.append(desc)
+        return desc
+
+    if isinstance(obj, dict):
+        return {k: _pack(v, temporary) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_pack(v, temporary) for v in obj)
+
+    return obj
+
+def _unpack(obj, adopt=True):
+    '''Restore the objects packed by ``_pack``.'''
+
+    from mdtrj.core.trajectory import Trajectory
+    from mdtrj.core.view import GatheredArray, ConcatenatedArray
+
+    if isinstance(obj, _TrajectoryDescriptor):
+        return Trajectory(_unpack(obj.coords, adopt), obj.topology, _unpack(obj.velos, adopt))
+
+    if isinstance(obj, SharedArray):
+        return obj.adopt() if adopt else obj.attach()
+
+    if isinstance(obj, GatheredArray):
+        obj.base = _unpack(obj.base, adopt)
+        return obj
+    if isinstance(obj, ConcatenatedArray):
+        obj.arrays = _unpack(obj.arrays, adopt)
+        return obj
+
+    if isinstance(obj, dict):
+        return {k: _unpack(v, adopt) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_unpack(v, adopt) for v in obj)
+
+    return obj
+
+def _worker_call(func, args):
+    '''Run func in a worker, large outputs are returned through shared memory.'''
+
+    args = [_unpack(arg, adopt=False) for arg in args]
+    result = func(*args)
+
+    # Outputs are owned by the caller process after they are returned
+    created = []
+    result = _pack(result, created)
+    for desc in created:
+        _segments.pop(desc.name).close()
+
+    del args
+    _close_segments()
+
+    return result
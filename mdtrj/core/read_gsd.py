@@ -1,54 +1,403 @@
+import gsd.fl
 import gsd.hoomd
 from mdtrj import Topology
+import mdtrj.settings as set
 import numpy as np
 
+from mdtrj.geometry.boundary import unwrap_images
+from mdtrj.core.selection import resolve_selection
+
 import warnings
 
-def read_gsd_file(gsd_fn, read_velo=False, start=0, end=None, skip=1):
+def read_gsd_file(gsd_fn, read_velo=False, start=0, end=None, skip=1, unwrap_images=False, 
+                  atom_selection=None, dtype=float):
+    '''Read frames of a gsd file.
+    
+    Parameters
+    ----------
+    gsd_fn : str
+    read_velo : bool
+    start, end, skip : int
+        Frame range, ``range(nframes)[start:end:skip]``.
+    unwrap_images : bool
+    atom_selection : Selection or 1D list or numpy array or slice or dict, optional
+        Only keep these atoms, see ``mdtrj.core.selection.resolve_selection``.
+    dtype : numpy dtype
+        float32 or float64 of the returned arrays.
+        
+    Returns
+    -------
+    coords : 3D numpy array
+    velos : 3D numpy array or None
+    topo : mdtrj.Topology
+        Remapped to the selected atoms.
+    '''
 
     with gsd.hoomd.open(gsd_fn, 'r') as snaps:
-        
-        topo = Topology()
-        
-        if end is None:
-            end = len(snaps)
             
-        s0 = snaps[0]
+        topo = read_gsd_topology(snaps)
+        frames = range(len(snaps))[start:end:skip]
         
-        bonds, box, atom_types, masses = read_snapshot_topo(s0)
-        topo.bonds = bonds
-        topo.box = box
-        topo.atom_types = atom_types
-        topo.masses = masses
-        topo.atoms = s0.particles.N
+        atoms = resolve_selection(topo, atom_selection)
+        if atoms is not None:
+            topo = topo.subset(atoms)
         
-        coords = []
+        coords = np.zeros((len(frames), topo.atoms, 3), dtype=dtype)
         velos = None
-        
         if read_velo:
-            velos = []
-            for snap in snaps[start:end:skip]:
-                coords.append(read_snapshot_coords(snap))
-                velos.append(read_snapshot_velos(snap))
-                
-            velos = np.array(velos, dtype=float)
-        else:
-            for snap in snaps[start:end:skip]:
-                coords.append(read_snapshot_coords(snap))
+            velos = np.zeros((len(frames), topo.atoms, 3), dtype=dtype)
         
-        try:
-            coords = np.array(coords, dtype=float)
-        except:
-            k=0
-            for i,coord in enumerate(coords):
-                if len(coord)==0:
-                    k=i
+        lost = read_gsd_frames(snaps.file, frames, coords, velos, unwrap_images, atoms)
+        
+        if len(lost) > 0:
+            k = max(lost)
             warnings.warn(f'Some atoms lost, file \n{gsd_fn}\n may be incomplete, please check!')
-            coords = np.array(coords[k+1:], dtype=float)
+            coords = coords[k+1:]
+            if read_velo:
+                velos = velos[k+1:]
         
         snaps.close()
             
     return coords, velos, topo
+
+def read_gsd_info(gsd_fn):
+    '''Read the number of frames and the topology of a gsd file.'''
+    
+    with gsd.hoomd.open(gsd_fn, 'r') as snaps:
+        return len(snaps), read_gsd_topology(snaps)
+
+def read_gsd_steps(gsd_fn):
+    '''Read the time steps (configuration/step) of all frames of a gsd file.'''
+    
+    with gsd.fl.open(gsd_fn, 'r') as gsd_file:
+        steps = np.zeros((gsd_file.nframes, 1), dtype=np.uint64)
+        read_frame_chunks(gsd_file, 'configuration/step', range(gsd_file.nframes), steps)
+        
+    return steps[:, 0]
+
+def read_gsd_frames(gsd_file, frames, coords, velos=None, unwrap_images=False, atoms=None):
+    '''Decode frames of a gsd file into preallocated arrays.
+    
+    Parameters
+    ----------
+    gsd_file : gsd.fl.GSDFile
+    frames : sequence of int
+    coords : 3D numpy array
+        ``coords[i]`` is filled by frame ``frames[i]``.
+    velos : 3D numpy array, optional
+    unwrap_images : bool
+    atoms : slice or 1D numpy array, optional
+        Gather index of the atoms to keep.
+        
+    Returns
+    -------
+    lost : list
+        The positions in ``frames`` whose data is incomplete.
+    '''
+    
+    # Read the raw chunks, no gsd.hoomd.Frame is built for each step
+    lost = read_frame_chunks(gsd_file, 'particles/position', frames, coords, atoms)
+    
+    if unwrap_images:
+        read_frame_images(gsd_file, frames, coords, atoms)
+    
+    if velos is not None:
+        lost += read_frame_chunks(gsd_file, 'particles/velocity', frames, velos, atoms)
+        
+    return lost
+
+def read_frame_chunks(gsd_file, name, frames, out, atoms=None):
+    '''Read a per-frame data chunk of a gsd file into a preallocated array.
+    
+    Parameters
+    ----------
+    gsd_file : gsd.fl.GSDFile
+    name : str
+        Chunk name, e.g. 'particles/position'.
+    frames : sequence of int
+        Frame ids to read.
+    out : numpy array
+        Output array, ``out[i]`` is filled by frame ``frames[i]``.
+    atoms : slice or 1D numpy array, optional
+        Gather these rows of per-particle data before copying into ``out``,
+        the full rows of a frame are never stored.
+        
+    Returns
+    -------
+    lost : list
+        The positions in ``frames`` whose data is incomplete.
+    '''
+    
+    lost = []
+    default = None
+    
+    for i, fid in enumerate(frames):
+        
+        # Frames without the chunk take the data from frame 0, like gsd.hoomd
+        if gsd_file.chunk_exists(frame=fid, name=name):
+            data = gsd_file.read_chunk(frame=fid, name=name)
+        else:
+            if default is None:
+                if gsd_file.chunk_exists(frame=0, name=name):
+                    default = gsd_file.read_chunk(frame=0, name=name)
+                else:
+                    default = 0
+            data = default
+            
+        try:
+            if atoms is not None and np.ndim(data) > 0:
+                data = data[atoms]
+            out[i] = data
+        except (ValueError, IndexError):
+            lost.append(i)
+            
+    return lost
+
+def read_frame_images(gsd_file, frames, coords, atoms=None):
+    '''Restore the wrapped positions with the image flags in place.
+    
+    Parameters
+    ----------
+    gsd_file : gsd.fl.GSDFile
+    frames : sequence of int
+        Frame ids of ``coords``.
+    coords : 3D numpy array
+        Wrapped positions read from ``frames``.
+    atoms : slice or 1D numpy array, optional
+        Gather index of the atoms in ``coords``.
+        
+    Returns
+    -------
+    coords : 3D numpy array
+    '''
+    
+    chunk_size = set.trajectory_chunk_size
+    natoms = coords.shape[1]
+    
+    for i in range(0, len(frames), chunk_size):
+        _frames = frames[i:i+chunk_size]
+        images = np.zeros((len(_frames), natoms, 3), dtype=np.int32)
+        boxes = np.zeros((len(_frames), 6))
+        read_frame_chunks(gsd_file, 'particles/image', _frames, images, atoms)
+        read_frame_chunks(gsd_file, 'configuration/box', _frames, boxes)
+        unwrap_images(coords[i:i+len(_frames)], images, boxes, out=coords[i:i+len(_frames)])
+        
+    return coords
+
+def read_gsd_lazy(gsd_fn, read_velo=False, start=0, end=None, skip=1, chunk_size=None, 
+                  unwrap_images=False, atom_selection=None, dtype=float):
+    '''Open a gsd file without decoding its frames.
+    
+    Parameters
+    ----------
+    gsd_fn : str
+    read_velo : bool
+    start, end, skip : int
+        Frame range, the same as ``read_gsd_file``.
+    chunk_size : int, optional
+        Number of frames decoded at one time.
+    unwrap_images : bool
+        Restore the positions with the image flags.
+    atom_selection : optional
+        Only decode these atoms, the same as ``read_gsd_file``.
+    dtype : numpy dtype
+        
+    Returns
+    -------
+    coords : GSDFrameArray
+    velos : GSDFrameArray or None
+    topo : mdtrj.Topology
+    '''
+    
+    _, topo = read_gsd_info(gsd_fn)
+    
+    atoms = resolve_selection(topo, atom_selection)
+    if atoms is not None:
+        topo = topo.subset(atoms)
+        
+    coords = GSDFrameArray(gsd_fn, 'position', start, end, skip, chunk_size, atoms=atoms, 
+                           dtype=dtype)
+    coords.unwrap_images = unwrap_images
+    
+    velos = None
+    if read_velo:
+        velos = GSDFrameArray(gsd_fn, 'velocity', frames=coords.frames, 
+                              chunk_size=chunk_size, atoms=atoms, dtype=dtype, 
+                              file_natoms=coords.file_natoms, handle=coords.handle)
+        
+    return coords, velos, topo
+
+def read_gsd_topology(snaps):
+    '''Read the topology from the first frame of an opened gsd file.'''
+    
+    topo = Topology()
+    s0 = snaps[0]
+    
+    bonds, box, atom_types, masses = read_snapshot_topo(s0)
+    topo.bonds = bonds
+    topo.box = box
+    topo.atom_types = atom_types
+    topo.masses = masses
+    topo.atoms = s0.particles.N
+    
+    return topo
+
+class GSDHandle(object):
+    '''
+        A gsd file opened on first use, shared by a ``GSDFrameArray`` and
+        the views derived from it. A closed handle opens the file again
+        when it is used, and a pickled handle is not opened.
+    '''
+    
+    def __init__(self, gsd_fn):
+        
+        self.gsd_fn = gsd_fn
+        self._snaps = None
+        
+    @property
+    def snaps(self):
+        '''The opened gsd.hoomd trajectory.'''
+        if self._snaps is None:
+            self._snaps = gsd.hoomd.open(self.gsd_fn, 'r')
+        return self._snaps
+    
+    def close(self):
+        if self._snaps is not None:
+            self._snaps.close()
+            self._snaps = None
+            
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_snaps'] = None
+        return state
+
+class GSDFrameArray(object):
+    '''
+        An array-like access to per-frame particle data of a gsd file.
+        
+        Frames are decoded on demand, ``chunk_size`` frames at one time, so
+        only the opened gsd file and the current chunk live in memory.
+        Slices and other views share the ``GSDHandle`` of the file, and the
+        number of atoms ``file_natoms`` is only read once.
+    '''
+    
+    def __init__(self, gsd_fn, attr='position', start=0, end=None, skip=1, 
+                 chunk_size=None, frames=None, atoms=None, dtype=float, 
+                 file_natoms=None, handle=None):
+        
+        self.gsd_fn = gsd_fn
+        self.attr = attr
+        self.chunk_size = chunk_size
+        self.atoms = atoms
+        self.transform = None
+        self.unwrap_images = False
+        self.handle = handle if handle is not None else GSDHandle(gsd_fn)
+        self._dtype = np.dtype(dtype)
+        
+        if frames is None:
+            frames = range(len(self.snaps))[start:end:skip]
+        self.frames = frames
+        
+        if file_natoms is None:
+            file_natoms = int(self.snaps[0].particles.N)
+        self.file_natoms = file_natoms
+        
+        self.natoms = file_natoms
+        if atoms is not None:
+            self.natoms = len(range(self.natoms)[atoms]) if isinstance(atoms, slice) else len(atoms)
+        
+    @property
+    def snaps(self):
+        '''The opened gsd.hoomd trajectory.'''
+        return self.handle.snaps
+    
+    @property
+    def shape(self):
+        return (len(self.frames), self.natoms, 3)
+    
+    @property
+    def ndim(self):
+        return 3
+    
+    @property
+    def dtype(self):
+        return self._dtype
+    
+    def __len__(self):
+        return len(self.frames)
+    
+    def __getitem__(self, key):
+        
+        if isinstance(key, tuple):
+            frames = self[key[0]]
+            if isinstance(key[0], (int, np.integer)):
+                return frames[key[1:]]
+            return np.asarray(frames)[(slice(None),)+key[1:]]
+        
+        if isinstance(key, (int, np.integer)):
+            return self._read([self.frames[key]])[0]
+        
+        if isinstance(key, slice):
+            return self._derive(self.frames[key])
+        
+        key = np.asarray(key)
+        if key.dtype == bool:
+            key = np.nonzero(key)[0]
+        return self._read([self.frames[i] for i in key])
+    
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            for frame in chunk:
+                yield frame
+    
+    def __array__(self, dtype=None, copy=None):
+        coords = self._read(self.frames)
+        if dtype is not None:
+            coords = coords.astype(dtype, copy=False)
+        return coords
+    
+    def iter_chunks(self, chunk_size=None):
+        '''Decode the frames chunk by chunk.
+        
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Default is ``self.chunk_size`` or ``settings.trajectory_chunk_size``.
+            
+        Yields
+        ------
+        coords : 3D numpy array
+        '''
+        
+        chunk_size = chunk_size or self.chunk_size or set.trajectory_chunk_size
+        
+        for i in range(0, len(self.frames), chunk_size):
+            yield self._read(self.frames[i:i+chunk_size])
+    
+    def close(self):
+        '''Close the gsd file, also for the views sharing it.'''
+        self.handle.close()
+    
+    def _derive(self, frames):
+        arr = self.__class__(self.gsd_fn, self.attr, frames=frames, 
+                             chunk_size=self.chunk_size, atoms=self.atoms, dtype=self._dtype, 
+                             file_natoms=self.file_natoms, handle=self.handle)
+        arr.transform = self.transform
+        arr.unwrap_images = self.unwrap_images
+        return arr
+    
+    def _read(self, frames):
+        
+        data = np.zeros((len(frames), self.natoms, 3), dtype=self._dtype)
+        read_frame_chunks(self.snaps.file, 'particles/'+self.attr, frames, data, self.atoms)
+        
+        if self.unwrap_images:
+            read_frame_images(self.snaps.file, frames, data, self.atoms)
+            
+        if self.transform is not None:
+            data = self.transform(data)
+            
+        return data
     
 def read_snapshot_topo(snap):
     
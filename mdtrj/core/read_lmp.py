@@ -0,0 +1,570 @@
+'''
+An indexed reader of LAMMPS dump (.lammpstrj) files.
+
+One pass over the memory-mapped file finds the byte offsets of the frames,
+then only the requested frames are parsed, every atom block by one
+compiled pass over its bytes. Boxes are converted to the hoomd convention, i.e.
+(Lx, Ly, Lz, xy, xz, yz) centred at the origin, and positions are shifted
+accordingly.
+'''
+
+import mmap
+
+import gsd.hoomd
+import numpy as np
+from numba import njit
+
+from mdtrj import Topology
+from mdtrj.geometry.boundary import as_box, box_matrix
+from mdtrj.core.selection import resolve_selection
+
+'''
+Column names of positions, from the most to the least preferred.
+'''
+position_columns = [['xu', 'yu', 'zu'], ['x', 'y', 'z'], ['xsu', 'ysu', 'zsu'], ['xs', 'ys', 'zs']]
+
+def read_lmp_file(lmp_fn, read_velo=False, start=0, end=None, skip=1, unwrap_images=False, 
+                  atom_selection=None, dtype=float):
+    '''Read frames of a LAMMPS dump file.
+
+    Parameters
+    ----------
+    lmp_fn : str
+    read_velo : bool
+    start, end, skip : int
+        Frame range, ``range(nframes)[start:end:skip]``.
+    unwrap_images : bool
+        Restore the positions with the image flags (ix, iy, iz), if the
+        positions in the file are wrapped.
+    atom_selection : optional
+        Only keep these atoms (ordered by id), the same as ``read_gsd_file``.
+    dtype : numpy dtype
+
+    Returns
+    -------
+    coords : 3D numpy array
+    velos : 3D numpy array or None
+    topo : mdtrj.Topology
+    '''
+
+    with open(lmp_fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+        offsets = index_lammpstrj(mm)
+        frames = range(len(offsets)-1)[start:end:skip]
+        topo = read_lmp_topology(mm, offsets)
+
+        atoms = resolve_selection(topo, atom_selection)
+        if atoms is not None:
+            topo = topo.subset(atoms)
+
+        coords = np.zeros((len(frames), topo.atoms, 3), dtype=dtype)
+        velos = np.zeros((len(frames), topo.atoms, 3), dtype=dtype) if read_velo else None
+
+        read_lmp_frames(mm, offsets, frames, coords, velos, unwrap_images, atoms)
+
+    return coords, velos, topo
+
+def read_lmp_index(lmp_fn):
+    '''Read the frame offsets and the topology of a dump file.
+
+    Returns
+    -------
+    offsets : 1D numpy array
+        See ``index_lammpstrj``.
+    topo : mdtrj.Topology
+    '''
+
+    with open(lmp_fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = index_lammpstrj(mm)
+        return offsets, read_lmp_topology(mm, offsets)
+
+def index_lammpstrj(mm):
+    '''Byte offsets of the frames.
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+        The content of a dump file.
+
+    Returns
+    -------
+    offsets : 1D numpy array
+        Frame i is ``mm[offsets[i]:offsets[i+1]]``, the last offset is the file size.
+    '''
+
+    offsets = []
+    pos = mm.find(b'ITEM: TIMESTEP')
+    while pos >= 0:
+        offsets.append(pos)
+        pos = mm.find(b'ITEM: TIMESTEP', pos+14)
+    offsets.append(len(mm))
+
+    return np.array(offsets, dtype=np.int64)
+
+def read_lmp_header(mm, offset):
+    '''Parse the header of the frame starting at offset.
+
+    Returns
+    -------
+    header : dict
+        'step', 'natoms', 'boundary', 'bounds' (as in the file), 'box'
+        (hoomd convention), 'origin' (the lower corner of the LAMMPS box),
+        'columns' and 'data' (the byte offset of the atom block).
+    '''
+
+    lines = []
+    pos = offset
+    while True:
+        nxt = mm.find(b'\n', pos)
+        if nxt < 0:
+            nxt = len(mm)
+        line = bytes(mm[pos:nxt]).decode()
+        lines.append(line)
+        pos = nxt + 1
+        if line.startswith('ITEM: ATOMS') or pos >= len(mm):
+            break
+
+    header = {}
+    for i, line in enumerate(lines):
+        if line.startswith('ITEM: TIMESTEP'):
+            header['step'] = int(lines[i+1])
+        elif line.startswith('ITEM: NUMBER OF ATOMS'):
+            header['natoms'] = int(lines[i+1])
+        elif line.startswith('ITEM: BOX BOUNDS'):
+            bounds = np.array([l.split() for l in lines[i+1:i+4]], dtype=float)
+            header['boundary'] = line.split()[-3:]
+            header['bounds'] = bounds
+            header['box'], header['origin'] = lmp_box_to_hoomd(bounds)
+        elif line.startswith('ITEM: ATOMS'):
+            header['columns'] = line.split()[2:]
+
+    header['data'] = pos
+
+    return header
+
+def lmp_box_to_hoomd(bounds):
+    '''Convert the BOX BOUNDS of a dump to a hoomd box.
+
+    Parameters
+    ----------
+    bounds : 2D numpy array
+        The 3 lines of BOX BOUNDS, with the tilt factors (xy, xz, yz) in the
+        third column of a triclinic box.
+
+    Returns
+    -------
+    box : 1D numpy array
+        (Lx, Ly, Lz, xy, xz, yz) with the tilt factors of hoomd.
+    origin : 1D numpy array
+        The lower corner (xlo, ylo, zlo) of the LAMMPS box.
+    '''
+
+    xy, xz, yz = bounds[:, 2] if bounds.shape[1] > 2 else (0.0, 0.0, 0.0)
+
+    # Bounds of a triclinic box are the bounding box of the tilted cell
+    xlo = bounds[0, 0] - min(0.0, xy, xz, xy+xz)
+    xhi = bounds[0, 1] - max(0.0, xy, xz, xy+xz)
+    ylo = bounds[1, 0] - min(0.0, yz)
+    yhi = bounds[1, 1] - max(0.0, yz)
+    zlo, zhi = bounds[2, 0], bounds[2, 1]
+
+    lx, ly, lz = xhi-xlo, yhi-ylo, zhi-zlo
+    box = np.array([lx, ly, lz, xy/ly, xz/lz, yz/lz])
+
+    return box, np.array([xlo, ylo, zlo])
+
+def hoomd_box_to_lmp(box):
+    '''Convert a hoomd box to the BOX BOUNDS of a dump, the inverse of ``lmp_box_to_hoomd``.
+
+    The LAMMPS box is placed so that positions centred at the origin need no shift.
+
+    Returns
+    -------
+    bounds : 2D numpy array
+        With shape (3, 2), or (3, 3) with the tilt factors of a triclinic box.
+    '''
+
+    lx, ly, lz, xy, xz, yz = as_box(box)
+    xy, xz, yz = xy*ly, xz*lz, yz*lz
+    xlo, ylo, zlo = -(lx + xy + xz)/2, -(ly + yz)/2, -lz/2
+
+    bounds = np.array([[xlo + min(0.0, xy, xz, xy+xz), xlo + lx + max(0.0, xy, xz, xy+xz), xy],
+                       [ylo + min(0.0, yz), ylo + ly + max(0.0, yz), xz],
+                       [zlo, zlo + lz, yz]])
+
+    if xy == 0 and xz == 0 and yz == 0:
+        return bounds[:, :2]
+
+    return bounds
+
+def read_lmp_topology(mm, offsets):
+    '''Read the topology from the first frame.'''
+
+    header = read_lmp_header(mm, offsets[0])
+    table = read_atom_table(mm, header, offsets[1])
+    columns = header['columns']
+
+    topo = Topology()
+    topo.atoms = header['natoms']
+    topo.box = header['box']
+    topo.bonds = np.zeros((0, 2))
+
+    if 'type' in columns:
+        topo.atom_types = table[:, columns.index('type')] - 1
+    else:
+        topo.atom_types = np.zeros(topo.atoms)
+
+    masses = 1.0
+    if 'mass' in columns:
+        masses = table[:, columns.index('mass')].copy()
+        if len(np.unique(masses)) == 1:
+            masses = float(masses[0])
+    topo.masses = masses
+
+    return topo
+
+def lmp_to_gsd(lmp_fn, gsd_fn, start=0, end=None, skip=1, data_fn=None):
+    '''Convert a dump file to a gsd file frame by frame.
+
+    Only one frame is held in memory. Positions are wrapped into the box
+    with their image flags, restored from unwrapped or image columns when
+    the dump has them.
+
+    Parameters
+    ----------
+    lmp_fn : str
+    gsd_fn : str
+    start, end, skip : int
+        Frame range, ``range(nframes)[start:end:skip]``.
+    data_fn : str, optional
+        A LAMMPS data file with the masses and bonds.
+
+    Returns
+    -------
+    nframes : int
+        Number of frames written.
+    '''
+
+    data = None if data_fn is None else read_lmp_data(data_fn)
+
+    with open(lmp_fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+         gsd.hoomd.open(gsd_fn, 'w') as snaps:
+
+        offsets = index_lammpstrj(mm)
+        frames = range(len(offsets)-1)[start:end:skip]
+        types = None
+
+        for fid in frames:
+
+            header = read_lmp_header(mm, offsets[fid])
+            table = read_atom_table(mm, header, offsets[fid+1])
+            columns = header['columns']
+
+            if types is None:
+                # Types, masses and bonds are the same in every frame
+                types, ids = _frame_types(table, columns)
+                type_names = [str(t+1) for t in range(types.max()+1)]
+                masses, bonds, bond_types = _data_topology(data, types, ids)
+                if bonds is not None:
+                    bond_names = [str(t+1) for t in range(bond_types.max()+1)]
+
+            # Wrap into the box and keep the images
+            h = box_matrix(header['box'])
+            positions = table_positions(header, table, unwrap_images=True)
+            images = np.floor(positions @ np.linalg.inv(h).T + 0.5)
+            positions = positions - images @ h.T
+
+            snap = gsd.hoomd.Frame()
+            snap.configuration.step = header['step']
+            snap.configuration.box = header['box']
+            snap.particles.N = header['natoms']
+            snap.particles.types = type_names
+            snap.particles.typeid = types
+            snap.particles.position = positions.astype(np.float32)
+            snap.particles.image = images.astype(np.int32)
+
+            if all(name in columns for name in ['vx', 'vy', 'vz']):
+                velo_ids = [columns.index(name) for name in ['vx', 'vy', 'vz']]
+                snap.particles.velocity = table[:, velo_ids].astype(np.float32)
+
+            if 'mass' in columns:
+                snap.particles.mass = table[:, columns.index('mass')].astype(np.float32)
+            elif masses is not None:
+                snap.particles.mass = masses
+
+            if bonds is not None:
+                snap.bonds.N = len(bonds)
+                snap.bonds.types = bond_names
+                snap.bonds.typeid = bond_types
+                snap.bonds.group = bonds
+
+            snaps.append(snap)
+
+    return len(frames)
+
+def _frame_types(table, columns):
+    '''Type ids and sorted atom ids of a frame.'''
+
+    natoms = len(table)
+
+    types = np.zeros(natoms, dtype=np.uint32)
+    if 'type' in columns:
+        types = (table[:, columns.index('type')] - 1).astype(np.uint32)
+
+    ids = np.arange(1, natoms+1)
+    if 'id' in columns:
+        ids = table[:, columns.index('id')].astype(np.int64)
+
+    return types, ids
+
+def _data_topology(data, types, ids):
+    '''Per-atom masses, bonds as atom indices and bond type ids of a data file, or None.'''
+
+    masses = bonds = bond_types = None
+    if data is None:
+        return masses, bonds, bond_types
+
+    if len(data['masses']) > 0:
+        lookup = np.ones(types.max()+1, dtype=np.float32)
+        for t, mass in data['masses'].items():
+            if 0 < t <= len(lookup):
+                lookup[t-1] = mass
+        masses = lookup[types]
+
+    if len(data['bonds']) > 0:
+        bonds = np.searchsorted(ids, data['bonds']).astype(np.uint32)
+        bond_types = (data['bond_types'] - 1).astype(np.uint32)
+
+    return masses, bonds, bond_types
+
+def read_lmp_data(data_fn):
+    '''Read the masses and bonds of a LAMMPS data file.
+
+    Returns
+    -------
+    data : dict
+        'masses' maps the atom types to their masses, 'bonds' are the atom
+        ids of the bonds with shape (nbonds, 2), 'bond_types' their types.
+    '''
+
+    sections = {}
+    name = None
+
+    with open(data_fn, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if len(line) == 0:
+                continue
+            if line[0].isalpha():
+                name = line.split()[0]
+                sections[name] = []
+            elif name is not None:
+                sections[name].append(line.split())
+
+    data = {'masses': {}, 'bonds': np.zeros((0, 2), dtype=np.int64),
+            'bond_types': np.zeros(0, dtype=np.int64)}
+
+    for row in sections.get('Masses', []):
+        data['masses'][int(row[0])] = float(row[1])
+
+    if len(sections.get('Bonds', [])) > 0:
+        bonds = np.array([row[:4] for row in sections['Bonds']], dtype=np.int64)
+        data['bonds'] = bonds[:, 2:]
+        data['bond_types'] = bonds[:, 1]
+
+    return data
+
+def read_lmp_frames(mm, offsets, frames, coords, velos=None, unwrap_images=False, atoms=None):
+    '''Parse frames into preallocated arrays.
+
+    Parameters
+    ----------
+    mm : mmap.mmap or bytes
+    offsets : 1D numpy array
+        Returned by ``index_lammpstrj``.
+    frames : sequence of int
+    coords : 3D numpy array
+        ``coords[i]`` is filled by frame ``frames[i]``.
+    velos : 3D numpy array, optional
+    unwrap_images : bool
+    atoms : slice or 1D numpy array, optional
+        Gather index of the atoms to keep, rows are ordered by id.
+
+    Returns
+    -------
+    coords : 3D numpy array
+    '''
+
+    for i, fid in enumerate(frames):
+
+        header = read_lmp_header(mm, offsets[fid])
+        table = read_atom_table(mm, header, offsets[fid+1])
+        if atoms is not None:
+            table = table[atoms]
+
+        coords[i] = table_positions(header, table, unwrap_images)
+        if velos is not None:
+            velos[i] = table[:, _column_ids(header['columns'], True)[4]]
+
+    return coords
+
+def table_positions(header, table, unwrap_images=False):
+    '''Positions of an atom table in the hoomd box centred at the origin.
+
+    Parameters
+    ----------
+    header : dict
+        Returned by ``read_lmp_header``.
+    table : 2D numpy array
+        Returned by ``read_atom_table``.
+    unwrap_images : bool
+        Restore the positions with the image flags, if they are wrapped.
+
+    Returns
+    -------
+    positions : 2D numpy array
+    '''
+
+    pos_ids, scaled, unwrapped, image_ids, _ = _column_ids(header['columns'])
+
+    h = box_matrix(header['box'])
+    center = header['origin'] + np.sum(h, axis=1)/2
+
+    pos = table[:, pos_ids]
+    if scaled:
+        pos = pos @ h.T + header['origin']
+    if unwrap_images and not unwrapped and image_ids is not None:
+        pos = pos + table[:, image_ids] @ h.T
+
+    return pos - center
+
+def read_atom_table(mm, header, stop):
+    '''Parse the atom block of a frame in bulk, rows are sorted by the atom ids.'''
+
+    columns = header['columns']
+    natoms, ncols = header['natoms'], len(columns)
+    values = np.zeros(natoms*ncols)
+    buf = np.frombuffer(mm, dtype=np.uint8, count=stop-header['data'], offset=header['data'])
+    count = _parse_values(buf, values)
+    del buf
+
+    # Tokens like nan or inf are left to numpy
+    if count < 0:
+        values = np.fromstring(bytes(mm[header['data']:stop]), sep=' ')
+        count = len(values)
+
+    if count < natoms*ncols:
+        raise ValueError(f'Frame of step {header["step"]} is incomplete')
+
+    table = values[:natoms*ncols].reshape(natoms, ncols)
+
+    if 'id' in columns:
+        ids = table[:, columns.index('id')]
+        if not np.all(ids[1:] > ids[:-1]):
+            table = table[np.argsort(ids, kind='stable')]
+
+    return table
+
+def _column_ids(columns, read_velo=False):
+    '''Positions of the position, image and velocity columns.'''
+
+    for names in position_columns:
+        if all(name in columns for name in names):
+            pos_ids = [columns.index(name) for name in names]
+            scaled = names[0].startswith('xs')
+            unwrapped = names[0].endswith('u')
+            break
+    else:
+        raise ValueError(f'No positions in the columns {columns}')
+
+    image_ids = None
+    if all(name in columns for name in ['ix', 'iy', 'iz']):
+        image_ids = [columns.index(name) for name in ['ix', 'iy', 'iz']]
+
+    velo_ids = None
+    if read_velo:
+        if not all(name in columns for name in ['vx', 'vy', 'vz']):
+            raise ValueError(f'No velocities in the columns {columns}')
+        velo_ids = [columns.index(name) for name in ['vx', 'vy', 'vz']]
+
+    return pos_ids, scaled, unwrapped, image_ids, velo_ids
+
+@njit(cache=True)
+def _parse_values(buf, out):
+    '''Parse whitespace separated decimal numbers of an ASCII buffer.
+
+    Returns the number of values parsed into out, or -1 for a token that is
+    not a plain decimal number.
+    '''
+
+    n = buf.shape[0]
+    i = 0
+    k = 0
+
+    while k < out.shape[0]:
+
+        # 32 is space, 9-13 are tabs and newlines
+        while i < n and (buf[i] == 32 or (buf[i] >= 9 and buf[i] <= 13)):
+            i += 1
+        if i >= n:
+            break
+
+        sign = 1.0
+        if buf[i] == 45:
+            sign = -1.0
+            i += 1
+        elif buf[i] == 43:
+            i += 1
+
+        # Up to 18 significant digits are kept in an int64
+        mant = 0
+        exp = 0
+        digits = 0
+        start = i
+        while i < n and buf[i] >= 48 and buf[i] <= 57:
+            if digits < 18:
+                mant = mant*10 + (buf[i] - 48)
+                if mant > 0:
+                    digits += 1
+            else:
+                exp += 1
+            i += 1
+        if i < n and buf[i] == 46:
+            i += 1
+            while i < n and buf[i] >= 48 and buf[i] <= 57:
+                if digits < 18:
+                    mant = mant*10 + (buf[i] - 48)
+                    if mant > 0:
+                        digits += 1
+                    exp -= 1
+                i += 1
+        if i == start:
+            return -1
+
+        if i < n and (buf[i] == 101 or buf[i] == 69):
+            i += 1
+            esign = 1
+            if i < n and buf[i] == 45:
+                esign = -1
+                i += 1
+            elif i < n and buf[i] == 43:
+                i += 1
+            e = 0
+            estart = i
+            while i < n and buf[i] >= 48 and buf[i] <= 57:
+                e = e*10 + (buf[i] - 48)
+                i += 1
+            if i == estart:
+                return -1
+            exp += esign*e
+
+        if i < n and not (buf[i] == 32 or (buf[i] >= 9 and buf[i] <= 13)):
+            return -1
+
+        if exp >= 0:
+            out[k] = sign*mant*10.0**exp
+        else:
+            out[k] = sign*mant/10.0**(-exp)
+        k += 1
+
+    return k
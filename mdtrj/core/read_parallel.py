@@ -0,0 +1,105 @@
+'''
+Decode one large trajectory file with several processes.
+
+The frame range is split into contiguous pieces, and every worker of the
+shared executor decodes its pieces straight into one preallocated array in
+shared memory, so nothing but small descriptors is pickled.
+'''
+
+import os
+import mmap
+import warnings
+
+import gsd.fl
+import numpy as np
+
+from .executor import SharedArray, get_executor
+from .selection import resolve_selection
+from .read_gsd import read_gsd_info, read_gsd_frames
+from .read_lmp import read_lmp_index, read_lmp_frames
+
+'''
+Number of pieces per worker, more pieces balance the load better.
+'''
+pieces_per_process = 4
+
+def read_parallel(fn, read_velo=False, start=0, end=None, skip=1, unwrap_images=False, processes=None, 
+                  atom_selection=None, dtype=float):
+    '''Read the frames of a gsd or lammpstrj file in worker processes.
+
+    Parameters
+    ----------
+    fn : str
+    read_velo : bool
+    start, end, skip : int
+        Frame range, ``range(nframes)[start:end:skip]``.
+    unwrap_images : bool
+    processes : int, optional
+        Number of workers of ``mdtrj.core.executor.get_executor``.
+    atom_selection : optional
+        Only keep these atoms, see ``mdtrj.core.read_gsd.read_gsd_file``.
+    dtype : numpy dtype
+
+    Returns
+    -------
+    coords : 3D numpy array
+        In shared memory, so it is sent to the executor workers without copy.
+    velos : 3D numpy array or None
+    topo : mdtrj.Topology
+    '''
+
+    offsets = None
+    if fn.split('.')[-1] == 'lammpstrj':
+        offsets, topo = read_lmp_index(fn)
+        nframes = len(offsets) - 1
+    else:
+        nframes, topo = read_gsd_info(fn)
+
+    atoms = resolve_selection(topo, atom_selection)
+    if atoms is not None:
+        topo = topo.subset(atoms)
+
+    frames = range(nframes)[start:end:skip]
+    shape = (len(frames), topo.atoms, 3)
+
+    coords_desc, _ = SharedArray.create(shape, dtype)
+    coords = coords_desc.adopt()
+    velos_desc = velos = None
+    if read_velo:
+        velos_desc, _ = SharedArray.create(shape, dtype)
+        velos = velos_desc.adopt()
+
+    executor = get_executor(processes)
+    npieces = min(len(frames), (executor.processes or os.cpu_count() or 1)*pieces_per_process)
+    bounds = np.linspace(0, len(frames), npieces+1).astype(int)
+
+    params = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        params.append([fn, frames[a:b], a, coords_desc, velos_desc, unwrap_images, offsets, atoms])
+
+    lost = sum(executor.starmap(_decode_frames, params), [])
+
+    if len(lost) > 0:
+        k = max(lost)
+        warnings.warn(f'Some atoms lost, file \n{fn}\n may be incomplete, please check!')
+        coords = coords[k+1:]
+        if read_velo:
+            velos = velos[k+1:]
+
+    return coords, velos, topo
+
+def _decode_frames(fn, frames, first, coords, velos, unwrap_images, offsets=None, atoms=None):
+    '''Decode frames into ``coords[first:first+len(frames)]`` in a worker.'''
+
+    piece = slice(first, first+len(frames))
+    velos = None if velos is None else velos[piece]
+
+    if offsets is not None:
+        with open(fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            read_lmp_frames(mm, offsets, frames, coords[piece], velos, unwrap_images, atoms)
+        return []
+
+    with gsd.fl.open(fn, 'r') as gsd_file:
+        lost = read_gsd_frames(gsd_file, frames, coords[piece], velos, unwrap_images, atoms)
+
+    return [first + i for i in lost]
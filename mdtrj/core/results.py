@@ -0,0 +1,225 @@
+'''
+A memoization layer of analysis results.
+
+Results are keyed by the fingerprint of a trajectory plus the selections and
+parameters of an analysis, and are evicted in the least recently used order
+when the cache holds more than ``settings.results_cache_max_entries`` entries
+or ``settings.results_cache_max_bytes`` bytes. The cache keeps a read-only
+copy of every result, callers always get their own copies.
+'''
+
+import weakref
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import mdtrj.settings as set
+
+class ResultCache(object):
+    '''
+        A thread safe LRU cache of analysis results.
+    '''
+
+    def __init__(self, max_entries=None, max_bytes=None):
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self._entries = OrderedDict()
+        self._owners = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        '''Get a copy of a cached result and mark it as recently used.'''
+
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            value = self._entries[key][0]
+
+        return _copy(value)
+
+    def put(self, key, value, owner=None):
+        '''Cache a result.
+
+        Parameters
+        ----------
+        key : tuple
+            The first item is the name of analysis.
+        value : object
+            A copy is cached, with the numpy arrays in it set to read-only.
+        owner : object, optional
+            The entry is released when owner is garbage collected.
+
+        Returns
+        -------
+        value : object
+            The value itself, not the cached copy.
+        '''
+
+        cached = _copy(value)
+        nbytes = _freeze(cached)
+
+        with self._lock:
+            self.pop(key)
+            self._entries[key] = (cached, nbytes)
+            self.nbytes += nbytes
+
+            if owner is not None:
+                self._watch(owner, key)
+
+            self._evict()
+
+        return value
+
+    def pop(self, key):
+        '''Remove a cached result.'''
+
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+
+    def get_or_compute(self, key, func, *args, owner=None, **kwargs):
+        '''Get a cached result, or compute and cache it.'''
+
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.put(key, func(*args, **kwargs), owner)
+
+        return value
+
+    def clear(self, name=None):
+        '''Remove all results, or only the results of one analysis.'''
+
+        with self._lock:
+            for key in list(self._entries.keys()):
+                if name is None or key[0] == name:
+                    self.pop(key)
+
+    def _watch(self, owner, key):
+
+        oid = id(owner)
+        if oid not in self._owners:
+            try:
+                weakref.finalize(owner, self._release, oid)
+            except TypeError:
+                return
+            self._owners[oid] = []
+        self._owners[oid].append(key)
+
+    def _release(self, oid):
+
+        with self._lock:
+            for key in self._owners.pop(oid, []):
+                self.pop(key)
+
+    def _evict(self):
+
+        max_entries = self.max_entries or set.results_cache_max_entries
+        max_bytes = self.max_bytes or set.results_cache_max_bytes
+
+        while len(self._entries) > 1 and \
+              (len(self._entries) > max_entries or self.nbytes > max_bytes):
+            self.pop(next(iter(self._entries)))
+
+_missing = object()
+
+'''
+The results cache shared by all analyses.
+'''
+results_cache = ResultCache()
+
+'''
+Atoms of every frame hashed by trajectory_fingerprint.
+'''
+_sampled_atoms = 16
+
+def trajectory_fingerprint(trajectory):
+    '''A fingerprint identifies the coordinates of a trajectory.
+
+    It combines the identity, shape and type of the coordinates and
+    ``Trajectory.version``, which is bumped when the coordinates are
+    replaced or restored (e.g. by parse_boundary), with a digest of a
+    sample: the first, middle and last frames, and a few atoms of every
+    frame. In place edits of whole frames change the digest, other in place
+    edits must be marked by ``Trajectory.mark_modified``. The sample keeps
+    the fingerprint much cheaper than the analyses it keys.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory
+
+    Returns
+    -------
+    fingerprint : tuple
+    '''
+
+    coords = trajectory.coords
+    nframes = len(coords)
+
+    digest = hashlib.blake2b(digest_size=16)
+    for i in sorted({0, nframes//2, nframes-1}):
+        if i >= 0:
+            digest.update(np.ascontiguousarray(coords[i]))
+
+    # Lazy coordinates are read from a file and can not be edited in place
+    if not hasattr(coords, 'iter_chunks') and nframes > 0:
+        data = np.asarray(coords)
+        natoms = data.shape[1]
+        atoms = np.unique(np.linspace(0, natoms-1, min(natoms, _sampled_atoms)).astype(np.int64))
+        digest.update(np.ascontiguousarray(data[:, atoms]))
+
+    return (id(coords), type(coords).__name__, tuple(coords.shape), str(coords.dtype),
+            getattr(trajectory, 'version', 0), digest.hexdigest())
+
+def array_key(arr):
+    '''A hashable key of an index array or selection.'''
+
+    if arr is None:
+        return None
+
+    # Compiled selections keep their key
+    key = getattr(arr, 'key', None)
+    if key is not None:
+        return key
+
+    arr = np.asarray(arr)
+    if arr.size == 0:
+        return None
+
+    return (arr.shape, str(arr.dtype), hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest())
+
+def _copy(value):
+    '''Copy the numpy arrays in a result.'''
+
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k : _copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_copy(v) for v in value)
+
+    return value
+
+def _freeze(value):
+    '''Set numpy arrays to read-only and count their bytes.'''
+
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_freeze(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_freeze(v) for v in value)
+
+    return 0
@@ -0,0 +1,241 @@
+'''
+Compiled atom selections.
+
+A query on a topology is compiled once to a sorted index array, the boolean
+mask and the slice (for a contiguous range) are derived from it on demand
+and kept, so analyses gather the atoms of every frame without evaluating
+the query again.
+'''
+
+import numpy as np
+
+from scipy.sparse import coo_matrix
+
+class Selection(object):
+    '''
+        A compiled atom selection, used wherever ``atom_selections`` are accepted.
+
+        Selections combine with ``&``, ``|``, ``-`` and ``~``.
+    '''
+
+    def __init__(self, indices, natoms):
+
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        if len(indices) > 0 and (indices[0] < 0 or indices[-1] >= natoms):
+            raise IndexError(f'Atom indices out of range [0, {natoms})')
+        indices.flags.writeable = False
+
+        self.indices = indices
+        self.natoms = natoms
+
+        self._mask = None
+        self._index = None
+        self._key = None
+
+    @property
+    def mask(self):
+        '''Boolean mask with shape (natoms,).'''
+
+        if self._mask is None:
+            mask = np.zeros(self.natoms, dtype=bool)
+            mask[self.indices] = True
+            mask.flags.writeable = False
+            self._mask = mask
+
+        return self._mask
+
+    @property
+    def index(self):
+        '''A slice if the atoms are contiguous, otherwise the index array.
+
+        ``coords[:, selection.index]`` of a contiguous selection is a view.
+        '''
+
+        if self._index is None:
+            self._index = as_index(self.indices)
+
+        return self._index
+
+    @property
+    def key(self):
+        '''A hashable key for ``mdtrj.core.results``.'''
+
+        if self._key is None:
+            from .results import array_key
+            self._key = array_key(self.indices)
+
+        return self._key
+
+    def gather(self, coords):
+        '''Selected atoms of a 2D (natoms, 3) or 3D (nframes, natoms, 3) array.'''
+
+        coords = np.asarray(coords)
+        if coords.ndim == 2:
+            return coords[self.index]
+
+        return coords[:, self.index]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.indices
+        return self.indices.astype(dtype)
+
+    def __repr__(self):
+        return f'Selection({len(self)} of {self.natoms} atoms)'
+
+    def __and__(self, other):
+        return Selection(np.intersect1d(self.indices, _indices(other)), self.natoms)
+
+    def __or__(self, other):
+        return Selection(np.union1d(self.indices, _indices(other)), self.natoms)
+
+    def __sub__(self, other):
+        return Selection(np.setdiff1d(self.indices, _indices(other)), self.natoms)
+
+    def __invert__(self):
+        return Selection(np.flatnonzero(~self.mask), self.natoms)
+
+def as_index(atom_selections):
+    '''Gather index of an atom selection.
+
+    Parameters
+    ----------
+    atom_selections : Selection or int or 1D list or numpy array
+        Atom indices or a boolean mask over all atoms. An empty selection
+        means all atoms.
+
+    Returns
+    -------
+    index : slice or 1D numpy array or None
+        None for all atoms, a slice for a contiguous increasing range.
+    '''
+
+    if isinstance(atom_selections, Selection):
+        return atom_selections.index
+
+    if atom_selections is None:
+        return None
+
+    ids = np.asarray(atom_selections)
+    if ids.ndim == 0:
+        ids = np.atleast_1d(ids)
+    elif ids.size == 0:
+        return None
+
+    if ids.dtype == bool:
+        # A mask selecting no atom selects none, not all
+        ids = np.flatnonzero(ids)
+        if len(ids) == 0:
+            return ids
+    elif ids.dtype.kind not in 'iu':
+        raise TypeError(f'Atom selections must be integers or a boolean mask, got {ids.dtype}')
+
+    ids = ids.astype(np.int64, copy=False)
+    if ids.ndim == 1 and ids[0] >= 0 and np.all(np.diff(ids) == 1):
+        return slice(int(ids[0]), int(ids[-1])+1)
+
+    return ids
+
+def resolve_selection(topology, atom_selection):
+    '''Gather index of the ``atom_selection`` argument of the loaders.
+
+    Parameters
+    ----------
+    topology : mdtrj.Topology
+        Topology of all atoms in the file.
+    atom_selection : Selection or 1D list or numpy array or slice or dict
+        A dict is a query of ``Topology.select``.
+
+    Returns
+    -------
+    index : slice or 1D numpy array or None
+    '''
+
+    if atom_selection is None:
+        return None
+    if isinstance(atom_selection, dict):
+        atom_selection = topology.select(**atom_selection)
+    if isinstance(atom_selection, (slice, range)):
+        atom_selection = np.arange(topology.atoms)[atom_selection]
+
+    return as_index(atom_selection)
+
+def select_atoms(topology, types=None, index_range=None, mass=None, bonded_to=None, hops=1,
+                 molecules=None):
+    '''Compile a query on a topology, all given criteria must hold.
+
+    See ``Topology.select``, which caches the result.
+
+    Returns
+    -------
+    selection : Selection
+    '''
+
+    natoms = topology.atoms
+    mask = np.ones(natoms, dtype=bool)
+
+    if types is not None:
+        atom_types = np.broadcast_to(np.asarray(topology.atom_types), (natoms,))
+        mask &= np.isin(atom_types, np.atleast_1d(types))
+
+    if index_range is not None:
+        if isinstance(index_range, (slice, range)):
+            ids = np.arange(natoms)[index_range]
+        else:
+            ids = np.arange(*index_range)
+        part = np.zeros(natoms, dtype=bool)
+        part[ids[(ids >= 0) & (ids < natoms)]] = True
+        mask &= part
+
+    if mass is not None:
+        masses = np.broadcast_to(np.asarray(topology.masses, dtype=float), (natoms,))
+        if np.ndim(mass) == 0:
+            mask &= np.isclose(masses, mass)
+        else:
+            lo, hi = mass
+            mask &= (masses >= lo) & (masses <= hi)
+
+    if bonded_to is not None:
+        mask &= _bonded_neighborhood(topology, _indices(bonded_to), hops)
+
+    if molecules is not None:
+        mask &= np.isin(topology.get_molecules(), np.atleast_1d(molecules))
+
+    return Selection(np.flatnonzero(mask), natoms)
+
+def _bonded_neighborhood(topology, seeds, hops):
+    '''Mask of the atoms within ``hops`` bonds of the seed atoms, seeds included.'''
+
+    natoms = topology.atoms
+    bonds = np.asarray(topology.bonds, dtype=np.int64).reshape(-1, 2)
+    graph = coo_matrix((np.ones(2*len(bonds), dtype=bool),
+                        (np.concatenate([bonds[:,0], bonds[:,1]]),
+                         np.concatenate([bonds[:,1], bonds[:,0]]))),
+                       shape=(natoms, natoms)).tocsr()
+
+    mask = np.zeros(natoms, dtype=bool)
+    mask[seeds] = True
+    for _ in range(hops):
+        grown = mask | (graph @ mask)
+        if np.array_equal(grown, mask):
+            break
+        mask = grown
+
+    return mask
+
+def _indices(atoms):
+
+    if isinstance(atoms, Selection):
+        return atoms.indices
+
+    atoms = np.atleast_1d(np.asarray(atoms))
+    if atoms.dtype == bool:
+        return np.flatnonzero(atoms)
+
+    return atoms.astype(np.int64)
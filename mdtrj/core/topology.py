@@ -1,5 +1,10 @@
 import numpy as np
 
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .selection import Selection, select_atoms
+
 class Topology(object):
     '''
         A class stores the topological information of a system.
@@ -14,4 +19,179 @@ class Topology(object):
         self.bonds = []
         self.angles = []
         self.dihedrals = []
-        self.box = []
\ No newline at end of file
+        self.box = []
+        
+        self.molecule_ids = None
+        
+        self.selections = {}
+        
+    def get_molecules(self):
+        '''Get the molecule id of every atom.
+        
+        Molecules are the connected components of bonds, numbered by their
+        first atoms. The result is cached in ``self.molecule_ids``, assign it
+        to define molecules in another way.
+        
+        Returns
+        -------
+        molecule_ids : 1D numpy array
+        '''
+        
+        if getattr(self, 'molecule_ids', None) is None:
+            
+            bonds = np.asarray(self.bonds, dtype=np.int64).reshape(-1, 2)
+            graph = coo_matrix((np.ones(len(bonds)), (bonds[:,0], bonds[:,1])), 
+                               shape=(self.atoms, self.atoms))
+            _, labels = connected_components(graph, directed=False)
+            
+            # Renumber molecules by the order of their first atoms
+            _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+            self.molecule_ids = np.argsort(np.argsort(first))[inverse]
+            
+        return self.molecule_ids
+    
+    def select(self, types=None, index_range=None, mass=None, bonded_to=None, hops=1, molecules=None):
+        '''Select atoms, all given criteria must hold.
+        
+        A query is compiled once and cached in ``self.selections``, clear it
+        after changing the topology.
+        
+        Parameters
+        ----------
+        types : int or list, optional
+            Atom type ids.
+        index_range : (start, stop) or slice or range, optional
+        mass : float or (min, max), optional
+            Atoms of this mass, or in this closed interval.
+        bonded_to : Selection or list, optional
+            Atoms within ``hops`` bonds of these atoms, these atoms included.
+        hops : int
+        molecules : int or list, optional
+            Molecule ids of ``get_molecules()``.
+            
+        Returns
+        -------
+        selection : mdtrj.core.selection.Selection
+            Accepted as ``atom_selections`` by the analyses.
+        '''
+        
+        query = (self.atoms, _freeze(types), _freeze(index_range), _freeze(mass), 
+                 _freeze(bonded_to), hops if bonded_to is not None else None, _freeze(molecules))
+        
+        if getattr(self, 'selections', None) is None:
+            self.selections = {}
+        if query not in self.selections:
+            self.selections[query] = select_atoms(self, types, index_range, mass, bonded_to, hops, 
+                                                  molecules)
+            
+        return self.selections[query]
+    
+    def subset(self, atoms):
+        '''The topology of a subset of atoms, atoms are renumbered in order.
+        
+        Bonds, angles and dihedrals are kept if all their atoms are in the
+        subset.
+        
+        Parameters
+        ----------
+        atoms : Selection or 1D numpy array or slice
+        
+        Returns
+        -------
+        topo : Topology
+        '''
+        
+        ids = np.arange(self.atoms)[atoms if isinstance(atoms, slice) else np.asarray(atoms)]
+        index = np.full(self.atoms, -1, dtype=np.int64)
+        index[ids] = np.arange(len(ids))
+        
+        topo = Topology()
+        topo.atoms = len(ids)
+        topo.box = np.array(self.box, copy=True)
+        topo.atom_types = _subset_values(self.atom_types, ids)
+        topo.masses = _subset_values(self.masses, ids)
+        
+        for name in ['bonds', 'angles', 'dihedrals']:
+            groups = np.asarray(getattr(self, name))
+            if groups.size == 0:
+                continue
+            groups = index[groups.astype(np.int64)]
+            groups = groups[np.all(groups >= 0, axis=1)]
+            setattr(topo, name, groups.astype(float) if name == 'bonds' else groups)
+        
+        if getattr(self, 'molecule_ids', None) is not None:
+            topo.molecule_ids = self.molecule_ids[ids]
+            
+        return topo
+    
+    def check_compatible(self, other):
+        '''Raise a ValueError if the atoms, types, masses or bonds differ.
+        
+        Boxes are not compared, they may change along a simulation.
+        
+        Parameters
+        ----------
+        other : Topology
+        '''
+        
+        if self.atoms != other.atoms:
+            raise ValueError(f'Topologies of {self.atoms} and {other.atoms} atoms are not compatible')
+        
+        for name in ['atom_types', 'masses']:
+            values = np.broadcast_to(np.asarray(getattr(self, name), dtype=float), (self.atoms,))
+            others = np.broadcast_to(np.asarray(getattr(other, name), dtype=float), (other.atoms,))
+            if not np.array_equal(values, others):
+                raise ValueError(f'Topologies with different {name} are not compatible')
+            
+        for name in ['bonds', 'angles', 'dihedrals']:
+            groups = np.asarray(getattr(self, name), dtype=np.int64)
+            others = np.asarray(getattr(other, name), dtype=np.int64)
+            if groups.size + others.size > 0 and not np.array_equal(groups, others):
+                raise ValueError(f'Topologies with different {name} are not compatible')
+    
+def _subset_values(values, ids):
+    '''Per-atom values of a subset, a scalar stays a scalar.'''
+    
+    if np.ndim(values) == 0:
+        return values
+    
+    return np.asarray(values)[ids]
+    
+def _freeze(value):
+    '''A hashable form of a query argument.'''
+    
+    if value is None:
+        return None
+    if isinstance(value, Selection):
+        return ('selection', value.key)
+    if isinstance(value, slice):
+        return ('slice', value.start, value.stop, value.step)
+    if isinstance(value, range):
+        return ('slice', value.start, value.stop, value.step)
+    
+    return tuple(np.atleast_1d(value).tolist())
+    
+def molecule_segments(molecule_ids):
+    '''Group atoms by molecules.
+    
+    Parameters
+    ----------
+    molecule_ids : 1D numpy array
+        Molecule id (or any label) of every atom.
+        
+    Returns
+    -------
+    order : 1D numpy array
+        Atom ids sorted by molecules.
+    offsets : 1D numpy array
+        Atoms of molecule i are ``order[offsets[i]:offsets[i+1]]``, molecules
+        are in the order of ``np.unique(molecule_ids)``.
+    '''
+    
+    _, inverse, counts = np.unique(molecule_ids, return_inverse=True, return_counts=True)
+    
+    order = np.argsort(inverse, kind='stable')
+    offsets = np.zeros(len(counts)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    
+    return order, offsets
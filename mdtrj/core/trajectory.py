@@ -1,45 +1,83 @@
 
+import os
 import numpy as np
-from multiprocessing import Pool
 
 from tqdm import tqdm
 
 from copy import deepcopy
+from functools import partial
 
-from .read_gsd import read_gsd_file
+import mdtrj.settings as set
 
-from pypolymer.util import parse_boundary
+from .read_gsd import read_gsd_file, read_gsd_lazy, read_gsd_steps
+from .read_lmp import read_lmp_file, lmp_to_gsd
+from .read_parallel import read_parallel
+from .cache import load_cached, store_cached
+from .executor import get_executor
+from .results import array_key
+from .selection import as_index
+from .view import take, ConcatenatedArray
 
-def loadfiles(fns, parse_boundary=False, read_velo=False, parallel=True, processes=10):
+from mdtrj.geometry.boundary import bond_traversal, unwrap_coords
+
+def loadfiles(fns, parse_boundary=False, read_velo=False, parallel=True, processes=None, 
+              lazy=False, chunk_size=None, cache=False, atom_selection=None, dtype=float, 
+              concatenate=False):
     '''
     Load multipule trajectorys a one time.
+    
+    ``atom_selection`` and ``dtype`` are applied to every file, see ``load``.
+    With ``concatenate=True`` the files are restart segments of one run and
+    a single lazy trajectory is returned, see ``load_segments``.
     '''
     
+    if concatenate:
+        return load_segments(fns, parse_boundary, read_velo, chunk_size, atom_selection, dtype)
+    
     trjs = []
     
     if parallel:
         params = []
         for i,fn in enumerate(fns):
-            params.append([fn, parse_boundary, read_velo])
+            params.append([fn, parse_boundary, read_velo, 0, None, 1, lazy, chunk_size, cache, 
+                           False, None, atom_selection, dtype])
         
-        with Pool(processes=processes) as pool:
-            trjs = pool.starmap(load, params)
-            pool.close()
+        # Coordinates come back through shared memory
+        trjs = get_executor(processes).starmap(load, params)
     else:
         for fn in fns:
-            trjs.append(load(fn, parse_boundary, read_velo))
+            trjs.append(load(fn, parse_boundary, read_velo, lazy=lazy, chunk_size=chunk_size, 
+                             cache=cache, atom_selection=atom_selection, dtype=dtype))
     
     return trjs
         
 
-def load(fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip=1):
+def load(fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip=1, 
+         lazy=False, chunk_size=None, cache=False, parallel=False, processes=None, 
+         atom_selection=None, dtype=float):
     '''A smart load function can automatically determin the file type.
     
     Parameters
     ----------
     fn: trajector file name, optinal, defulat=None
-    parse_boundary: bool, optional, default=True
-    use_iter: bool optional, default=False
+    parse_boundary: bool or str, optional, default=False
+        True or 'bonds' restores the molecules along bonds, 
+        'image' restores the positions with the image flags.
+    lazy: bool, optional, default=False
+        Keep the file opened and decode frames on demand.
+    chunk_size: int, optional
+        Number of frames decoded at one time by a lazy trajectory.
+    cache: bool, optional, default=False
+        Keep the decoded coordinates in an on-disk cache, see mdtrj.core.cache.
+    parallel: bool, optional, default=False
+        Decode frame ranges of the file in worker processes.
+    processes: int, optional
+        Number of worker processes.
+    atom_selection: Selection or list or numpy array or slice or dict, optional
+        Only decode these atoms, a dict is a query of ``Topology.select``,
+        e.g. ``dict(molecules=0)``. The topology is remapped to them.
+    dtype: numpy dtype, optional, default=float
+        float32 halves the memory of the coordinates.
     
     Returns
     -------
@@ -50,18 +88,39 @@ def load(fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip
     file_type = fn.split('.')[-1]
     
     if file_type in ['gsd']:
-        return load_gsd(fn, parse_boundary, read_velo, start, end, skip)
+        return load_gsd(fn, parse_boundary, read_velo, start, end, skip, lazy, chunk_size, cache, 
+                        parallel, processes, atom_selection, dtype)
     if file_type in ['lammpstrj']:
-        return load_lmp(fn, parse_boundary, read_velo, start, end, skip)
+        return load_lmp(fn, parse_boundary, read_velo, start, end, skip, parallel, processes, 
+                        atom_selection, dtype)
 
-def load_gsd(gsd_fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip=1):
+def load_gsd(gsd_fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip=1, 
+             lazy=False, chunk_size=None, cache=False, parallel=False, processes=None, 
+             atom_selection=None, dtype=float):
     '''Load data from a gsd file
     
     Parameters
     ----------
     gsd_fn: gsd file name, optional, default=None
-    parse_boundary: bool, optional, default=True
-    use_iter: bool optional, default=False
+    parse_boundary: bool or str, optional, default=False
+        True or 'bonds' restores the molecules along bonds, 
+        'image' restores the positions with the image flags when loading.
+    lazy: bool, optional, default=False
+        Keep the gsd file opened and decode frames on demand.
+    chunk_size: int, optional
+        Number of frames decoded at one time by a lazy trajectory.
+    cache: bool, optional, default=False
+        Reuse the coordinates cached by a previous load, the coordinates
+        of the returned trajectory are memory-mapped.
+    parallel: bool, optional, default=False
+        Decode frame ranges of the file in worker processes, the coordinates
+        are placed in shared memory. Not used by lazy trajectories.
+    processes: int, optional
+        Number of worker processes.
+    atom_selection: optional
+        Only decode these atoms, see ``load``.
+    dtype: numpy dtype, optional, default=float
+        Precision of the decoded arrays.
     
     Returns
     -------
@@ -72,23 +131,209 @@ def load_gsd(gsd_fn=None, parse_boundary=False, read_velo=False, start=0, end=No
     coords = None
     velos = None
     
+    if gsd_fn is not None and cache:
+        
+        options = dict(parse_boundary=parse_boundary, read_velo=read_velo, 
+                       start=start, end=end, skip=skip)
+        if atom_selection is not None:
+            options['atom_selection'] = _selection_key(atom_selection)
+        if np.dtype(dtype) != np.dtype(float):
+            options['dtype'] = np.dtype(dtype).str
+        cached = load_cached(gsd_fn, **options)
+        
+        if cached is None:
+            traj = load_gsd(gsd_fn, parse_boundary, read_velo, start, end, skip, 
+                            lazy=True, chunk_size=chunk_size, atom_selection=atom_selection, 
+                            dtype=dtype)
+            try:
+                cached = store_cached(gsd_fn, traj, **options)
+            finally:
+                traj.coords.close()
+                if traj.velos is not None:
+                    traj.velos.close()
+            
+        coords, velos, topo = cached
+        
+        return Trajectory(coords, topo, velos)
+    
+    unwrap_images = parse_boundary == 'image'
+    
     if gsd_fn is not None:
         
-        coords, velos, topo = read_gsd_file(gsd_fn, read_velo, start, end, skip)
+        if lazy:
+            coords, velos, topo = read_gsd_lazy(gsd_fn, read_velo, start, end, skip, chunk_size, 
+                                                unwrap_images, atom_selection, dtype)
+        elif parallel:
+            coords, velos, topo = read_parallel(gsd_fn, read_velo, start, end, skip, 
+                                                unwrap_images, processes, atom_selection, dtype)
+        else:
+            coords, velos, topo = read_gsd_file(gsd_fn, read_velo, start, end, skip, 
+                                                unwrap_images, atom_selection, dtype)
     
     traj = Trajectory(coords, topo, velos)
     
-    if parse_boundary:
+    if parse_boundary and not unwrap_images:
         traj.parse_boundary()
         
     return traj
     
-def load_lmp(lmp_fn=None, parse_boundary=True):
-    snaps = convert_to_gsd(lmp_fn, parse_boundary)
-    pass
+def load_lmp(lmp_fn=None, parse_boundary=False, read_velo=False, start=0, end=None, skip=1, 
+             parallel=False, processes=None, atom_selection=None, dtype=float):
+    '''Load data from a LAMMPS dump file
+    
+    Parameters
+    ----------
+    lmp_fn: lammpstrj file name, optional, default=None
+    parse_boundary: bool or str, optional, default=False
+        'image' restores the positions with the image flags (ix, iy, iz),
+        True or 'bonds' restores the molecules along bonds, which a dump
+        file does not contain unless ``Topology.bonds`` is set afterwards.
+    read_velo: bool, optional, default=False
+        Read the vx, vy, vz columns.
+    start, end, skip: int, optional
+        Frame range, only these frames are parsed.
+    parallel: bool, optional, default=False
+        Parse frame ranges of the file in worker processes.
+    processes: int, optional
+        Number of worker processes.
+    atom_selection: optional
+        Only keep these atoms, ordered by id, see ``load``.
+    dtype: numpy dtype, optional, default=float
+    
+    Returns
+    -------
+    traj: mdtrj.trajectory
+    '''
+    
+    unwrap_images = parse_boundary == 'image'
+    
+    if parallel:
+        coords, velos, topo = read_parallel(lmp_fn, read_velo, start, end, skip, unwrap_images, 
+                                            processes, atom_selection, dtype)
+    else:
+        coords, velos, topo = read_lmp_file(lmp_fn, read_velo, start, end, skip, unwrap_images, 
+                                            atom_selection, dtype)
+    
+    traj = Trajectory(coords, topo, velos)
+    
+    if parse_boundary and not unwrap_images and len(topo.bonds) > 0:
+        traj.parse_boundary()
+        
+    return traj
 
-def convert_to_gsd(fn, parse_bound):
-    pass
+def convert_to_gsd(lmp_fn, gsd_fn=None, start=0, end=None, skip=1, data_fn=None, overwrite=False):
+    '''Convert a LAMMPS dump file to a gsd file, streaming frame by frame.
+    
+    Parameters
+    ----------
+    lmp_fn: lammpstrj file name
+    gsd_fn: gsd file name, optional, default=None
+        Default replaces the extension of lmp_fn by '.gsd'.
+    start, end, skip: int, optional
+        Frame range to convert.
+    data_fn: LAMMPS data file name, optional, default=None
+        Write the masses and bonds of the data file.
+    overwrite: bool, optional, default=False
+        Replace an existing gsd_fn, otherwise a FileExistsError is raised.
+    
+    Returns
+    -------
+    gsd_fn: str
+    '''
+    
+    if gsd_fn is None:
+        gsd_fn = '.'.join(lmp_fn.split('.')[:-1]+['gsd'])
+        
+    if os.path.exists(gsd_fn) and not overwrite:
+        raise FileExistsError(f'{gsd_fn} exists, pass overwrite=True to replace it')
+        
+    lmp_to_gsd(lmp_fn, gsd_fn, start, end, skip, data_fn)
+    
+    return gsd_fn
+
+def load_segments(fns, parse_boundary=False, read_velo=False, chunk_size=None, atom_selection=None, 
+                  dtype=float, drop_duplicates=True):
+    '''Load the restart segments (gsd files) of a run as one lazy trajectory.
+    
+    Frames are decoded on demand, nothing is concatenated in memory. The
+    segments must have compatible topologies.
+    
+    Parameters
+    ----------
+    fns: list of gsd file names, in the order of the run
+    parse_boundary, read_velo, chunk_size, atom_selection, dtype: optional
+        The same as ``load_gsd``.
+    drop_duplicates: bool, optional, default=True
+        Drop the frames of a segment whose ``configuration/step`` is not
+        after the last step of the previous segments, i.e. the frames
+        written again at a restart. Segments without steps are kept.
+    
+    Returns
+    -------
+    traj: mdtrj.Trajectory
+    '''
+    
+    trjs = []
+    last = None
+    
+    for fn in fns:
+        
+        if fn.split('.')[-1] != 'gsd':
+            raise ValueError(f'Only gsd segments can be joined, got {fn}')
+            
+        trj = load_gsd(fn, parse_boundary, read_velo, lazy=True, chunk_size=chunk_size, 
+                       atom_selection=atom_selection, dtype=dtype)
+        
+        if drop_duplicates:
+            steps = read_gsd_steps(fn)
+            if np.any(steps > 0):
+                if last is not None:
+                    kept = np.nonzero(steps > last)[0]
+                    if len(kept) < len(trj):
+                        trj = trj[as_index(kept) if len(kept) > 0 else slice(0, 0)]
+                last = steps.max() if last is None else max(last, steps.max())
+        
+        trjs.append(trj)
+        
+    return concatenate_trajectories(trjs)
+
+def concatenate_trajectories(trajectories):
+    '''Join trajectories along the frames without copying their data.
+    
+    Parameters
+    ----------
+    trajectories: [mdtrj.Trajectory, ]
+        With compatible topologies, see ``Topology.check_compatible``.
+    
+    Returns
+    -------
+    traj: mdtrj.Trajectory
+        A lazy trajectory with the topology of the first one, velocities
+        are kept if all trajectories have them.
+    '''
+    
+    topo = trajectories[0].topology
+    for trj in trajectories[1:]:
+        topo.check_compatible(trj.topology)
+        
+    coords = ConcatenatedArray([trj.coords for trj in trajectories])
+    
+    velos = None
+    if all(hasattr(trj.velos, 'shape') for trj in trajectories):
+        velos = ConcatenatedArray([trj.velos for trj in trajectories])
+        
+    return Trajectory(coords, topo, velos)
+
+def _selection_key(atom_selection):
+    '''A cache option of the atom_selection argument.'''
+    
+    if isinstance(atom_selection, dict):
+        return sorted((k, _selection_key(v) if np.ndim(v) > 0 else str(v)) 
+                      for k, v in atom_selection.items())
+    if isinstance(atom_selection, (slice, range)):
+        return str(atom_selection)
+    
+    return array_key(atom_selection)
 
 class Trajectory(object):
 
@@ -99,85 +344,159 @@ class Trajectory(object):
         
         self.topology = topo
         
+        self.version = 0
         self.coords = coords
         self.velos = velos
 
+    @property
+    def coords(self):
+        '''The coordinates, replacing them bumps ``version``.'''
+        return self._coords
+    
+    @coords.setter
+    def coords(self, coords):
+        self._coords = coords
+        self.mark_modified()
+        
+    def mark_modified(self):
+        '''Bump ``version``, which invalidates the cached analysis results.
+        
+        Call it after editing the coordinates in place, e.g.
+        ``trj.coords[:, atoms] += shift``. Edits of whole frames are also
+        found by the fingerprint of ``mdtrj.core.results``, edits of single
+        atoms may not be.
+        '''
+        self.version += 1
     
     def __len__(self):
         '''Get the length of trajectory'''
         return len(self.coords)
+    
+    @property
+    def is_lazy(self):
+        '''If the coordinates are decoded on demand.'''
+        return hasattr(self.coords, 'iter_chunks')
+    
+    def iter_chunks(self, chunk_size=None):
+        '''Iterate the coordinates by chunks of frames.
+        
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Default is ``settings.trajectory_chunk_size``.
+            
+        Yields
+        ------
+        coords : 3D numpy array
+        '''
+        
+        if self.is_lazy:
+            for chunk in self.coords.iter_chunks(chunk_size):
+                yield chunk
+        else:
+            coords = self.coords
+            if not isinstance(coords, np.ndarray):
+                coords = np.array(coords, dtype=float)
+            chunk_size = chunk_size or set.trajectory_chunk_size
+            for i in range(0, len(coords), chunk_size):
+                yield coords[i:i+chunk_size]
         
     def __getitem__(self, key):
-        '''Get a slice of a md trajectory'''
-        return self._slice(key)
+        '''Get a view of frames, or of frames and atoms with ``trj[frames, atoms]``.
+        
+        Slices share the coordinate buffer and the topology, index arrays
+        are gathered lazily, see ``mdtrj.core.view``. Use ``copy`` for an
+        independent trajectory.
+        '''
+        return self._slice(key, copy=False)
     
     def _slice(self, key, copy=True):
         '''Slice a trajectory, like slice a list
         Parameters
         ----------
-        key : {int, np.ndarray, slice}
-            Just use it like a list
+        key : {int, np.ndarray, slice} or a tuple (frames, atoms)
+            Just use it like a list, an int keeps a trajectory of one frame.
+            Atoms can be a slice, an int, an index array, a boolean mask or
+            a Selection, an int keeps one atom.
         copy : bool, default=True
-            Choose to generate a new trajectory or 
-            just modify current trajectory.
+            Return an independent trajectory, otherwise a view of this one.
         '''
         
-        coords = self.coords[key]
-        if isinstance(self.velos, np.ndarray):
-            velos = self.velos[key]
-        else:
-            velos = None
+        frames, atoms = key if isinstance(key, tuple) else (key, None)
         
-        if copy:
-            _coords = deepcopy(coords)
-            if self.velos is not None:
-                _velos = deepcopy(velos)
-            else:
-                _velos = None
-            topo = deepcopy(self.topology)
+        if isinstance(frames, (int, np.integer)):
+            frames = range(len(self))[frames]
+            frames = slice(frames, frames+1)
+            
+        if atoms is not None and not isinstance(atoms, slice):
+            index = as_index(atoms)
+            # An empty selection keeps no atoms here, not all of them
+            atoms = np.zeros(0, dtype=np.int64) if index is None else index
+            
+        coords = take(self.coords, frames, atoms)
+        velos = None
+        if hasattr(self.velos, 'shape'):
+            velos = take(self.velos, frames, atoms)
+            
+        topo = self.topology
+        if atoms is not None and topo is not None:
+            topo = topo.subset(atoms)
         
-        _traj = self.__class__(_coords, topo, _velos)
+        _traj = self.__class__(coords, topo, velos)
+        
+        if copy:
+            return _traj.copy()
         
         return _traj
+    
+    def copy(self):
+        '''An independent trajectory, lazy coordinates are decoded.'''
+        
+        velos = None
+        if hasattr(self.velos, 'shape'):
+            velos = np.array(self.velos)
+        
+        return self.__class__(np.array(self.coords), deepcopy(self.topology), velos)
         
     def parse_boundary(self, center=False, enable_tqdm=False):
-        '''Read data from hoomd.trajecotry
+        '''Restore the configurations broken by the PBCs.
+        
         Parameters
         ----------
-        None
+        center : bool, default=False
+            Move the center of all atoms to the origin for each frame.
+        enable_tqdm : bool, default=False
+            Show the progress of restored chunks.
         
         Returns
         -------
         None
         '''
-        print('Restore configuration broken by the PBCs [step/total steps]:')
         bonds = self.topology.bonds
         box = self.topology.box
         
-        _coords = []
-
+        # The bond tree is walked in the same order for all frames
+        traversal = bond_traversal(bonds, self.coords.shape[1])
+        restore = partial(unwrap_coords, bonds=bonds, box=box, center=center, 
+                          traversal=traversal, inplace=True)
+        
+        if self.is_lazy:
+            # Restore the frames when they are decoded
+            self.coords.transform = restore
+            self.mark_modified()
+            return
+        
+        coords = np.array(self.coords, dtype=getattr(self.coords, 'dtype', float))
+        
         if enable_tqdm:
-            for i in tqdm(range(len(self.coords))):
-                _crds = self.coords[i]
-                crds = parse_boundary(_crds, bonds, box)
-                _coords.append(crds)
-            
-            if center:
-                for i in tqdm(range(len(_coords))):
-                    _crds = _coords[i]
-                    _coords[i] = _crds - np.mean(_crds, axis=0)
+            print('Restore configuration broken by the PBCs [chunk/total chunks]:')
+            chunk_size = set.trajectory_chunk_size
+            for i in tqdm(range(0, len(coords), chunk_size)):
+                restore(coords[i:i+chunk_size])
         else:
-            for i in range(len(self.coords)):
-                _crds = self.coords[i]
-                crds = parse_boundary(_crds, bonds, box)
-                _coords.append(crds)
-            
-            if center:
-                for i in range(len(_coords)):
-                    _crds = _coords[i]
-                    _coords[i] = _crds - np.mean(_crds, axis=0)
+            restore(coords)
                 
-        self.coords = np.array(_coords, dtype=float)
+        self.coords = coords
         
     def stack_coords(self):
         if isinstance(self.coords, list):
@@ -0,0 +1,253 @@
+'''
+Lazy gathers and concatenations of frames.
+
+Slicing a trajectory with index arrays does not copy the selected data, a
+``GatheredArray`` keeps the indices and gathers the frames chunk by chunk
+when they are used, like the lazy arrays of ``mdtrj.core.read_gsd``. A
+``ConcatenatedArray`` presents the frames of several arrays, e.g. restart
+segments, as one.
+'''
+
+import numpy as np
+
+import mdtrj.settings as set
+
+class GatheredArray(object):
+    '''
+        An array-like gather ``base[frames][:, atoms]``, read on demand.
+    '''
+
+    def __init__(self, base, frames, atoms=None, chunk_size=None):
+
+        self.base = base
+        self.frames = np.asarray(frames, dtype=np.int64)
+        self.atoms = atoms
+        self.chunk_size = chunk_size
+        self.transform = None
+
+        natoms = base.shape[1]
+        if atoms is not None:
+            natoms = len(range(natoms)[atoms]) if isinstance(atoms, slice) else len(atoms)
+        self.natoms = natoms
+
+    @property
+    def shape(self):
+        return (len(self.frames), self.natoms) + tuple(self.base.shape[2:])
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.base.dtype)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, key):
+
+        if isinstance(key, tuple):
+            frames = self[key[0]]
+            if isinstance(key[0], (int, np.integer)):
+                return frames[key[1:]]
+            return np.asarray(frames)[(slice(None),)+key[1:]]
+
+        if isinstance(key, (int, np.integer)):
+            return self._read(self.frames[[key]])[0]
+
+        return self._derive(self.frames[key])
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            for frame in chunk:
+                yield frame
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._read(self.frames)
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def iter_chunks(self, chunk_size=None):
+        '''Gather the frames chunk by chunk.
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            Default is ``self.chunk_size`` or ``settings.trajectory_chunk_size``.
+
+        Yields
+        ------
+        data : numpy array
+        '''
+
+        chunk_size = chunk_size or self.chunk_size or set.trajectory_chunk_size
+
+        for i in range(0, len(self.frames), chunk_size):
+            yield self._read(self.frames[i:i+chunk_size])
+
+    def _derive(self, frames):
+        arr = self.__class__(self.base, frames, self.atoms, self.chunk_size)
+        arr.transform = self.transform
+        return arr
+
+    def _read(self, frames):
+
+        # Consecutive frames are read as a slice, a view of an array base
+        if len(frames) > 0 and np.all(np.diff(frames) == 1):
+            data = self.base[int(frames[0]):int(frames[-1])+1]
+        elif isinstance(self.base, ConcatenatedArray):
+            # Index arrays of a concatenation are gathers themselves
+            data = self.base._read(frames)
+        else:
+            data = self.base[frames]
+        data = np.asarray(data)
+
+        if self.atoms is not None:
+            data = data[:, self.atoms]
+
+        # The transform works in place, never on the base
+        if self.transform is not None:
+            data = self.transform(np.array(data))
+
+        return data
+
+def take(arr, frames, atoms=None):
+    '''Select frames and atoms of a per-frame array without copying data.
+
+    Parameters
+    ----------
+    arr : numpy array or lazy array
+        With shape (nframes, natoms, ...).
+    frames : slice or 1D numpy array
+    atoms : slice or 1D numpy array, optional
+
+    Returns
+    -------
+    view : numpy array or lazy array
+        A numpy view for slices of a numpy array, a lazy array otherwise.
+    '''
+
+    if isinstance(frames, slice) and (atoms is None or isinstance(atoms, slice)):
+        if isinstance(arr, np.ndarray):
+            return arr[frames] if atoms is None else arr[frames, atoms]
+        if atoms is None:
+            return arr[frames]
+
+    # Negative and boolean indices become frame ids
+    frames = np.arange(len(arr))[frames]
+
+    return GatheredArray(arr, frames, atoms, getattr(arr, 'chunk_size', None))
+
+class ConcatenatedArray(object):
+    '''
+        Several per-frame arrays presented as one, nothing is copied.
+
+        The arrays (numpy arrays or lazy arrays) must agree in all but the
+        first dimension. Slices of consecutive frames return concatenated
+        views, stepped slices and index arrays return a ``GatheredArray``.
+    '''
+
+    def __init__(self, arrays, chunk_size=None):
+
+        self.arrays = list(arrays)
+        self.chunk_size = chunk_size
+        self.transform = None
+
+        self.offsets = np.zeros(len(self.arrays)+1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(arr) for arr in self.arrays])
+
+        shapes = {tuple(arr.shape[1:]) for arr in self.arrays}
+        if len(shapes) > 1:
+            raise ValueError(f'Arrays of different shapes {shapes} can not be concatenated')
+
+    @property
+    def shape(self):
+        return (int(self.offsets[-1]),) + tuple(self.arrays[0].shape[1:])
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        return np.result_type(*[arr.dtype for arr in self.arrays])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, key):
+
+        if isinstance(key, tuple):
+            frames = self[key[0]]
+            if isinstance(key[0], (int, np.integer)):
+                return frames[key[1:]]
+            return np.asarray(frames)[(slice(None),)+key[1:]]
+
+        if isinstance(key, (int, np.integer)):
+            return self._read(np.arange(len(self))[[key]])[0]
+
+        frames = np.arange(len(self))[key]
+        if isinstance(key, slice) and key.step in [None, 1]:
+            return self._derive(frames)
+
+        return GatheredArray(self, frames, chunk_size=self.chunk_size)
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            for frame in chunk:
+                yield frame
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._read(np.arange(len(self)))
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def iter_chunks(self, chunk_size=None):
+        '''Read the frames chunk by chunk, a chunk never spans two arrays.
+
+        Yields
+        ------
+        data : numpy array
+        '''
+
+        chunk_size = chunk_size or self.chunk_size or set.trajectory_chunk_size
+
+        for arr in self.arrays:
+            if hasattr(arr, 'iter_chunks'):
+                chunks = arr.iter_chunks(chunk_size)
+            else:
+                chunks = (arr[i:i+chunk_size] for i in range(0, len(arr), chunk_size))
+            for data in chunks:
+                if self.transform is not None:
+                    data = self.transform(np.array(data))
+                yield data
+
+    def _derive(self, frames):
+        '''Views of a consecutive range of frames.'''
+
+        pieces = []
+        for arr, first, last in zip(self.arrays, self.offsets[:-1], self.offsets[1:]):
+            local = frames[(frames >= first) & (frames < last)] - first
+            if len(local) > 0:
+                pieces.append(arr[int(local[0]):int(local[-1])+1])
+
+        arr = self.__class__(pieces or [self.arrays[0][:0]], self.chunk_size)
+        arr.transform = self.transform
+        return arr
+
+    def _read(self, frames):
+
+        data = np.zeros((len(frames),) + self.shape[1:], dtype=self.dtype)
+
+        segments = np.searchsorted(self.offsets, frames, side='right') - 1
+        for s in np.unique(segments):
+            ids = np.nonzero(segments == s)[0]
+            data[ids] = np.asarray(self.arrays[s][frames[ids] - self.offsets[s]])
+
+        if self.transform is not None:
+            data = self.transform(data)
+
+        return data
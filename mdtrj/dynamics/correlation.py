@@ -0,0 +1,261 @@
+'''
+Time correlation functions computed with the FFT.
+
+The correlation of lag m is averaged over all time origins,
+C(m) = <x(t) y(t+m)>, and costs O(T log T) for T frames.
+'''
+
+import numpy as np
+
+from mdtrj.core.selection import as_index
+from mdtrj.configuration.gyration import gyration_analyze, molecule_gyration_analyze
+
+def correlate(x, y=None, max_lag=None, normalize=False, subtract_mean=False, batch_size=None,
+              block_size=None, atoms=None):
+    '''Time correlation of every component along the first axis.
+
+    Parameters
+    ----------
+    x : numpy array or lazy array
+        A series with shape (nframes, ...), e.g. ``Trajectory.velos``.
+    y : numpy array or lazy array, optional
+        Cross correlate x with y of the same shape, default is the autocorrelation.
+    max_lag : int, optional
+        Lags 0 to max_lag-1 are computed, default is all lags.
+    normalize : bool
+        Divide the correlations by the lag 0 values.
+    subtract_mean : bool
+        Correlate the fluctuations from the time averages.
+    batch_size : int, optional
+        Number of components (x.shape[1:] flattened) transformed at once,
+        default keeps a batch about 128 MB.
+    block_size : int, optional
+        Accumulate the correlations over blocks of this many time origins,
+        only ``block_size + max_lag`` frames are read at once. It is used
+        for long series with a small ``max_lag``.
+    atoms : slice or 1D numpy array, optional
+        Gather index of the second axis of x and y, applied to every block
+        that is read, so a lazy array is never decoded in full.
+
+    Returns
+    -------
+    correlations : numpy array
+        With shape (max_lag, ...), components are not summed.
+    '''
+
+    nframes = len(x)
+    max_lag = nframes if max_lag is None else min(max_lag, nframes)
+    shape = tuple(x.shape[1:])
+    if atoms is not None:
+        shape = (len(np.arange(shape[0])[atoms]),) + shape[1:]
+    auto = y is None
+
+    mean_x = mean_y = None
+    if subtract_mean:
+        mean_x = _time_mean(x, atoms)
+        mean_y = mean_x if auto else _time_mean(y, atoms)
+
+    ncols = int(np.prod(shape))
+    if batch_size is None:
+        batch_size = max(1, 2**24//max(nframes, 1))
+
+    sums = np.zeros((max_lag, ncols))
+
+    if block_size is None:
+        block_size = nframes
+
+    for start in range(0, nframes, block_size):
+        stop = min(start + block_size, nframes)
+        end = min(stop + max_lag - 1, nframes)
+        xs = _read(x, start, end, mean_x, atoms).reshape(end-start, ncols)
+        ys = xs if auto else _read(y, start, end, mean_y, atoms).reshape(end-start, ncols)
+
+        for i in range(0, ncols, batch_size):
+            xb = xs[:, i:i+batch_size]
+            yb = xb if auto else ys[:, i:i+batch_size]
+            sums[:, i:i+batch_size] += _correlation_sums(xb, yb, stop-start, max_lag)
+
+    counts = (nframes - np.arange(max_lag))[:, None]
+    correlations = (sums/counts).reshape((max_lag,) + shape)
+
+    if normalize:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlations = correlations/correlations[:1]
+
+    return correlations
+
+def compute_vacf(trajectory, atom_selections=None, max_lag=None, normalize=True, average=True,
+                 block_size=None):
+    '''Velocity autocorrelation function <v(t).v(t+m)>.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+        Loaded with ``read_velo=True``.
+    atom_selections : 1D list or numpy array or Selection, optional
+        Default is all atoms.
+    max_lag : int, optional
+    normalize : bool
+        Divide by <v.v>.
+    average : bool
+        Average over the atoms, otherwise the VACF of every atom is returned.
+    block_size : int, optional
+        See ``correlate``.
+
+    Returns
+    -------
+    vacf : 1D or 2D numpy array
+        With shape (max_lag,) or (max_lag, natoms).
+    '''
+
+    if isinstance(trajectory, list):
+        return [compute_vacf(trj, atom_selections, max_lag, normalize, average, block_size)
+                for trj in trajectory]
+
+    velos = trajectory.velos
+    if velos is None:
+        raise ValueError('The trajectory has no velocities, load it with read_velo=True')
+
+    # The atoms are gathered block by block, lazy velocities are not decoded at once
+    vacf = np.sum(correlate(velos, max_lag=max_lag, block_size=block_size,
+                            atoms=as_index(atom_selections)), axis=-1)
+
+    return _reduce(vacf, normalize, average)
+
+def compute_gyration_acf(trajectory, key='Rg', atom_selections=[], per_molecule=False, molecules=None,
+                         max_lag=None, normalize=True, subtract_mean=True, mass_weighted=False):
+    '''Autocorrelation of a gyration observable, e.g. 'Rg' or 'tan2XG'.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+    key : str
+        One of the scalar keys of ``gyration_analyze``.
+    atom_selections : list
+        The atoms of ``gyration_analyze``, not used if per_molecule.
+    per_molecule : bool
+        Average the autocorrelations of every molecule, with
+        ``molecule_gyration_analyze``.
+    molecules : 1D numpy array, optional
+    max_lag : int, optional
+    normalize : bool
+    subtract_mean : bool
+        Correlate the fluctuations from the time average.
+    mass_weighted : bool
+
+    Returns
+    -------
+    acf : 1D numpy array
+    '''
+
+    if isinstance(trajectory, list):
+        return [compute_gyration_acf(trj, key, atom_selections, per_molecule, molecules, max_lag,
+                                     normalize, subtract_mean, mass_weighted) for trj in trajectory]
+
+    if per_molecule:
+        series = molecule_gyration_analyze(trajectory, molecules, mass_weighted)[key]
+    else:
+        series = gyration_analyze(trajectory, atom_selections, mass_weighted=mass_weighted)[key]
+
+    acf = correlate(series, max_lag=max_lag, subtract_mean=subtract_mean)
+
+    return _reduce(acf, normalize, True)
+
+def compute_end_to_end_acf(trajectory, ends=None, max_lag=None, normalize=True, average=True):
+    '''Autocorrelation of the end-to-end vectors <R(t).R(t+m)>.
+
+    Coordinates must be unwrapped.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+    ends : 2D list or numpy array, optional
+        Pairs of (first, last) atoms of the chains, default are the first
+        and last atoms of every molecule of ``Topology.get_molecules()``.
+    max_lag : int, optional
+    normalize : bool
+        Divide by <R.R>.
+    average : bool
+        Average over the chains.
+
+    Returns
+    -------
+    acf : 1D or 2D numpy array
+        With shape (max_lag,) or (max_lag, nchains).
+    '''
+
+    if isinstance(trajectory, list):
+        return [compute_end_to_end_acf(trj, ends, max_lag, normalize, average) for trj in trajectory]
+
+    if ends is None:
+        ends = _molecule_ends(trajectory.topology.get_molecules())
+    ends = np.array(ends, dtype=np.int64).reshape(-1, 2)
+
+    vectors = []
+    for coords in trajectory.iter_chunks():
+        vectors.append(coords[:, ends[:, 1]] - coords[:, ends[:, 0]])
+    vectors = np.concatenate(vectors)
+
+    acf = np.sum(correlate(vectors, max_lag=max_lag), axis=-1)
+
+    return _reduce(acf, normalize, average)
+
+def _correlation_sums(x, y, norigins, max_lag):
+    '''Sums of x(t)y(t+m) over the first norigins frames t of x.'''
+
+    size = 2**int(np.ceil(np.log2(max(norigins + max(len(y), max_lag), 2))))
+
+    fx = np.fft.rfft(x[:norigins], n=size, axis=0)
+    fy = fx if y is x and norigins == len(x) else np.fft.rfft(y, n=size, axis=0)
+
+    return np.fft.irfft(fx.conjugate()*fy, n=size, axis=0)[:max_lag]
+
+def _read(x, start, stop, mean=None, atoms=None):
+    '''Read frames of an array or a lazy array.'''
+
+    xs = x[start:stop]
+    if atoms is not None:
+        xs = np.asarray(xs)[:, atoms]
+    xs = np.asarray(xs, dtype=float)
+    if mean is not None:
+        xs = xs - mean
+
+    return xs
+
+def _time_mean(x, atoms=None):
+
+    if hasattr(x, 'iter_chunks'):
+        total = 0
+        for chunk in x.iter_chunks():
+            if atoms is not None:
+                chunk = chunk[:, atoms]
+            total = total + np.sum(chunk, axis=0)
+        return total/len(x)
+
+    x = np.asarray(x, dtype=float)
+    if atoms is not None:
+        x = x[:, atoms]
+
+    return np.mean(x, axis=0)
+
+def _reduce(correlations, normalize, average):
+    '''Average over the columns and normalize by lag 0.'''
+
+    if average and correlations.ndim > 1:
+        correlations = np.mean(correlations.reshape(len(correlations), -1), axis=1)
+
+    if normalize:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlations = correlations/correlations[:1]
+
+    return correlations
+
+def _molecule_ends(molecules):
+    '''The first and last atoms of every molecule.'''
+
+    molecules = np.asarray(molecules)
+    ids = np.arange(len(molecules))
+    _, first = np.unique(molecules, return_index=True)
+    _, last = np.unique(molecules[::-1], return_index=True)
+
+    return np.stack([ids[first], ids[::-1][last]], axis=1)
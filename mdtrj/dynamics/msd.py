@@ -0,0 +1,139 @@
+import numpy as np
+
+from mdtrj.core.selection import as_index
+from mdtrj.geometry.rcm import compute_rcm, compute_molecule_rcm
+from mdtrj.dynamics.correlation import correlate
+
+def compute_msd(trajectory, atom_selections=None, mode='atom', lags=None, nlags=50, molecules=None,
+                batch_size=None):
+    '''Compute the mean squared displacement over all time origins.
+
+    The FFT (Wiener-Khinchin) algorithm is used, the cost is O(T log T) for
+    T frames. Coordinates must be unwrapped, e.g. loaded with
+    ``parse_boundary=True`` or ``parse_boundary='image'``.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+    atom_selections : 1D list or numpy array or Selection, optional
+        Default is all atoms.
+    mode : str
+        'atom' : MSD of every selected atom.
+        'selection' : MSD of the centre of mass of the selected atoms.
+        'molecule' : MSD of the centre of mass of every molecule.
+    lags : 1D list or numpy array or 'log', optional
+        Lags in frames, default is all lags. 'log' gives ``nlags`` log spaced lags.
+    nlags : int
+    molecules : 1D numpy array, optional
+        Molecule id of every atom for the 'molecule' mode, default is
+        ``Topology.get_molecules()``.
+    batch_size : int, optional
+        Number of atoms transformed at once, default keeps a batch about 128 MB.
+
+    Returns
+    -------
+    lags : 1D numpy array
+    msd : 2D numpy array
+        With shape (nlags, natoms), (nlags, 1) or (nlags, nmolecules).
+    '''
+
+    if isinstance(trajectory, list):
+        results = [compute_msd(trj, atom_selections, mode, lags, nlags, molecules, batch_size)
+                   for trj in trajectory]
+        return [res[0] for res in results], [res[1] for res in results]
+
+    nframes = len(trajectory)
+    lags = _lags(nframes, lags, nlags)
+
+    if mode == 'atom':
+        natoms = trajectory.coords.shape[1]
+        index = as_index(atom_selections)
+        atom_selections = np.arange(natoms)[slice(None) if index is None else index]
+
+        if batch_size is None:
+            batch_size = max(1, 2**24//max(nframes*3, 1))
+
+        msd = np.zeros((len(lags), len(atom_selections)))
+        for i in range(0, len(atom_selections), batch_size):
+            coords = _gather_atoms(trajectory, atom_selections[i:i+batch_size])
+            msd[:, i:i+batch_size] = msd_fft(coords)[lags]
+
+        return lags, msd
+
+    if mode == 'selection':
+        rcms = compute_rcm(trajectory, atom_selections)[:, None]
+
+    elif mode == 'molecule':
+        rcms = compute_molecule_rcm(trajectory, molecules)
+
+    else:
+        raise ValueError(f'Unknown MSD mode {mode}')
+
+    return lags, msd_fft(rcms)[lags]
+
+def msd_fft(coords):
+    '''MSD of all lags with the FFT algorithm.
+
+    Parameters
+    ----------
+    coords : 3D numpy array
+        Unwrapped coordinates with shape (nframes, natoms, 3).
+
+    Returns
+    -------
+    msd : 2D numpy array
+        With shape (nframes, natoms), the MSD of lag m is ``msd[m]``.
+    '''
+
+    nframes = coords.shape[0]
+
+    # S2(m) = sum_t r(t).r(t+m)/(T-m)
+    s2 = np.sum(correlate(coords), axis=-1)
+
+    # S1(m) = sum_t r(t)^2 + r(t+m)^2, recursively
+    d = np.sum(coords**2, axis=-1)
+    d = np.concatenate([d, np.zeros((1, d.shape[1]))])
+    q = 2*np.sum(d, axis=0)
+    s1 = np.zeros((nframes, coords.shape[1]))
+    for m in range(nframes):
+        q = q - d[m-1] - d[nframes-m]
+        s1[m] = q/(nframes - m)
+
+    return s1 - 2*s2
+
+def _gather_atoms(trajectory, atoms):
+    '''Coordinates of a batch of atoms in all frames, as a float array.
+
+    Lazy coordinates are decoded chunk by chunk into the batch, only the
+    batch is kept in memory.
+    '''
+
+    # A contiguous range is read as a slice
+    index = as_index(atoms)
+
+    if not trajectory.is_lazy:
+        return np.asarray(np.asarray(trajectory.coords)[:, index], dtype=float)
+
+    coords = np.zeros((len(trajectory), len(atoms), 3))
+    start = 0
+    for chunk in trajectory.iter_chunks():
+        coords[start:start+len(chunk)] = chunk[:, index]
+        start += len(chunk)
+
+    return coords
+
+def _lags(nframes, lags=None, nlags=50):
+    '''Lags in frames.'''
+
+    if lags is None:
+        return np.arange(nframes)
+
+    if isinstance(lags, str):
+        if lags != 'log':
+            raise ValueError(f'Unknown lags {lags}')
+        if nframes < 2:
+            return np.arange(nframes)
+        logs = np.logspace(0, np.log10(nframes-1), nlags)
+        return np.concatenate([[0], np.unique(np.round(logs).astype(np.int64))])
+
+    return np.array(lags, dtype=np.int64)
@@ -1,12 +1,38 @@
-from pypolymer.util import geometry_approximate
-
 import numpy as np
+from numba import njit, prange
 
+from mdtrj.core.selection import Selection, as_index
 from mdtrj.geometry.rcm import compute_rcm
 
 def geometry_construct(trj=None, coords=None, atom_selections=None):
+    '''
+    Construct the surface of a closed line in every frame.
 
-    if isinstance(atom_selections, list) or isinstance(atom_selections, np.ndarray):
+    The vector area of the loop, 1/2 sum r_i x r_{i+1}, is computed by a
+    parallel kernel over the frames, chunk by chunk for lazy trajectories.
+
+    Parameters
+    ----------
+    trj : mdtrj.Trajectory, optional
+    coords : 2D or 3D numpy array, optional
+        Used if trj is not given.
+    atom_selections : list or numpy array or int
+        The atoms of the loop in the order they are connected, an int n
+        selects the first n atoms. A Selection is sorted and does not keep
+        an order, so it is rejected.
+
+    Returns
+    -------
+    Nvecs : 1D or 2D numpy array
+        With shape (7,) or (nframes, 7), ``[:3]`` the normal vector, ``[3:6]``
+        the projections of the surface on the yz, zx, xy planes and ``[-1]``
+        the surface area.
+    '''
+
+    if isinstance(atom_selections, Selection):
+        raise TypeError('The atoms of a loop must be given in order as a list or numpy array, '
+                        'a Selection is sorted')
+    elif isinstance(atom_selections, (list, np.ndarray)):
         atom_selections = np.array(atom_selections, dtype=int)
     elif isinstance(atom_selections, int):
         if atom_selections>0:
@@ -15,79 +41,145 @@ def geometry_construct(trj=None, coords=None, atom_selections=None):
             atom_selections = np.array([])
     else:
         atom_selections = np.array([])
-    
-    Nvecs = []
-    all_coords = []
-    
+
     if trj is not None:
-        all_coords = trj.coords
+        chunks = trj.iter_chunks()
+        nframes = len(trj)
     elif (trj is None) and (coords is not None):
-        Nvecs = []
         if coords.ndim == 2:
-            all_coords = np.array([coords], dtype=float)
-        elif coords.ndim == 3:
-            all_coords = np.array(coords, dtype=float)
-        else:
+            coords = np.array([coords], dtype=float)
+        elif coords.ndim != 3:
             raise ValueError(f'Wrong position data: {coords.shape}, the dimesion must be 2D or 3D')
+        chunks = [coords]
+        nframes = len(coords)
     else:
         raise ValueError(f'No geometry data provided!')
-        
-    if len(all_coords) >= 1:
-    
+
+    Nvecs = np.zeros((0, 7))
+
+    if nframes >= 1:
+
         if len(atom_selections)>0:
-            for coord in all_coords:
-                _coord = coord[atom_selections]
-                nvec = geometry_approximate(_coord)
-                Nvecs.append(np.squeeze(nvec))
+            # The order of the loop is kept, a slice only if it is increasing
+            index = as_index(atom_selections)
+            Nvecs = []
+            for chunk in chunks:
+                loop = np.ascontiguousarray(chunk[:, index], dtype=float)
+                nvecs = np.zeros((len(loop), 7))
+                _loop_vectors(loop, nvecs)
+                Nvecs.append(nvecs)
+            Nvecs = np.concatenate(Nvecs)
         else:
             print('No atoms selected, this function will do nothing!')
-        Nvecs = np.array(Nvecs, dtype=float)
-        
-    if len(all_coords) == 1:
+
+    if nframes == 1:
         return Nvecs[0]
     else:
         return Nvecs
-    
+
+def compute_loop_geometry(trj=None, coords=None, atom_selections=None):
+    '''
+    The areas and normal vectors of a closed line from one computation.
+
+    Parameters
+    ----------
+    trj: MDTrj.trajectory
+    coords: 2D or 3D numpy array, optional
+    atom_selections: list or numpy array
+        The atoms of the loop in order, see ``geometry_construct``.
+
+    Returns
+    -------
+    Areas : 1D Numpy Array
+    xyz_Areas : 2D Numpy Array
+    Nvecs : 2D Numpy Array
+    '''
+
+    Nvecs = np.atleast_2d(geometry_construct(trj, coords, atom_selections))
+
+    return Nvecs[:,-1], Nvecs[:,3:6], Nvecs[:,:3]
 
 def compute_area_3d(trj=None, coords=None, atom_selections=None):
     '''
     Construct the surface of a closed line.
-    
+
     Parameters
     ----------
     trj: MDTrj.trajectory
-    
+
     Returns
     -------
     Areas : 1D Numpy Array
         The surface areas
-        
+
     xyz_Areas : 3D Numpy Array
         The components of projections of surface on each plane.
     '''
 
-    Nvecs = geometry_construct(trj, coords, atom_selections)
-    
-    Areas = Nvecs[:,-1]
-    xyz_Areas = Nvecs[:,3:6]
-    
+    Areas, xyz_Areas, _ = compute_loop_geometry(trj, coords, atom_selections)
+
     return Areas, xyz_Areas
-    
+
 def compute_normal_vector_3d(trj=None, coords=None, atom_selections=None):
-    
+
     '''
     Construct the surface of a closed line.
-    
+
     Parameters
     ----------
     trj: MDTrj.trajectory
     atom_selections: list
-    
+
     Returns
     -------
     Nvecs: normal vector of all constructed surfaces.
     '''
-    
-    Nvecs = geometry_construct(trj, coords, atom_selections)
-    
-    return Nvecs[:, :3]
\ No newline at end of file
+
+    _, _, Nvecs = compute_loop_geometry(trj, coords, atom_selections)
+
+    return Nvecs
+
+@njit(parallel=True, cache=True)
+def _loop_vectors(coords, nvecs):
+    '''
+    Vector areas of the closed loops of all frames, filled into nvecs.
+
+    Positions are taken relative to the first atom, which leaves the vector
+    area of a closed loop unchanged and keeps the sums precise.
+    '''
+
+    natoms = coords.shape[1]
+
+    for f in prange(coords.shape[0]):
+
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+
+        for i in range(natoms):
+            j = i + 1
+            if j == natoms:
+                j = 0
+            xi = coords[f, i, 0] - coords[f, 0, 0]
+            yi = coords[f, i, 1] - coords[f, 0, 1]
+            zi = coords[f, i, 2] - coords[f, 0, 2]
+            xj = coords[f, j, 0] - coords[f, 0, 0]
+            yj = coords[f, j, 1] - coords[f, 0, 1]
+            zj = coords[f, j, 2] - coords[f, 0, 2]
+            ax += yi*zj - zi*yj
+            ay += zi*xj - xi*zj
+            az += xi*yj - yi*xj
+
+        ax *= 0.5
+        ay *= 0.5
+        az *= 0.5
+        area = np.sqrt(ax*ax + ay*ay + az*az)
+
+        nvecs[f, 3] = ax
+        nvecs[f, 4] = ay
+        nvecs[f, 5] = az
+        nvecs[f, 6] = area
+        if area > 0:
+            nvecs[f, 0] = ax/area
+            nvecs[f, 1] = ay/area
+            nvecs[f, 2] = az/area
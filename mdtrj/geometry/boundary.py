@@ -1,19 +1,210 @@
+import numpy as np
+from numba import njit, prange
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+
 def parse_boundary(mol, bonds, box, bl=1):
-  
-    bonds = bonds[np.argsort(bonds[:,0])]
-    parsed_index = [0]
-
-    for bond in bonds:
-        p0 = mol[bond[0]]
-        p1 = mol[bond[1]]
-        _p1 = copy.deepcopy(p1)
-        vec = p1-p0
-        absvec = np.abs(vec)
-        if bond[1] not in parsed_index:
-            for i in range(3):
-                if np.abs(vec[i])>box[i]/2:
-                    _p1[i] = -(vec[i]/absvec[i])*box[i]+_p1[i]
-            parsed_index.append(bond[1])
-        mol[bond[1]] = _p1
-        
-    return mol
+    '''Restore a configuration broken by the PBCs along its bonds.
+
+    Parameters
+    ----------
+    mol : 2D numpy array
+        Positions of one frame.
+    bonds : 2D numpy array
+    box : 1D numpy array
+
+    Returns
+    -------
+    mol : 2D numpy array
+    '''
+
+    return unwrap_coords(np.array([mol], dtype=float), bonds, box, inplace=True)[0]
+
+def unwrap_coords(coords, bonds, box, center=False, traversal=None, inplace=False):
+    '''Restore the configurations broken by the PBCs for all frames at once.
+
+    Each bonded atom is moved to the minimum image of its bond partner, walking
+    the bond tree of every molecule from its first atom. Atoms of different
+    molecules are restored independently.
+
+    Parameters
+    ----------
+    coords : 3D numpy array
+        Positions with shape (frames, atoms, 3).
+    bonds : 2D numpy array
+    box : 1D numpy array
+        Box [Lx, Ly, Lz, xy, xz, yz], the tilt factors are optional.
+    center : bool
+        Move the center of all atoms to the origin for each frame.
+    traversal : tuple, optional
+        Precomputed result of ``bond_traversal``.
+    inplace : bool
+        Modify ``coords`` directly.
+
+    Returns
+    -------
+    coords : 3D numpy array
+    '''
+
+    if inplace and isinstance(coords, np.ndarray):
+        _coords = coords
+    else:
+        _coords = np.array(coords, dtype=float)
+
+    if traversal is None:
+        traversal = bond_traversal(bonds, _coords.shape[1])
+    parents, children = traversal
+
+    if len(children) > 0:
+        _unwrap_frames(_coords, parents, children, as_box(box))
+
+    if center:
+        _coords -= np.mean(_coords, axis=1, keepdims=True)
+
+    return _coords
+
+def unwrap_images(coords, images, box, out=None):
+    '''Restore the positions with the image flags.
+
+    Parameters
+    ----------
+    coords : 2D or 3D numpy array
+        Wrapped positions.
+    images : numpy array of int
+        Image flags, the same shape as ``coords``.
+    box : 1D or 2D numpy array
+        Box of all frames, or box of each frame with shape (frames, 6).
+    out : numpy array, optional
+        Output array, can be ``coords`` itself.
+
+    Returns
+    -------
+    coords : numpy array
+        ``coords + images @ box_matrix(box).T``
+    '''
+
+    h = box_matrix(box)
+
+    if h.ndim == 2:
+        shift = images @ h.T
+    else:
+        shift = np.einsum('fij,fnj->fni', h, images)
+
+    return np.add(coords, shift, out=out)
+
+def box_matrix(box):
+    '''Convert a hoomd box to the matrix of box vectors.
+
+    Parameters
+    ----------
+    box : 1D or 2D numpy array
+        [Lx, Ly, Lz, xy, xz, yz], or boxes of several frames.
+
+    Returns
+    -------
+    h : 2D or 3D numpy array
+        Box vectors as columns, (3, 3) for each box.
+    '''
+
+    box = as_box(box)
+    lx, ly, lz, xy, xz, yz = [box[..., i] for i in range(6)]
+
+    h = np.zeros(box.shape[:-1]+(3, 3))
+    h[..., 0, 0] = lx
+    h[..., 0, 1] = xy*ly
+    h[..., 0, 2] = xz*lz
+    h[..., 1, 1] = ly
+    h[..., 1, 2] = yz*lz
+    h[..., 2, 2] = lz
+
+    return h
+
+def as_box(box):
+    '''Convert [Lx, Ly, Lz] or [Lx, Ly, Lz, xy, xz, yz] to a 6 entries box.'''
+
+    box = np.asarray(box, dtype=float)
+    _box = np.zeros(box.shape[:-1]+(6,))
+    _box[..., :box.shape[-1]] = box[..., :6]
+
+    return _box
+
+def bond_traversal(bonds, natoms):
+    '''Compute the order to restore molecules along their bonds.
+
+    Parameters
+    ----------
+    bonds : 2D numpy array
+    natoms : int
+
+    Returns
+    -------
+    parents : 1D numpy array
+    children : 1D numpy array
+        ``children[i]`` is restored with respect to ``parents[i]``, every parent
+        is restored before it is used.
+    '''
+
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+
+    graph = coo_matrix((np.ones(len(bonds)), (bonds[:,0], bonds[:,1])),
+                       shape=(natoms, natoms))
+    _, labels = connected_components(graph, directed=False)
+
+    # Connect a virtual atom to the first atom of every molecule,
+    # so all molecules are walked by a single breadth first search
+    roots = np.unique(labels, return_index=True)[1]
+    row = np.concatenate([bonds[:,0], np.full(len(roots), natoms)])
+    col = np.concatenate([bonds[:,1], roots])
+    graph = coo_matrix((np.ones(len(row)), (row, col)),
+                       shape=(natoms+1, natoms+1)).tocsr()
+
+    order, predecessors = breadth_first_order(graph, natoms, directed=False,
+                                              return_predecessors=True)
+
+    children = order[1:]
+    parents = predecessors[children]
+    bonded = parents != natoms
+
+    return parents[bonded].astype(np.int64), children[bonded].astype(np.int64)
+
+@njit(parallel=True, cache=True)
+def _unwrap_frames(coords, parents, children, box):
+    '''Apply the minimum image corrections along the bond tree in place.'''
+
+    for step_id in prange(coords.shape[0]):
+        for k in range(children.shape[0]):
+            c, p = children[k], parents[k]
+            dx, dy, dz = minimum_image(coords[step_id, c, 0] - coords[step_id, p, 0],
+                                       coords[step_id, c, 1] - coords[step_id, p, 1],
+                                       coords[step_id, c, 2] - coords[step_id, p, 2],
+                                       box)
+            coords[step_id, c, 0] = coords[step_id, p, 0] + dx
+            coords[step_id, c, 1] = coords[step_id, p, 1] + dy
+            coords[step_id, c, 2] = coords[step_id, p, 2] + dz
+
+    return coords
+
+@njit(cache=True)
+def minimum_image(dx, dy, dz, box):
+    '''The minimum image of a vector in a (triclinic) hoomd box.
+
+    Box lengths not larger than 0 are treated as non-periodic.
+    '''
+
+    lx, ly, lz, xy, xz, yz = box[0], box[1], box[2], box[3], box[4], box[5]
+
+    if lz > 0:
+        img = np.rint(dz/lz)
+        dz -= lz*img
+        dy -= yz*lz*img
+        dx -= xz*lz*img
+    if ly > 0:
+        img = np.rint(dy/ly)
+        dy -= ly*img
+        dx -= xy*ly*img
+    if lx > 0:
+        img = np.rint(dx/lx)
+        dx -= lx*img
+
+    return dx, dy, dz
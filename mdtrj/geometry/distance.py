@@ -1,82 +1,96 @@
 import numpy as np
 from numba import njit, prange
 
-from multiprocessing import Pool
+from mdtrj.core.executor import get_executor
+from mdtrj.geometry.boundary import as_box, minimum_image
 
-def compute_distance(trajectory, atom_pairs=None, parallel=False, procs=10):
+def compute_distance(trajectory, atom_pairs=None, parallel=False, procs=None, periodic=False,
+                     dtype=float):
     '''Compute the distance of two points along trajectory(s)
-    
+
     Parameters
     ----------
     trajectory : mdtrj.trajectory or [mdtrajectory, ]
     atom_pairs : 2D list or 2D numpy array
     parallel : bool
-    procs : int
-    
+        Compute the trajectories in worker processes.
+    procs : int, optional
+        Default reuses the running workers.
+    periodic : bool
+        Use the minimum image convention with ``Topology.box``.
+    dtype : numpy dtype
+        Precision of the output distances, float32 or float64.
+
     Returns
     -------
-    distances : a list with len(atom_pairs) distances list
+    distances : 2D numpy array or a list of them
+        Distances with shape (nframes, npairs).
     '''
-    distances = []
+
     if isinstance(trajectory, list):
         if parallel:
             params = []
             for i in range(len(trajectory)):
-                params.append([trajectory[i], atom_pairs])
-            with Pool(processes=procs) as pool:
-                distances = pool.starmap(_compute_distance, params)
-                pool.close()
-                pool.join()
+                params.append([trajectory[i], atom_pairs, periodic, dtype])
+            distances = get_executor(procs).starmap(_compute_distance, params)
         else:
+            distances = []
             for trj in trajectory:
-                distances.append(_compute_distance(trj, atom_pairs))
-    
+                distances.append(_compute_distance(trj, atom_pairs, periodic, dtype))
+
     else:
-        distances = _compute_distance(trajectory, atom_pairs)
-        
-    _distances = np.array(distances, dtype=float)
-    
-    distances = []
-    for i in range(len(atom_pairs)):
-        distances.append(_distances[:,i])
-        
+        distances = _compute_distance(trajectory, atom_pairs, periodic, dtype)
+
     return distances
-    
-def _compute_distance(trajectory, pairs):
+
+def _compute_distance(trajectory, pairs, periodic=False, dtype=float):
     '''Perform distance computation
-    
+
     Parameters
     ----------
     trajectory : mdtrj.trajectory
     pairs : 2D list
-    
+    periodic : bool
+    dtype : numpy dtype
+
     Returns
     -------
-    distances : 1D list with len(paris) 1d array
+    distances : 2D numpy array
     '''
-    
-    distances = []
-    if trajectory.is_iterator:
-        for coords in trajectory.coords:
-            dist = []
-            for pair in pairs:
-                dist.append(np.linalg.norm(coords[pair[0]]-coords[pair[1]]))
-            distances.append(dist)
-    else:
-        pairs = np.array(pairs, dtype=int)
-        coords = np.array(trajectory.coords, dtype=float)
-        distances = _compute_distance_all(coords, pairs)
- 
-@njit(cache=True)   
-def _compute_distance_all(coords, pairs):
+
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    box = np.zeros(6)
+    if periodic:
+        box = as_box(trajectory.topology.box)
+
+    distances = np.zeros((len(trajectory), len(pairs)), dtype=dtype)
+
+    # Filled chunk by chunk, lazy trajectories are never fully loaded
+    i = 0
+    for coords in trajectory.iter_chunks():
+        coords = np.asarray(coords)
+        _compute_distance_all(coords, pairs, box, distances[i:i+len(coords)])
+        i += len(coords)
+
+    return distances
+
+@njit(parallel=True, cache=True)
+def _compute_distance_all(coords, pairs, box, distances):
     '''
     A function calculates all distance use numba
+
+    Box lengths not larger than 0 are not periodic.
     '''
     nsteps = coords.shape[0]
     npairs = pairs.shape[0]
-    distances = np.zeros((nsteps, npairs))
-    for i in prange(nsteps):
-        for j in prange(npairs):
-            distances[i][j] = np.linalg.norm(coords[i][pairs[j][0]]- coords[i][pairs[j][1]])
-    
-    return distances
\ No newline at end of file
+
+    for k in prange(nsteps*npairs):
+        i, j = k//npairs, k%npairs
+        a, b = pairs[j, 0], pairs[j, 1]
+        dx, dy, dz = minimum_image(coords[i, b, 0] - coords[i, a, 0],
+                                   coords[i, b, 1] - coords[i, a, 1],
+                                   coords[i, b, 2] - coords[i, a, 2], box)
+        distances[i, j] = np.sqrt(dx*dx + dy*dy + dz*dz)
+
+    return distances
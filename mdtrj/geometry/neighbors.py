@@ -0,0 +1,316 @@
+import numpy as np
+from numba import njit, prange
+
+from scipy.sparse import coo_matrix
+
+from mdtrj.geometry.boundary import as_box, box_matrix, minimum_image
+from mdtrj.core.selection import as_index
+
+def neighbor_search(trajectory, cutoff, atom_selections=None, periodic=True, exclude_bonded=False,
+                    return_distances=False):
+    '''Find all pairs of atoms closer than a cutoff in each frame.
+
+    A cell list is built for every frame, frames are searched in parallel.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory
+    cutoff : float
+    atom_selections : 1D list or numpy array or Selection, optional
+        Only search pairs in these atoms, default is all atoms.
+    periodic : bool
+        Use the periodic images of ``Topology.box``.
+    exclude_bonded : bool
+        Skip the pairs in ``Topology.bonds``.
+    return_distances : bool
+
+    Returns
+    -------
+    pairs : list of 2D numpy array
+        Pairs (i, j) with i < j of each frame, in atom ids of the trajectory.
+    distances : list of 1D numpy array
+        Returned if ``return_distances`` is True.
+    '''
+
+    all_pairs = []
+    all_distances = []
+
+    for pairs, distances in _iter_neighbors(trajectory, cutoff, atom_selections, periodic,
+                                            exclude_bonded):
+        all_pairs += pairs
+        all_distances += distances
+
+    if return_distances:
+        return all_pairs, all_distances
+
+    return all_pairs
+
+def compute_contact_map(trajectory, cutoff, atom_selections=None, periodic=True, exclude_bonded=False,
+                        sparse=False):
+    '''Compute the time averaged contact map.
+
+    Parameters
+    ----------
+    trajectory : mdtrj.Trajectory
+    cutoff : float
+    atom_selections : 1D list or numpy array or Selection, optional
+        Rows and columns of the map, default is all atoms.
+    periodic : bool
+    exclude_bonded : bool
+    sparse : bool
+        Return a scipy.sparse.csr_matrix instead of a dense numpy array.
+
+    Returns
+    -------
+    contact_map : 2D array
+        The fraction of frames that two atoms are in contact, symmetric.
+    '''
+
+    atoms = as_index(atom_selections)
+    ids = np.arange(trajectory.coords.shape[1])[slice(None) if atoms is None else atoms]
+
+    n = len(ids)
+    index = np.full(trajectory.coords.shape[1], -1, dtype=np.int64)
+    index[ids] = np.arange(n)
+
+    contacts = coo_matrix((n, n)).tocsr()
+
+    # Accumulated chunk by chunk
+    for pairs, _ in _iter_neighbors(trajectory, cutoff, atom_selections, periodic, exclude_bonded):
+        pairs = np.concatenate(pairs)
+        rows, cols = index[pairs[:,0]], index[pairs[:,1]]
+        contacts += coo_matrix((np.ones(len(pairs)), (rows, cols)), shape=(n, n)).tocsr()
+
+    contacts = (contacts + contacts.T)/max(len(trajectory), 1)
+
+    if sparse:
+        return contacts.tocsr()
+
+    return contacts.toarray()
+
+def _iter_neighbors(trajectory, cutoff, atom_selections=None, periodic=True, exclude_bonded=False):
+    '''Search the neighbors chunk by chunk.'''
+
+    natoms = trajectory.coords.shape[1]
+    index = as_index(atom_selections)
+    ids = None
+    if index is not None:
+        # Sorted unique ids keep i < j when the pairs are mapped back
+        ids = np.unique(np.arange(natoms)[index])
+        index = as_index(ids)
+
+    excluded = np.zeros(0, dtype=np.int64)
+    if exclude_bonded:
+        excluded = _bond_keys(trajectory.topology.bonds, ids, natoms)
+
+    box = np.zeros(6)
+    if periodic:
+        box = as_box(trajectory.topology.box)
+
+    for coords in trajectory.iter_chunks():
+
+        if index is not None:
+            coords = coords[:, index]
+        coords = np.ascontiguousarray(coords, dtype=float)
+
+        hinv, origin, ncell = _cell_grid(coords, box, cutoff, periodic)
+
+        counts = _count_pairs(coords, hinv, box, origin, ncell, periodic, cutoff, excluded)
+        offsets = np.zeros(len(counts)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+
+        out_i = np.zeros(offsets[-1], dtype=np.int64)
+        out_j = np.zeros(offsets[-1], dtype=np.int64)
+        out_d = np.zeros(offsets[-1])
+        _fill_pairs(coords, hinv, box, origin, ncell, periodic, cutoff, excluded,
+                    offsets, out_i, out_j, out_d)
+
+        if ids is not None:
+            out_i, out_j = ids[out_i], ids[out_j]
+
+        pairs = np.stack([out_i, out_j], axis=1)
+        yield np.split(pairs, offsets[1:-1]), np.split(out_d, offsets[1:-1])
+
+def _cell_grid(coords, box, cutoff, periodic):
+    '''Compute the mapping to fractional coordinates and the number of cells.'''
+
+    natoms = coords.shape[1]
+    # Cells larger than cutoff are still correct, but limit the memory
+    max_cells = max(1, int(round(2*natoms**(1/3))))
+
+    if periodic:
+        if np.any(box[:3] <= 0):
+            raise ValueError(f'Box {box} is not periodic in all dimensions, use periodic=False')
+        h = box_matrix(box)
+        hinv = np.linalg.inv(h)
+        origin = -np.sum(h, axis=1)/2
+        # Distances between the opposite faces of the box
+        widths = np.abs(np.linalg.det(h))/np.linalg.norm(np.cross(h[:, [1, 2, 0]].T,
+                                                                   h[:, [2, 0, 1]].T), axis=1)
+        if cutoff > np.min(widths)/2:
+            raise ValueError(f'Cutoff {cutoff} is larger than half of the box width {np.min(widths)}')
+    else:
+        origin = np.min(coords, axis=(0, 1))
+        widths = np.max(coords, axis=(0, 1)) - origin + 1e-8
+        hinv = np.diag(1/widths)
+
+    ncell = np.minimum(np.maximum(np.floor(widths/cutoff), 1), max_cells).astype(np.int64)
+
+    return hinv, origin, ncell
+
+def _bond_keys(bonds, ids, natoms):
+    '''Sorted keys i*n+j (i<j) of the bonded pairs in the searched atoms.'''
+
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    n = natoms
+
+    if ids is not None:
+        index = np.full(natoms, -1, dtype=np.int64)
+        index[ids] = np.arange(len(ids))
+        bonds = index[bonds]
+        bonds = bonds[np.all(bonds >= 0, axis=1)]
+        n = len(ids)
+
+    bonds = np.sort(bonds, axis=1)
+
+    return np.unique(bonds[:,0]*n + bonds[:,1])
+
+@njit(parallel=True, cache=True)
+def _count_pairs(coords, hinv, box, origin, ncell, periodic, cutoff, excluded):
+
+    counts = np.zeros(coords.shape[0], dtype=np.int64)
+    empty_i = np.zeros(0, dtype=np.int64)
+    empty_d = np.zeros(0)
+
+    for step_id in prange(coords.shape[0]):
+        counts[step_id] = _search_frame(coords[step_id], hinv, box, origin, ncell, periodic, cutoff,
+                                        excluded, empty_i, empty_i, empty_d, False)
+
+    return counts
+
+@njit(parallel=True, cache=True)
+def _fill_pairs(coords, hinv, box, origin, ncell, periodic, cutoff, excluded, offsets,
+                out_i, out_j, out_d):
+
+    for step_id in prange(coords.shape[0]):
+        a, b = offsets[step_id], offsets[step_id+1]
+        _search_frame(coords[step_id], hinv, box, origin, ncell, periodic, cutoff, excluded,
+                      out_i[a:b], out_j[a:b], out_d[a:b], True)
+
+@njit(cache=True)
+def _bin_atoms(pos, hinv, origin, ncell, periodic):
+    '''Assign atoms to cells.
+
+    Returns
+    -------
+    cell_of : 1D numpy array
+        The cell of each atom.
+    start : 1D numpy array
+        Atoms in cell c are ``atoms[start[c]:start[c+1]]``.
+    atoms : 1D numpy array
+        Atom ids sorted by cells.
+    '''
+
+    n = pos.shape[0]
+    nx, ny, nz = ncell[0], ncell[1], ncell[2]
+    ncells = nx*ny*nz
+
+    cell_of = np.zeros(n, dtype=np.int64)
+    for a in range(n):
+        rx, ry, rz = pos[a, 0]-origin[0], pos[a, 1]-origin[1], pos[a, 2]-origin[2]
+        fx = hinv[0, 0]*rx + hinv[0, 1]*ry + hinv[0, 2]*rz
+        fy = hinv[1, 0]*rx + hinv[1, 1]*ry + hinv[1, 2]*rz
+        fz = hinv[2, 0]*rx + hinv[2, 1]*ry + hinv[2, 2]*rz
+        if periodic:
+            fx -= np.floor(fx)
+            fy -= np.floor(fy)
+            fz -= np.floor(fz)
+        ix = min(max(int(fx*nx), 0), nx-1)
+        iy = min(max(int(fy*ny), 0), ny-1)
+        iz = min(max(int(fz*nz), 0), nz-1)
+        cell_of[a] = (ix*ny + iy)*nz + iz
+
+    # Counting sort of atoms by cells
+    start = np.zeros(ncells+1, dtype=np.int64)
+    for a in range(n):
+        start[cell_of[a]+1] += 1
+    for c in range(ncells):
+        start[c+1] += start[c]
+    fill_pos = start[:-1].copy()
+    atoms = np.zeros(n, dtype=np.int64)
+    for a in range(n):
+        atoms[fill_pos[cell_of[a]]] = a
+        fill_pos[cell_of[a]] += 1
+
+    return cell_of, start, atoms
+
+@njit(cache=True)
+def _stencil(ncell, periodic):
+    '''Offsets of the neighbor cells, each cell is visited once even for less than 3 cells.'''
+
+    lo = np.full(3, -1, dtype=np.int64)
+    hi = np.full(3, 2, dtype=np.int64)
+    if periodic:
+        for d in range(3):
+            if ncell[d] < 3:
+                lo[d], hi[d] = 0, ncell[d]
+
+    return lo, hi
+
+@njit(cache=True)
+def _search_frame(pos, hinv, box, origin, ncell, periodic, cutoff, excluded, out_i, out_j, out_d, fill):
+    '''Search the pairs of one frame with a cell list, return the number of pairs.'''
+
+    n = pos.shape[0]
+    nx, ny, nz = ncell[0], ncell[1], ncell[2]
+
+    cell_of, start, atoms = _bin_atoms(pos, hinv, origin, ncell, periodic)
+    lo, hi = _stencil(ncell, periodic)
+
+    cutoff2 = cutoff*cutoff
+    count = 0
+
+    for a in range(n):
+        c = cell_of[a]
+        ix, iy, iz = c//(ny*nz), (c//nz)%ny, c%nz
+        for ox in range(lo[0], hi[0]):
+            jx = ix + ox
+            if periodic:
+                jx %= nx
+            elif jx < 0 or jx >= nx:
+                continue
+            for oy in range(lo[1], hi[1]):
+                jy = iy + oy
+                if periodic:
+                    jy %= ny
+                elif jy < 0 or jy >= ny:
+                    continue
+                for oz in range(lo[2], hi[2]):
+                    jz = iz + oz
+                    if periodic:
+                        jz %= nz
+                    elif jz < 0 or jz >= nz:
+                        continue
+                    cc = (jx*ny + jy)*nz + jz
+                    for k in range(start[cc], start[cc+1]):
+                        b = atoms[k]
+                        if b <= a:
+                            continue
+                        dx, dy, dz = pos[b, 0]-pos[a, 0], pos[b, 1]-pos[a, 1], pos[b, 2]-pos[a, 2]
+                        if periodic:
+                            dx, dy, dz = minimum_image(dx, dy, dz, box)
+                        r2 = dx*dx + dy*dy + dz*dz
+                        if r2 >= cutoff2:
+                            continue
+                        if excluded.shape[0] > 0:
+                            key = a*n + b
+                            idx = np.searchsorted(excluded, key)
+                            if idx < excluded.shape[0] and excluded[idx] == key:
+                                continue
+                        if fill:
+                            out_i[count] = a
+                            out_j[count] = b
+                            out_d[count] = np.sqrt(r2)
+                        count += 1
+
+    return count
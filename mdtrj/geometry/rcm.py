@@ -1,44 +1,165 @@
-# import jax.numpy as jnp 
+# import jax.numpy as jnp
 ''' Pure numpy is much faster than jax.numpy '''
 import numpy as jnp
 
-def compute_rcm(trj):
-    
+from mdtrj.core.topology import molecule_segments
+from mdtrj.core.selection import as_index
+from mdtrj.geometry.boundary import box_matrix
+
+def compute_rcm(trj, atom_selections=None, periodic=False, mass_weighted=True):
+    '''
+    Compute the centre of mass of the atoms in every frame.
+
+    Parameters
+    ----------
+    trj : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+    atom_selections : list or numpy array or Selection, optional
+        Default is all atoms.
+    periodic : bool
+        For wrapped coordinates in the periodic box ``Topology.box``. The
+        atoms are unwrapped to the minimum images around their circular
+        mean, then averaged. The centres are wrapped into the box.
+    mass_weighted : bool
+        Weight the atoms with ``Topology.masses``, otherwise the centroid.
+
+    Returns
+    -------
+    rcms : 2D numpy array or a list of them
+        With shape (nframes, 3).
+    '''
+
+    if isinstance(trj, list):
+        return [_compute_rcm(_trj, atom_selections, periodic, mass_weighted) for _trj in trj]
+
+    return _compute_rcm(trj, atom_selections, periodic, mass_weighted)
+
+def _compute_rcm(trj, atom_selections=None, periodic=False, mass_weighted=True):
+
+    index = as_index(atom_selections)
+
+    weights = _atom_masses(trj.topology, trj.coords.shape[1], mass_weighted)
+    if index is not None:
+        weights = weights[index]
+    weights = weights/jnp.sum(weights)
+
+    h = _periodic_box(trj, periodic)
+
+    # One weighted contraction over the atoms for a chunk of frames
+    rcms = [jnp.zeros((0, 3))]
+    for coords in trj.iter_chunks():
+
+        if index is not None:
+            coords = coords[:, index]
+
+        if h is None:
+            rcms.append(weights @ coords)
+        else:
+            cos, sin = _angles(coords, h)
+            reference = _circular_mean(weights @ cos, weights @ sin, h)
+            shifts = _minimum_image(coords - reference[:, None], h)
+            rcms.append(_wrap(reference + weights @ shifts, h))
+
+    return jnp.concatenate(rcms)
+
+def compute_molecule_rcm(trj, molecules=None, periodic=False, mass_weighted=True):
+    '''
+    Compute the centre of mass of every molecule.
+
+    Parameters
+    ----------
+    trj : mdtrj.Trajectory or [mdtrj.Trajectory, ]
+    molecules : 1D numpy array, optional
+        Molecule id of every atom, default is ``Topology.get_molecules()``.
+    periodic : bool
+        For wrapped coordinates, see ``compute_rcm``.
+    mass_weighted : bool
+
+    Returns
+    -------
+    rcms : 3D numpy array or a list of them
+        With shape (nframes, nmolecules, 3), molecules are in the order of
+        ``np.unique(molecules)``.
+    '''
+
     if isinstance(trj, list):
-        
-        all_rcms = []
-        
-        for _trj in trj:
-            
-            rcms = _compute_rcm(_trj)
-            
-            all_rcms.append(rcms)
-        
-        return all_rcms
-    
-    else:
-        
-        return _compute_rcm(trj)
-
-def _compute_rcm(trj):
-    
-    rcms = []
-    
-    masses = trj.topology.masses
-    
-    total_mass = 0
-    
-    if not isinstance(masses, float):
-    
-        masses = jnp.array([masses, masses, masses]).T
-        total_mass = jnp.sum(masses)
-        
-    else:
-        total_mass = masses*trj.topology.atoms
-        
-    for coord in trj.coords:
-    
-        rcm = jnp.sum(masses*coord, axis=0)/total_mass
-        rcms.append(rcm)
-        
-    return jnp.array(rcms)
\ No newline at end of file
+        return [compute_molecule_rcm(_trj, molecules, periodic, mass_weighted) for _trj in trj]
+
+    if molecules is None:
+        molecules = trj.topology.get_molecules()
+    order, offsets = molecule_segments(molecules)
+
+    masses = _atom_masses(trj.topology, trj.coords.shape[1], mass_weighted)[order]
+    total_masses = jnp.add.reduceat(masses, offsets[:-1])
+
+    h = _periodic_box(trj, periodic)
+
+    # Segmented sums over the atoms sorted by molecules
+    rcms = [jnp.zeros((0, len(offsets)-1, 3))]
+    for coords in trj.iter_chunks():
+
+        coords = coords[:, order]
+
+        if h is None:
+            weighted = coords*masses[None, :, None]
+            rcms.append(jnp.add.reduceat(weighted, offsets[:-1], axis=1)/total_masses[None, :, None])
+        else:
+            cos, sin = _angles(coords, h)
+            cos = jnp.add.reduceat(cos*masses[None, :, None], offsets[:-1], axis=1)
+            sin = jnp.add.reduceat(sin*masses[None, :, None], offsets[:-1], axis=1)
+            reference = _circular_mean(cos, sin, h)
+            shifts = _minimum_image(coords - jnp.repeat(reference, jnp.diff(offsets), axis=1), h)
+            shifts = jnp.add.reduceat(shifts*masses[None, :, None], offsets[:-1], axis=1)
+            rcms.append(_wrap(reference + shifts/total_masses[None, :, None], h))
+
+    return jnp.concatenate(rcms)
+
+def _atom_masses(topology, natoms, mass_weighted=True):
+    '''Masses of all atoms as a 1D array, ones if not mass weighted.'''
+
+    masses = topology.masses
+
+    if not mass_weighted:
+        return jnp.ones(natoms)
+    if jnp.ndim(masses) == 0:
+        return jnp.full(natoms, float(masses))
+
+    return jnp.array(masses, dtype=float)
+
+def _periodic_box(trj, periodic):
+    '''Box matrix for the circular mean, None for unwrapped coordinates.'''
+
+    if not periodic:
+        return None
+
+    h = box_matrix(trj.topology.box)
+    if jnp.any(jnp.diag(h) <= 0):
+        raise ValueError(f'A periodic centre of mass needs a box, got {trj.topology.box}')
+
+    return h
+
+def _angles(coords, h):
+    '''Cosines and sines of the fractional coordinates on the unit circle.'''
+
+    theta = 2*jnp.pi*(coords @ jnp.linalg.inv(h).T)
+
+    return jnp.cos(theta), jnp.sin(theta)
+
+def _circular_mean(cos, sin, h):
+    '''Positions of the mean angles, the weights need not be normalized.
+
+    Only a reference point inside the molecule, not its centre of mass.
+    '''
+
+    return (jnp.arctan2(sin, cos)/(2*jnp.pi)) @ h.T
+
+def _minimum_image(dx, h):
+    '''Minimum images of vectors in the box with vectors h.'''
+
+    frac = dx @ jnp.linalg.inv(h).T
+
+    return (frac - jnp.round(frac)) @ h.T
+
+def _wrap(coords, h):
+    '''Positions wrapped into the box centred at the origin.'''
+
+    return _minimum_image(coords, h)
@@ -1,12 +1,30 @@
+import os
+
 '''
-A convient collector for conformational analyze for trajectory.
-'''
-gyration_results_collector = {
-    'gyration tensor':None,
-    'Rg' : None,
-    'tan2XG' : None,
-    'Asphericity' : None,
-    'Acylindericity' : None,
-    'Anistropy' : None,
-}
-gyration_atom_selections = None
+Number of frames decoded at one time by lazy trajectories.
+'''
+trajectory_chunk_size = 100
+
+'''
+Persistent trajectory cache used by ``load(..., cache=True)``.
+'''
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'mdtrj')
+cache_max_bytes = 50 * 1024**3
+
+'''
+Bounds of the analysis results cache, see mdtrj.core.results.
+'''
+results_cache_max_entries = 256
+results_cache_max_bytes = 2 * 1024**3
+
+'''
+Start method of the worker processes of mdtrj.core.executor, None chooses
+'fork' unless numba has launched TBB threads.
+'''
+executor_start_method = None
+
+'''
+Number of worker processes started when an analysis does not ask for a
+number, None is ``os.cpu_count()``.
+'''
+executor_processes = None
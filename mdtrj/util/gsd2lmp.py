@@ -1,17 +1,28 @@
+import gsd.fl
 import gsd.hoomd
+import mmap
 import argparse
 import sys
 import numpy as np
-from pypolymer.util import parse_boundary
+import mdtrj.settings as set
+from mdtrj.geometry.boundary import unwrap_coords
+from mdtrj.core.read_gsd import read_frame_chunks, read_gsd_frames
+from mdtrj.core.read_lmp import index_lammpstrj, read_lmp_header, read_atom_table, hoomd_box_to_lmp
+from mdtrj.core.read_lmp import lmp_to_gsd
+from mdtrj.core.executor import get_executor
 from tqdm import tqdm
 
 class trjconvert:
     
-    def __init__(self, infile, outfile, stride=None, parse_boundary=False):
+    def __init__(self, infile, outfile, stride=None, parse_boundary=False, start=0, end=None, 
+                 processes=None):
         self.infile = infile
         self.outfile = outfile
         self.stride = stride
         self.parse_boundary = parse_boundary
+        self.start = start
+        self.end = end
+        self.processes = processes
         
         self.inext = self.infile.split(".")[-1]
         self.outext = self.outfile.split(".")[-1]
@@ -61,63 +72,115 @@ class trjconvert:
             return "\n".join([" ".join(l) for l in arr])
         
     def read_lammpstrj(self):
-        raw_data = None
-        with open(self.infile, 'r') as f:
-            raw_data = f.readlines()
-            f.close()
-            
         trj_data = []
-        
-        sid = 0
-        atoms = int(raw_data[3])
-        
-        for i in range(100000):
-            keys = self.lmp_keys
-            head = self.gen_lammps_head()
-            head[keys[0]] = int(raw_data[1])
-            head[keys[1]] = atoms
-            head[keys[3]] = raw_data[4].split("BOUNDS")[-1].split()
-            head[keys[4]] = [[float(x) for x in l.split()] for l in raw_data[5:8]]
-            head[keys[5]] = np.array(
-                [l.split() for l in raw_data[sid+8:sid+8+atoms]]).astype(float)
-            atoms = int(raw_data[sid+8+atoms+3])
-            trj_data.append(head)
+        keys = self.lmp_keys
+        with open(self.infile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offsets = index_lammpstrj(mm)
+            for fid in range(len(offsets)-1)[::self.stride or 1]:
+                header = read_lmp_header(mm, offsets[fid])
+                head = self.gen_lammps_head()
+                head[keys[0]] = header['step']
+                head[keys[1]] = header['natoms']
+                head[keys[3]] = header['boundary']
+                head[keys[4]] = header['bounds']
+                head[keys[5]] = read_atom_table(mm, header, offsets[fid+1])
+                trj_data.append(head)
         return trj_data
     
     def read_gsd(self):
         return gsd.hoomd.open(self.infile, 'r')
 
     def write_lammpstrj(self):
-        snaps = self.read_gsd()
-        trj_data = []
-        with open(self.outfile, 'w') as f:
-            steps = len(snaps)
-            for stp in tqdm(range(steps)):
-                snap = snaps[stp]
-                keys = self.lmp_keys
-                head = self.gen_lammps_head()
-                head[keys[0]] = snap.configuration.step
-                head[keys[1]] = snap.particles.N
-                # head[keys[3]] = raw_data[4].split("BOUNDS")[-1].split()
-                head[keys[4]] = [[-l/2, l/2] for l in snap.configuration.box[:3]]
-                atomid_typ = np.vstack([np.arange(snap.particles.N), 
-                                        snap.particles.typeid]).T + 1
-                posi = snap.particles.position
-                bonds = snap.bonds.group
-                box = snap.configuration.box
-                if self.parse_boundary:
-                    posi = parse_boundary(posi, bonds, box)
-                atoms = np.concatenate([atomid_typ, 
-                                  posi], axis=1, dtype=object)
-                head[keys[5]] = atoms
-                # trj_data.append(head)
-                    # for head in trj_data[::self.stride]:
-                f.write(self.gen_lammps_text(head))
-        f.close()
-        snaps.close()
-    
-    def write_gsd(self):
-        pass
+        write_lammpstrj(self.infile, self.outfile, self.start, self.end, self.stride or 1, 
+                        self.parse_boundary, self.processes, progress=True)
+    
+    def write_gsd(self, data_fn=None):
+        lmp_to_gsd(self.infile, self.outfile, self.start, self.end, self.stride or 1, data_fn)
+    
+def write_lammpstrj(gsd_fn, lmp_fn, start=0, end=None, stride=1, parse_boundary=False, 
+                    processes=None, chunk_size=None, precision=6, progress=False):
+    '''Convert a gsd file to a LAMMPS dump file with columns "id type x y z".
+    
+    Frames are formatted chunk by chunk, each atom block by one string
+    formatting, and written in order.
+    
+    Parameters
+    ----------
+    gsd_fn : str
+    lmp_fn : str
+    start, end, stride : int
+        Frame range, ``range(nframes)[start:end:stride]``.
+    parse_boundary : bool or str
+        True or 'bonds' restores the molecules along bonds, 'image' restores
+        the positions with the image flags.
+    processes : int, optional
+        Format the chunks in this many worker processes.
+    chunk_size : int, optional
+        Number of frames of a chunk, default is ``settings.trajectory_chunk_size``.
+    precision : int
+        Number of decimals of the positions.
+    progress : bool
+        Show a progress bar of the written chunks.
+    '''
+    
+    with gsd.fl.open(gsd_fn, 'r') as gsd_file:
+        frames = range(gsd_file.nframes)[start:end:stride]
+        
+    chunk_size = chunk_size or set.trajectory_chunk_size
+    params = [(gsd_fn, frames[i:i+chunk_size], parse_boundary, precision) 
+              for i in range(0, len(frames), chunk_size)]
+    
+    if processes is not None and processes > 1 and len(params) > 1:
+        texts = get_executor(processes).pool.imap(_format_chunk, params)
+    else:
+        texts = map(_format_chunk, params)
+        
+    with open(lmp_fn, 'w') as f:
+        for text in tqdm(texts, total=len(params), disable=not progress):
+            f.write(text)
+
+def _format_chunk(params):
+    '''Format the frames of a chunk as the text of a dump file.'''
+    
+    gsd_fn, frames, parse_boundary, precision = params
+    
+    with gsd.fl.open(gsd_fn, 'r') as gsd_file:
+        
+        natoms = int(gsd_file.read_chunk(frame=0, name='particles/N')[0])
+        
+        coords = np.zeros((len(frames), natoms, 3))
+        typeids = np.zeros((len(frames), natoms))
+        boxes = np.zeros((len(frames), 6))
+        steps = np.zeros((len(frames), 1), dtype=np.uint64)
+        
+        read_gsd_frames(gsd_file, frames, coords, unwrap_images=parse_boundary == 'image')
+        read_frame_chunks(gsd_file, 'particles/typeid', frames, typeids)
+        read_frame_chunks(gsd_file, 'configuration/box', frames, boxes)
+        read_frame_chunks(gsd_file, 'configuration/step', frames, steps)
+        
+        if parse_boundary and parse_boundary != 'image' and \
+           gsd_file.chunk_exists(frame=0, name='bonds/group'):
+            bonds = gsd_file.read_chunk(frame=0, name='bonds/group')
+            unwrap_coords(coords, bonds, boxes[0], inplace=True)
+    
+    row = f'%d %d %.{precision}f %.{precision}f %.{precision}f\n'*natoms
+    table = np.zeros((natoms, 5))
+    table[:, 0] = np.arange(1, natoms+1)
+    
+    texts = []
+    for i in range(len(frames)):
+        bounds = hoomd_box_to_lmp(boxes[i])
+        tilt = 'xy xz yz ' if bounds.shape[1] > 2 else ''
+        texts.append(f'ITEM: TIMESTEP\n{steps[i, 0]}\nITEM: NUMBER OF ATOMS\n{natoms}\n'
+                     f'ITEM: BOX BOUNDS {tilt}pp pp pp\n')
+        texts.append(''.join(' '.join(str(v) for v in line) + '\n' for line in bounds))
+        texts.append('ITEM: ATOMS id type x y z\n')
+        
+        table[:, 1] = typeids[i] + 1
+        table[:, 2:] = coords[i]
+        texts.append(row % tuple(table.ravel().tolist()))
+        
+    return ''.join(texts)
     
 import argparse
 def parse_args():
@@ -127,19 +190,31 @@ def parse_args():
     parser.add_argument('-inp', type=str, default="", help='input file you need to convert. ".gsd"')
     parser.add_argument('-out', type=str, default="", help='output file you need ot convert to. ".lammpstrj"')
     parser.add_argument('-stride', type=int, default=1, help='convert per stride steps.')
-    parser.add_argument("--parse_boundary", action="store_true", help="Parse boundary when convert trajectory.")
+    parser.add_argument('-start', type=int, default=0, help='first frame to convert.')
+    parser.add_argument('-end', type=int, default=None, help='stop before this frame.')
+    parser.add_argument('-np', type=int, default=None, help='number of worker processes.')
+    parser.add_argument('-data', type=str, default="", help='LAMMPS data file with bonds, for ".lammpstrj" to ".gsd".')
+    parser.add_argument("--parse_boundary", nargs="?", const="bonds", default=False, 
+                        choices=["bonds", "image"], 
+                        help='Parse boundary when convert trajectory, along the bonds (default) or with the image flags.')
     
     args = parser.parse_args()
     return args
 
-if __name__ == "__main__":
+def main():
     
     args = parse_args()
     
     if args.out=="":
         args.out = "".join((args.inp).split(".")[:-1]+[".lammpstrj"])
     
-    tjv = trjconvert(args.inp, args.out, args.stride, args.parse_boundary)
-    tjv.write_lammpstrj()
+    tjv = trjconvert(args.inp, args.out, args.stride, args.parse_boundary, args.start, args.end, 
+                     args.np)
+    if tjv.inext == "lammpstrj" and tjv.outext == "gsd":
+        tjv.write_gsd(args.data or None)
+    else:
+        tjv.write_lammpstrj()
     print(f"\n*** Convert [{args.inp}] to [{args.out}] success! ***\n")
-    
+
+if __name__ == "__main__":
+    main()
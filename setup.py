@@ -16,6 +16,9 @@ setup(
     long_description=long_description,
     extras_require={},
     packages = find_packages(),
+    entry_points={
+        'console_scripts': ['mdtrj-gsd2lmp=mdtrj.util.gsd2lmp:main'],
+    },
     zip_safe=False,
     python_requires=">=3.1",
     install_requires = [
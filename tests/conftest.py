@@ -0,0 +1,44 @@
+import gsd.hoomd
+import numpy as np
+import pytest
+
+def write_chains(gsd_fn, nchains=3, length=20, nframes=30, box=15.0, seed=0, velocities=True,
+                 first_step=0):
+    '''Random-walk chains wrapped into a cubic box, with images and bonds.'''
+
+    rng = np.random.default_rng(seed)
+    natoms = nchains*length
+    bonds = np.arange(natoms, dtype=np.uint32).reshape(nchains, length)
+    bonds = np.stack([bonds[:, :-1].ravel(), bonds[:, 1:].ravel()], axis=1)
+
+    with gsd.hoomd.open(gsd_fn, 'w') as f:
+        for t in range(nframes):
+            steps = rng.normal(size=(nchains, length, 3))
+            steps /= np.linalg.norm(steps, axis=-1, keepdims=True)
+            steps[:, 0] = rng.uniform(-box/2, box/2, size=(nchains, 3))
+            pos = np.cumsum(steps, axis=1).reshape(natoms, 3)
+            images = np.floor(pos/box + 0.5).astype(np.int32)
+
+            frame = gsd.hoomd.Frame()
+            frame.configuration.step = first_step + t*100
+            frame.configuration.box = [box, box, box, 0, 0, 0]
+            frame.particles.N = natoms
+            frame.particles.types = ['A', 'B']
+            frame.particles.typeid = (np.arange(natoms) % 2).astype(np.uint32)
+            frame.particles.mass = np.where(np.arange(natoms) % 2, 2.0, 1.0).astype(np.float32)
+            frame.particles.position = (pos - images*box).astype(np.float32)
+            frame.particles.image = images
+            if velocities:
+                frame.particles.velocity = rng.normal(size=(natoms, 3)).astype(np.float32)
+            frame.bonds.N = len(bonds)
+            frame.bonds.types = ['b']
+            frame.bonds.typeid = np.zeros(len(bonds), dtype=np.uint32)
+            frame.bonds.group = bonds
+            f.append(frame)
+
+    return gsd_fn
+
+@pytest.fixture
+def chains_gsd(tmp_path):
+    '''A gsd file of 3 chains of 20 atoms over 30 frames.'''
+    return write_chains(str(tmp_path/'chains.gsd'))
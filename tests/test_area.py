@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import mdtrj
+from mdtrj.core.selection import Selection
+from mdtrj.geometry.area import geometry_construct
+
+def vector_area(loop):
+    '''Reference vector area 1/2 sum r_i x r_{i+1} of a closed loop.'''
+
+    return 0.5*np.cross(loop, np.roll(loop, -1, axis=-2)).sum(axis=-2)
+
+def star(npoints=7, inner=0.4, nframes=5, seed=0):
+    '''Non-convex star loops, rotated and moved far from the origin.'''
+
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2*np.pi, 2*npoints, endpoint=False)
+    radii = np.where(np.arange(2*npoints) % 2, inner, 1.0)*rng.uniform(0.8, 1.2, 2*npoints)
+    flat = np.stack([radii*np.cos(angles), radii*np.sin(angles), np.zeros(2*npoints)], axis=1)
+
+    loops = []
+    for _ in range(nframes):
+        rotation, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+        loops.append(flat @ rotation.T + rng.uniform(-100, 100, 3))
+
+    return np.array(loops)
+
+def test_matches_reference():
+
+    loops = star()
+    extra = np.random.default_rng(1).normal(size=(5, 6, 3))
+    coords = np.concatenate([extra, loops], axis=1)
+
+    # The loop is out of index order
+    order = 6 + np.random.default_rng(2).permutation(14)
+    loops = coords[:, order]
+    expected = vector_area(loops)
+
+    areas, xyz_areas, nvecs = mdtrj.compute_loop_geometry(coords=coords, atom_selections=order)
+    assert np.allclose(xyz_areas, expected)
+    assert np.allclose(areas, np.linalg.norm(expected, axis=-1))
+    assert np.allclose(nvecs, expected/np.linalg.norm(expected, axis=-1, keepdims=True))
+
+    # Reversing the loop flips the normal
+    reverse = geometry_construct(coords=coords, atom_selections=list(order[::-1]))
+    assert np.allclose(reverse[:, 3:6], -expected)
+
+def test_circle():
+
+    t = np.linspace(0, 2*np.pi, 2000, endpoint=False)
+    circle = np.stack([np.zeros_like(t), 2*np.cos(t), 2*np.sin(t)], axis=1)
+
+    nvec = geometry_construct(coords=circle, atom_selections=len(t))
+    assert nvec.shape == (7,)
+    assert np.isclose(nvec[-1], 4*np.pi, rtol=1e-5)
+    assert np.allclose(nvec[:3], [1, 0, 0])
+
+def test_rejects_selection():
+
+    with pytest.raises(TypeError):
+        geometry_construct(coords=star()[0], atom_selections=Selection([3, 1, 2], 14))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from mdtrj.geometry.boundary import box_matrix, unwrap_coords, unwrap_images
+
+BOXES = [[12.0, 12.0, 12.0, 0, 0, 0], [12.0, 11.0, 13.0, 0.3, -0.2, 0.1]]
+
+def _wrapped_chains(box, nframes=5, nchains=4, length=30, seed=0):
+    '''Unwrapped random-walk chains, and their wrapped positions and image flags.'''
+
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(size=(nframes, nchains, length, 3))
+    steps /= np.linalg.norm(steps, axis=-1, keepdims=True)
+    steps[:, :, 0] = rng.uniform(-6, 6, size=(nframes, nchains, 3))
+    unwrapped = np.cumsum(steps, axis=2).reshape(nframes, nchains*length, 3)
+
+    h = box_matrix(box)
+    images = np.floor(unwrapped @ np.linalg.inv(h).T + 0.5)
+    wrapped = unwrapped - images @ h.T
+
+    bonds = np.arange(nchains*length).reshape(nchains, length)
+    bonds = np.stack([bonds[:, :-1].ravel(), bonds[:, 1:].ravel()], axis=1)
+
+    return unwrapped, wrapped, images.astype(np.int32), bonds
+
+@pytest.mark.parametrize('box', BOXES)
+def test_unwrap_images(box):
+
+    unwrapped, wrapped, images, _ = _wrapped_chains(box)
+
+    assert np.allclose(unwrap_images(wrapped, images, box), unwrapped)
+
+    boxes = np.tile(box, (len(wrapped), 1))
+    out = wrapped.copy()
+    unwrap_images(out, images, boxes, out=out)
+    assert np.allclose(out, unwrapped)
+
+@pytest.mark.parametrize('box', BOXES)
+def test_unwrap_bonds(box):
+
+    unwrapped, wrapped, _, bonds = _wrapped_chains(box)
+
+    restored = unwrap_coords(wrapped, bonds, box)
+    # Molecules are whole, up to a lattice shift of each molecule
+    vectors = restored[:, bonds[:, 1]] - restored[:, bonds[:, 0]]
+    assert np.allclose(vectors, unwrapped[:, bonds[:, 1]] - unwrapped[:, bonds[:, 0]])
+    shifts = (restored - unwrapped) @ np.linalg.inv(box_matrix(box)).T
+    assert np.allclose(shifts, np.round(shifts))
+
+    inplace = wrapped.copy()
+    assert unwrap_coords(inplace, bonds, box, inplace=True) is inplace
+    assert np.allclose(inplace, restored)
+
+    centered = unwrap_coords(wrapped, bonds, box, center=True)
+    assert np.allclose(centered.mean(axis=1), 0)
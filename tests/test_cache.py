@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+import mdtrj
+import mdtrj.settings
+
+from mdtrj.core import cache
+
+from conftest import write_chains
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(mdtrj.settings, 'cache_dir', str(tmp_path/'cache'))
+    return tmp_path/'cache'
+
+def _entries(cache_dir):
+    return sorted(fn for fn in os.listdir(cache_dir) if fn.endswith('.json'))
+
+def test_cached_load(chains_gsd, cache_dir):
+
+    expected = mdtrj.load(chains_gsd, parse_boundary='image', read_velo=True)
+
+    for _ in range(2):
+        trj = mdtrj.load(chains_gsd, parse_boundary='image', read_velo=True, cache=True)
+        assert isinstance(trj.coords, np.memmap)
+        assert np.allclose(trj.coords, expected.coords)
+        assert np.allclose(trj.velos, expected.velos)
+        assert np.array_equal(trj.topology.bonds, expected.topology.bonds)
+    assert len(_entries(cache_dir)) == 1
+
+    # Other options are other entries
+    trj = mdtrj.load(chains_gsd, cache=True, atom_selection=np.arange(10))
+    assert trj.coords.shape == (30, 10, 3)
+    assert len(_entries(cache_dir)) == 2
+
+    # A rewritten file invalidates its entries
+    write_chains(chains_gsd, seed=5)
+    os.utime(chains_gsd, ns=(0, os.stat(chains_gsd).st_mtime_ns + 10**9))
+    trj = mdtrj.load(chains_gsd, cache=True)
+    assert np.allclose(trj.coords, mdtrj.load(chains_gsd).coords)
+    assert len(_entries(cache_dir)) == 1
+
+def test_entry_larger_than_cache(chains_gsd, cache_dir, monkeypatch):
+
+    monkeypatch.setattr(mdtrj.settings, 'cache_max_bytes', 1024)
+
+    first = mdtrj.load(chains_gsd, cache=True)
+    assert np.allclose(first.coords, mdtrj.load(chains_gsd).coords)
+    assert len(_entries(cache_dir)) == 1
+
+    # The older entry is evicted, the new one is kept
+    trj = mdtrj.load(chains_gsd, cache=True, read_velo=True)
+    assert trj.velos is not None
+    assert len(_entries(cache_dir)) == 1
+
+    cache.clear_cache(chains_gsd)
+    assert _entries(cache_dir) == []
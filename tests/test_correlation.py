@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+from mdtrj.dynamics.correlation import correlate
+
+def _acf(x, max_lag):
+    '''<x(t)x(t+m)> of every column by direct averaging over the time origins.'''
+
+    return np.array([(x[:len(x)-m]*x[m:]).mean(axis=0) for m in range(max_lag)])
+
+def test_correlate_blocks():
+
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(50, 4, 3))
+    y = rng.normal(size=(50, 4, 3))
+    expected = _acf(x, 12)
+
+    assert np.allclose(correlate(x), _acf(x, 50))
+    assert np.allclose(correlate(x, max_lag=12, block_size=7), expected)
+    assert np.allclose(correlate(x, max_lag=12, block_size=7, atoms=[3, 1]), expected[:, [3, 1]])
+    assert np.allclose(correlate(x, max_lag=12, atoms=slice(1, 3)), expected[:, 1:3])
+
+    cross = np.array([(x[:50-m]*y[m:]).mean(axis=0) for m in range(12)])
+    assert np.allclose(correlate(x, y, max_lag=12, block_size=5), cross)
+
+    dx = x - x.mean(axis=0)
+    assert np.allclose(correlate(x, max_lag=12, subtract_mean=True, atoms=[0, 2]),
+                       _acf(dx, 12)[:, [0, 2]])
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_vacf(chains_gsd, lazy):
+
+    trj = mdtrj.load(chains_gsd, read_velo=True, lazy=lazy)
+    velos = np.asarray(mdtrj.load(chains_gsd, read_velo=True).velos, dtype=float)
+    ids = [40, 3, 4, 5]
+
+    expected = _acf(velos[:, ids], 10).sum(axis=-1)
+    vacf = mdtrj.compute_vacf(trj, ids, max_lag=10, normalize=False, average=False, block_size=4)
+    assert np.allclose(vacf, expected)
+
+    mask = np.zeros(60, dtype=bool)
+    mask[ids] = True
+    vacf = mdtrj.compute_vacf(trj, mask, max_lag=10, block_size=8)
+    expected = _acf(velos[:, mask], 10).sum(axis=-1).mean(axis=1)
+    assert np.allclose(vacf, expected/expected[0])
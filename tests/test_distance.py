@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import mdtrj
+
+from mdtrj.geometry.boundary import box_matrix
+
+def _brute_distances(coords, pairs, box):
+    '''Shortest distances over the 27 nearest periodic images.'''
+
+    h = box_matrix(box)
+    shifts = np.array(list(itertools.product([-1, 0, 1], repeat=3))) @ h.T
+    d = coords[:, pairs[:, 1]] - coords[:, pairs[:, 0]]
+
+    return np.min(np.linalg.norm(d[..., None, :] + shifts, axis=-1), axis=-1)
+
+@pytest.mark.parametrize('box', [[8.0, 9.0, 10.0, 0, 0, 0], [8.0, 9.0, 10.0, 0.2, -0.1, 0.3]])
+def test_periodic_distances(box):
+
+    rng = np.random.default_rng(0)
+    frac = rng.uniform(0, 1, size=(12, 40, 3))
+    coords = frac @ box_matrix(box).T
+    pairs = rng.integers(0, 40, size=(25, 2))
+
+    topo = mdtrj.Topology()
+    topo.atoms = 40
+    topo.box = np.array(box)
+    trj = mdtrj.Trajectory(coords, topo)
+
+    direct = np.linalg.norm(coords[:, pairs[:, 1]] - coords[:, pairs[:, 0]], axis=-1)
+    assert np.allclose(mdtrj.compute_distance(trj, pairs), direct)
+
+    # The minimum image of a tilted box is exact up to half of the box
+    expected = _brute_distances(coords, pairs, box)
+    inside = expected < min(box[:3])/2
+    distances = mdtrj.compute_distance(trj, pairs, periodic=True)
+    assert np.allclose(distances[inside], expected[inside])
+    if not np.any(box[3:]):
+        assert np.allclose(distances, expected)
+
+    single = mdtrj.compute_distance(trj, pairs, periodic=True, dtype=np.float32)
+    assert single.dtype == np.float32
+    assert np.allclose(single, distances, atol=1e-5)
+
+def test_lazy_and_lists(chains_gsd):
+
+    eager = mdtrj.load(chains_gsd, parse_boundary='image')
+    lazy = mdtrj.load(chains_gsd, parse_boundary='image', lazy=True)
+    pairs = [[0, 19], [20, 39], [5, 45]]
+
+    coords = np.asarray(eager.coords, dtype=float)
+    expected = np.linalg.norm(coords[:, [19, 39, 45]] - coords[:, [0, 20, 5]], axis=-1)
+    results = mdtrj.compute_distance([eager, lazy], pairs)
+    assert all(np.allclose(res, expected) for res in results)
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+import mdtrj
+import mdtrj.settings
+
+from mdtrj.core import executor
+from mdtrj.core.executor import SharedArray, get_executor
+from mdtrj.geometry.rcm import compute_rcm
+
+from conftest import write_chains
+
+@pytest.fixture(scope='module')
+def pool():
+    yield get_executor(2)
+    executor._close_executor()
+
+@pytest.fixture
+def trajectories(tmp_path):
+    fns = [write_chains(str(tmp_path/f'{seed}.gsd'), nchains=10, length=50, nframes=20, seed=seed)
+           for seed in range(3)]
+    return [mdtrj.load(fn, parse_boundary='image', lazy=i == 2) for i, fn in enumerate(fns)]
+
+def test_default_reuses_workers(pool, trajectories):
+
+    workers = pool.pool
+    assert get_executor() is pool
+    assert get_executor(2) is pool
+
+    # Analyses without a number of processes keep the running workers
+    mdtrj.gyration_analyze(trajectories, parallel=True, cache=False)
+    mdtrj.compute_rdf(trajectories, 5.0, parallel=True)
+    mdtrj.compute_distance(trajectories, [[0, 1]], parallel=True)
+    assert get_executor() is pool
+    assert pool.pool is workers
+
+def test_shared_array():
+
+    arr = np.arange(30000, dtype=float).reshape(100, 100, 3)
+
+    desc, copied = SharedArray.from_array(arr)
+    assert copied
+    shared = desc.adopt()
+    assert np.array_equal(shared, arr)
+
+    # Arrays in shared memory and their contiguous views are not copied again
+    assert SharedArray.from_array(shared) == (desc, False)
+    view, copied = SharedArray.from_array(shared[10:20])
+    assert not copied
+    assert np.array_equal(view.attach(), arr[10:20])
+
+def test_memmaps(tmp_path):
+
+    arr = np.arange(30000, dtype=float).reshape(100, 100, 3)
+    np.save(tmp_path/'arr.npy', arr)
+
+    readonly = np.load(tmp_path/'arr.npy', mmap_mode='r')
+    desc, copied = SharedArray.from_array(readonly[10:20])
+    assert not copied and desc.filename is not None
+    assert np.array_equal(desc.attach(), arr[10:20])
+
+    # Copy-on-write edits are not in the file
+    cow = np.load(tmp_path/'arr.npy', mmap_mode='c')
+    cow += 1
+    desc, copied = SharedArray.from_array(cow)
+    assert copied and desc.filename is None
+    assert np.array_equal(desc.attach(), arr + 1)
+    desc.release()
+
+def test_workers_see_edits_of_cached_trajectories(pool, chains_gsd, tmp_path, monkeypatch):
+
+    monkeypatch.setattr(mdtrj.settings, 'cache_dir', str(tmp_path/'cache'))
+    mdtrj.load(chains_gsd, cache=True)
+    trj = mdtrj.load(chains_gsd, cache=True)
+    assert isinstance(trj.coords, np.memmap)
+
+    trj.coords += 100
+    results = pool.starmap(compute_rcm, [[trj], [trj[::2]]])
+    assert np.allclose(results[0], compute_rcm(trj))
+    assert np.allclose(results[1], compute_rcm(trj)[::2])
+
+def test_pack_round_trip(trajectories):
+
+    trj = trajectories[0]
+    temporary = []
+    packed = executor._pack([trj, trj[::2, np.arange(5)], trajectories[2][3:9]], temporary)
+    assert len(temporary) == 1
+
+    eager, gathered, lazy = executor._unpack(packed, adopt=False)
+    assert np.array_equal(eager.coords, trj.coords)
+    assert np.array_equal(np.asarray(gathered.coords), np.asarray(trj.coords)[::2, :5])
+    assert np.allclose(np.asarray(lazy.coords), np.asarray(trajectories[2].coords)[3:9])
+
+    for desc in temporary:
+        desc.release()
+
+def test_starmap_matches_serial(pool, trajectories):
+
+    expected = [compute_rcm(trj) for trj in trajectories]
+    results = pool.starmap(compute_rcm, [[trj] for trj in trajectories])
+
+    for res, exp in zip(results, expected):
+        assert np.allclose(res, exp)
+
+def test_parallel_analyses(pool, trajectories):
+
+    serial = mdtrj.gyration_analyze(trajectories, cache=False)
+    parallel = mdtrj.gyration_analyze(trajectories, parallel=True, processes=2, cache=False)
+    for key in ['Rg', 'gyration tensor']:
+        for res, exp in zip(parallel[key], serial[key]):
+            assert np.allclose(res, exp)
+
+    serial = mdtrj.compute_rdf(trajectories, 5.0, nbins=20)
+    parallel = mdtrj.compute_rdf(trajectories, 5.0, nbins=20, parallel=True, processes=2)
+    assert np.allclose(parallel.counts, serial.counts)
+    assert parallel.nframes == 60
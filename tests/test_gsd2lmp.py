@@ -0,0 +1,92 @@
+import mmap
+
+import gsd.hoomd
+import numpy as np
+import pytest
+
+import mdtrj
+from mdtrj.core.read_lmp import index_lammpstrj, read_lmp_header
+
+from conftest import write_chains
+
+# mdtrj.util imports the visualization, which needs fresnel
+pytest.importorskip('fresnel')
+from mdtrj.util.gsd2lmp import write_lammpstrj
+
+def read_steps(lmp_fn):
+
+    with open(lmp_fn, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = index_lammpstrj(mm)
+        return [read_lmp_header(mm, offsets[i])['step'] for i in range(len(offsets)-1)]
+
+def write_tilted(gsd_fn, nframes=5, natoms=40, seed=0):
+    '''Atoms inside a triclinic box, centred at the origin.'''
+
+    rng = np.random.default_rng(seed)
+    box = [10.0, 9.0, 8.0, 0.3, 0.1, 0.2]
+    h = np.array([[box[0], box[3]*box[1], box[4]*box[2]],
+                  [0, box[1], box[5]*box[2]],
+                  [0, 0, box[2]]])
+
+    with gsd.hoomd.open(gsd_fn, 'w') as f:
+        for t in range(nframes):
+            frame = gsd.hoomd.Frame()
+            frame.configuration.step = t*10
+            frame.configuration.box = box
+            frame.particles.N = natoms
+            frame.particles.types = ['A']
+            frame.particles.typeid = np.zeros(natoms, dtype=np.uint32)
+            frame.particles.position = (rng.uniform(-0.5, 0.5, size=(natoms, 3)) @ h.T).astype(np.float32)
+            f.append(frame)
+
+    return gsd_fn, box
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_round_trip(chains_gsd, tmp_path, processes):
+
+    lmp_fn = str(tmp_path/'chains.lammpstrj')
+    write_lammpstrj(chains_gsd, lmp_fn, processes=processes, chunk_size=7)
+
+    ref = mdtrj.load(chains_gsd)
+    trj = mdtrj.load(lmp_fn)
+    assert np.allclose(trj.coords, ref.coords, atol=1e-5)
+    assert np.allclose(trj.topology.box, ref.topology.box)
+    assert np.array_equal(trj.topology.atom_types, ref.topology.atom_types)
+    assert read_steps(lmp_fn) == list(range(0, 3000, 100))
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_frame_range(chains_gsd, tmp_path, processes):
+
+    lmp_fn = str(tmp_path/'chains.lammpstrj')
+    write_lammpstrj(chains_gsd, lmp_fn, start=3, end=25, stride=4, processes=processes,
+                    chunk_size=2)
+
+    ref = mdtrj.load(chains_gsd, start=3, end=25, skip=4)
+    assert np.allclose(mdtrj.load(lmp_fn).coords, ref.coords, atol=1e-5)
+    assert read_steps(lmp_fn) == [300, 700, 1100, 1500, 1900, 2300]
+
+def test_triclinic(tmp_path):
+
+    gsd_fn, box = write_tilted(str(tmp_path/'tilted.gsd'))
+    lmp_fn = str(tmp_path/'tilted.lammpstrj')
+    write_lammpstrj(gsd_fn, lmp_fn)
+
+    trj = mdtrj.load(lmp_fn)
+    assert np.allclose(trj.topology.box, box)
+    assert np.allclose(trj.coords, mdtrj.load(gsd_fn).coords, atol=1e-5)
+    assert read_steps(lmp_fn) == [0, 10, 20, 30, 40]
+
+@pytest.mark.parametrize('parse_boundary', [True, 'image'])
+def test_parse_boundary(chains_gsd, tmp_path, parse_boundary):
+
+    lmp_fn = str(tmp_path/'chains.lammpstrj')
+    write_lammpstrj(chains_gsd, lmp_fn, parse_boundary=parse_boundary, chunk_size=7)
+
+    ref = mdtrj.load(chains_gsd, parse_boundary=parse_boundary)
+    coords = mdtrj.load(lmp_fn).coords
+    assert np.allclose(coords, ref.coords, atol=1e-5)
+
+    # Restored chains are unbroken
+    bonds = np.asarray(ref.topology.bonds, dtype=np.int64).reshape(-1, 2)
+    lengths = np.linalg.norm(coords[:, bonds[:, 0]] - coords[:, bonds[:, 1]], axis=-1)
+    assert np.allclose(lengths, 1.0, atol=1e-4)
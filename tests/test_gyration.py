@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+def _gyration_tensors(coords, weights):
+    '''Gyration tensors of (nframes, natoms, 3) coordinates.'''
+
+    weights = weights/weights.sum()
+    center = np.einsum('n,fni->fi', weights, coords)
+    dx = coords - center[:, None]
+
+    return np.einsum('n,fni,fnj->fij', weights, dx, dx), center
+
+@pytest.mark.parametrize('mass_weighted', [False, True])
+def test_gyration_analyze(chains_gsd, mass_weighted):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    coords = np.asarray(trj.coords, dtype=float)
+    masses = np.where(np.arange(60) % 2, 2.0, 1.0) if mass_weighted else np.ones(60)
+    ids = np.arange(20, 40)
+
+    tensors, _ = _gyration_tensors(coords[:, ids], masses[ids])
+    results = mdtrj.gyration_analyze(trj, ids, mass_weighted=mass_weighted, cache=False)
+
+    assert np.allclose(results['gyration tensor'], tensors)
+    assert np.allclose(results['Rg'], np.sqrt(np.trace(tensors, axis1=1, axis2=2)))
+
+    eigenvalues = np.linalg.eigvalsh(tensors)
+    assert np.allclose(results['Asphericity'],
+                       eigenvalues[:, 2] - (eigenvalues[:, 0] + eigenvalues[:, 1])/2)
+    assert np.allclose(results['Acylindericity'], eigenvalues[:, 1] - eigenvalues[:, 0])
+
+def test_molecule_gyration(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    coords = np.asarray(trj.coords, dtype=float)
+    results = mdtrj.molecule_gyration_analyze(trj, cache=False)
+
+    for m in range(3):
+        ids = np.arange(20*m, 20*(m+1))
+        tensors, center = _gyration_tensors(coords[:, ids], np.ones(20))
+        assert np.allclose(results['gyration tensor'][:, m], tensors)
+        assert np.allclose(results['Rg'][:, m], np.sqrt(np.trace(tensors, axis1=1, axis2=2)))
+        assert np.allclose(results['COM'][:, m], center)
+
+        single = mdtrj.gyration_analyze(trj, ids, cache=False)
+        for key in ['Rg', 'tan2XG', 'Asphericity', 'Acylindericity', 'Anistropy']:
+            assert np.allclose(results[key][:, m], single[key])
+
+    masses = np.where(np.arange(20) % 2, 2.0, 1.0)
+    rcms = (coords.reshape(-1, 3, 20, 3)*masses[:, None]).sum(axis=2)/masses.sum()
+    assert np.allclose(mdtrj.compute_molecule_rcm(trj), rcms)
+
+def test_selections_per_trajectory(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    coords = np.asarray(trj.coords, dtype=float)
+    selections = [trj.topology.select(types=1), [0, 5, 7], np.arange(20, 40)]
+
+    for atom_selections in [selections, [list(s) for s in selections]]:
+        results = mdtrj.gyration_analyze([trj]*3, atom_selections, cache=False)
+        for res, sel in zip(results['gyration tensor'], selections):
+            assert np.allclose(res, _gyration_tensors(coords[:, np.asarray(sel)], 
+                                                      np.ones(len(sel)))[0])
+
+    # The same atoms of every trajectory
+    for atom_selections in [selections[0], [0, 5, 7]]:
+        results = mdtrj.gyration_analyze([trj]*3, atom_selections, cache=False)
+        tensors, _ = _gyration_tensors(coords[:, np.asarray(atom_selections)], 
+                                       np.ones(len(atom_selections)))
+        for res in results['gyration tensor']:
+            assert np.allclose(res, tensors)
+
+    with pytest.raises(ValueError):
+        mdtrj.gyration_analyze([trj]*2, selections, cache=False)
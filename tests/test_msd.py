@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+def _msd(coords):
+    '''MSD of every atom by direct averaging over the time origins.'''
+
+    nframes = len(coords)
+    msd = np.zeros((nframes, coords.shape[1]))
+    for m in range(1, nframes):
+        msd[m] = ((coords[m:] - coords[:-m])**2).sum(axis=-1).mean(axis=0)
+
+    return msd
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_atom_msd(chains_gsd, lazy):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image', lazy=lazy)
+    coords = np.asarray(mdtrj.load(chains_gsd, parse_boundary='image').coords, dtype=float)
+    expected = _msd(coords)
+
+    lags, msd = mdtrj.compute_msd(trj, batch_size=7)
+    assert np.array_equal(lags, np.arange(30))
+    assert np.allclose(msd, expected)
+
+    mask = np.zeros(60, dtype=bool)
+    mask[[2, 9, 10, 11, 40]] = True
+    for atoms in [mask, [40, 2, 9], trj.topology.select(types=1)]:
+        ids = np.arange(60)[mask] if np.asarray(atoms).dtype == bool else np.asarray(atoms)
+        _, msd = mdtrj.compute_msd(trj, atoms, lags=[0, 1, 5, 29], batch_size=2)
+        assert np.allclose(msd, expected[[0, 1, 5, 29]][:, ids])
+
+def test_selection_and_molecule_msd(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    coords = np.asarray(trj.coords, dtype=float)
+    masses = np.where(np.arange(60) % 2, 2.0, 1.0)
+
+    rcm = (coords*masses[:, None]).sum(axis=1)/masses.sum()
+    _, msd = mdtrj.compute_msd(trj, mode='selection')
+    assert np.allclose(msd, _msd(rcm[:, None]))
+
+    chains = coords.reshape(30, 3, 20, 3)
+    rcms = (chains*masses[:20, None]).sum(axis=2)/masses[:20].sum()
+    lags, msd = mdtrj.compute_msd(trj, mode='molecule', lags='log', nlags=5)
+    assert np.allclose(msd, _msd(rcms)[lags])
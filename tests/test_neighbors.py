@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+def _brute_pairs(coords, box, cutoff, ids):
+    '''Pairs (i, j), i < j, of the atoms ids closer than cutoff, by all pair distances.'''
+
+    ids = np.unique(ids)
+    d = coords[ids, None] - coords[None, ids]
+    d -= box*np.round(d/box)
+    close = np.linalg.norm(d, axis=-1) < cutoff
+    i, j = np.nonzero(np.triu(close, k=1))
+
+    return {(a, b) for a, b in zip(ids[i], ids[j])}
+
+@pytest.fixture
+def trj(chains_gsd):
+    return mdtrj.load(chains_gsd)
+
+@pytest.mark.parametrize('cutoff', [1.2, 3.0])
+def test_pairs_match_brute_force(trj, cutoff):
+
+    coords = np.asarray(trj.coords, dtype=float)
+    box = trj.topology.box[:3]
+
+    pairs, distances = mdtrj.neighbor_search(trj, cutoff, return_distances=True)
+    assert len(pairs) == len(trj)
+    for frame, frame_pairs, frame_distances in zip(coords, pairs, distances):
+        assert np.all(frame_pairs[:, 0] < frame_pairs[:, 1])
+        assert set(map(tuple, frame_pairs.tolist())) == _brute_pairs(frame, box, cutoff, np.arange(60))
+        d = frame[frame_pairs[:, 0]] - frame[frame_pairs[:, 1]]
+        d -= box*np.round(d/box)
+        assert np.allclose(frame_distances, np.linalg.norm(d, axis=-1))
+
+def test_selections_keep_pair_order(trj):
+
+    coords = np.asarray(trj.coords, dtype=float)
+    box = trj.topology.box[:3]
+    ids = np.array([45, 2, 30, 7, 59, 11, 12, 40, 41, 0, 22])
+    mask = np.zeros(60, dtype=bool)
+    mask[ids] = True
+
+    for atoms in [ids, mask, list(ids[::-1])]:
+        pairs = mdtrj.neighbor_search(trj, 4.0, atoms)
+        for frame, frame_pairs in zip(coords, pairs):
+            assert np.all(frame_pairs[:, 0] < frame_pairs[:, 1])
+            assert set(map(tuple, frame_pairs.tolist())) == _brute_pairs(frame, box, 4.0, ids)
+
+def test_exclude_bonded(trj):
+
+    bonds = {tuple(bond) for bond in np.sort(trj.topology.bonds, axis=1).astype(int).tolist()}
+    ids = np.array([21, 20, 5, 4, 3])
+
+    for all_pairs, pairs in zip(mdtrj.neighbor_search(trj, 1.5, ids),
+                                mdtrj.neighbor_search(trj, 1.5, ids, exclude_bonded=True)):
+        expected = {pair for pair in map(tuple, all_pairs.tolist()) if pair not in bonds}
+        assert set(map(tuple, pairs.tolist())) == expected
+
+def test_contact_map(trj):
+
+    ids = np.array([50, 1, 2, 3, 20])
+    pairs = mdtrj.neighbor_search(trj, 2.0, ids)
+
+    expected = np.zeros((5, 5))
+    index = {atom : k for k, atom in enumerate(ids)}
+    for frame_pairs in pairs:
+        for i, j in frame_pairs.tolist():
+            expected[index[i], index[j]] += 1
+            expected[index[j], index[i]] += 1
+    expected /= len(trj)
+
+    assert np.allclose(mdtrj.compute_contact_map(trj, 2.0, ids), expected)
+    assert np.allclose(mdtrj.compute_contact_map(trj, 2.0, ids, sparse=True).toarray(), expected)
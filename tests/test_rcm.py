@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+from mdtrj.geometry.boundary import box_matrix
+
+def _wrap(coords, box):
+    h = box_matrix(box)
+    frac = coords @ np.linalg.inv(h).T
+
+    return (frac - np.floor(frac + 0.5)) @ h.T
+
+def _chains(box, nframes=4, nchains=3, length=12, seed=0):
+    '''Extended chains across the boundaries, unwrapped and wrapped, with masses 1 and 3.'''
+
+    rng = np.random.default_rng(seed)
+    steps = np.tile([0.8, 0.25, 0.1], (nframes, nchains, length, 1))
+    steps += rng.normal(scale=0.1, size=steps.shape)
+    steps[:, :, 0] = rng.uniform(-box[0]/2, box[0]/2, size=(nframes, nchains, 3))
+    unwrapped = np.cumsum(steps, axis=2).reshape(nframes, nchains*length, 3)
+
+    topo = mdtrj.Topology()
+    topo.atoms = nchains*length
+    topo.box = np.array(box, dtype=float)
+    topo.masses = np.where(np.arange(nchains*length) % 2, 3.0, 1.0)
+    topo.atom_types = np.zeros(nchains*length)
+    bonds = np.arange(nchains*length).reshape(nchains, length)
+    topo.bonds = np.stack([bonds[:, :-1].ravel(), bonds[:, 1:].ravel()], axis=1)
+
+    return unwrapped, mdtrj.Trajectory(_wrap(unwrapped, box), topo)
+
+def _same_point(a, b, box):
+    '''Equal positions up to lattice vectors.'''
+    return np.allclose(_wrap(a - b, box), 0, atol=1e-8)
+
+BOXES = [[12.6, 12.6, 12.6, 0, 0, 0], [12.6, 11.0, 13.0, 0.2, 0.1, -0.1]]
+
+@pytest.mark.parametrize('mass_weighted', [False, True])
+def test_rcm(mass_weighted):
+
+    unwrapped, trj = _chains(BOXES[0])
+    masses = trj.topology.masses if mass_weighted else np.ones(36)
+    ids = np.arange(12, 24)
+    expected = (unwrapped[:, ids]*masses[ids, None]).sum(axis=1)/masses[ids].sum()
+
+    unwrapped_trj = mdtrj.Trajectory(unwrapped, trj.topology)
+    assert np.allclose(mdtrj.compute_rcm(unwrapped_trj, ids, mass_weighted=mass_weighted), expected)
+
+@pytest.mark.parametrize('box', BOXES)
+@pytest.mark.parametrize('mass_weighted', [False, True])
+def test_periodic_rcm(box, mass_weighted):
+
+    unwrapped, trj = _chains(box)
+    masses = trj.topology.masses if mass_weighted else np.ones(36)
+
+    for m in range(3):
+        ids = np.arange(12*m, 12*(m+1))
+        expected = (unwrapped[:, ids]*masses[ids, None]).sum(axis=1)/masses[ids].sum()
+        # The chains are split by the boundaries
+        assert not np.allclose(trj.coords[:, ids], unwrapped[:, ids])
+
+        rcm = mdtrj.compute_rcm(trj, ids, periodic=True, mass_weighted=mass_weighted)
+        assert _same_point(rcm, expected, box)
+        assert np.allclose(_wrap(rcm, box), rcm)
+
+        rcms = mdtrj.compute_molecule_rcm(trj, periodic=True, mass_weighted=mass_weighted)
+        assert _same_point(rcms[:, m], expected, box)
+
+def test_periodic_rcm_needs_a_box():
+
+    _, trj = _chains(BOXES[0])
+    trj.topology.box = np.zeros(6)
+    with pytest.raises(ValueError):
+        mdtrj.compute_rcm(trj, periodic=True)
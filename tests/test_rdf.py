@@ -0,0 +1,66 @@
+import numpy as np
+
+import mdtrj
+
+from mdtrj.configuration.rdf import RDF
+
+def _brute_counts(coords, types, box, edges, type_pairs, ids):
+    '''Histograms of the unordered pairs of every type pair, by all pair distances.'''
+
+    counts = np.zeros((len(type_pairs), len(edges)-1))
+    index = {pair : p for p, pair in enumerate(type_pairs)}
+
+    for frame in coords:
+        i, j = np.triu_indices(len(ids), k=1)
+        d = frame[ids[i]] - frame[ids[j]]
+        d -= box*np.round(d/box)
+        r = np.linalg.norm(d, axis=-1)
+        for a, b, x in zip(types[ids[i]], types[ids[j]], r):
+            p = index.get((min(a, b), max(a, b)))
+            if p is not None and x < edges[-1]:
+                counts[p, np.searchsorted(edges, x, side='right')-1] += 1
+
+    return counts
+
+def test_counts_match_brute_force(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd)
+    coords = np.asarray(trj.coords, dtype=float)
+    types = np.asarray(trj.topology.atom_types).astype(int)
+    box = trj.topology.box[:3]
+
+    rdf = mdtrj.compute_rdf(trj, 5.0, nbins=25)
+    assert rdf.type_pairs == [(0, 0), (0, 1), (1, 1)]
+    assert rdf.nframes == 30
+    assert np.allclose(rdf.counts, _brute_counts(coords, types, box, rdf.edges, rdf.type_pairs,
+                                                 np.arange(60)))
+
+    ids = np.array([50, 3, 4, 17, 18, 19, 33])
+    rdf = mdtrj.compute_rdf(trj, 5.0, nbins=10, type_pairs=[(0, 1)], atom_selections=ids)
+    assert np.allclose(rdf.counts, _brute_counts(coords, types, box, rdf.edges, [(0, 1)], ids))
+
+def test_normalization_of_an_ideal_gas():
+
+    rng = np.random.default_rng(3)
+    box = 10.0
+    coords = rng.uniform(-box/2, box/2, size=(200, 100, 3))
+
+    topo = mdtrj.Topology()
+    topo.atoms = 100
+    topo.box = np.array([box, box, box, 0, 0, 0])
+    topo.atom_types = np.zeros(100)
+    topo.masses = 1.0
+    topo.bonds = np.zeros((0, 2))
+
+    rdf = mdtrj.compute_rdf(mdtrj.Trajectory(coords, topo), 4.0, nbins=8)
+    assert np.allclose(rdf.rdf[0][2:], 1, atol=0.05)
+
+def test_merge(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd)
+    whole = RDF(5.0, 20).accumulate(trj)
+    parts = RDF(5.0, 20).accumulate(trj[:10]).merge(RDF(5.0, 20).accumulate(trj[10:]))
+
+    assert parts.nframes == whole.nframes
+    assert np.allclose(parts.counts, whole.counts)
+    assert np.allclose(parts.rdf, whole.rdf)
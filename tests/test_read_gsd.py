@@ -0,0 +1,83 @@
+import pickle
+
+import gsd.hoomd
+import numpy as np
+import pytest
+
+import mdtrj
+
+def _raw(gsd_fn, attr='position'):
+    '''Per-frame arrays read frame by frame with gsd.hoomd.'''
+
+    with gsd.hoomd.open(gsd_fn, 'r') as f:
+        data = [getattr(frame.particles, attr) for frame in f]
+        images = [frame.particles.image for frame in f]
+        box = f[0].configuration.box[:3]
+
+    return np.array(data, dtype=float), np.array(images), box
+
+def test_lazy_matches_eager(chains_gsd):
+
+    positions, _, _ = _raw(chains_gsd)
+    velocities, _, _ = _raw(chains_gsd, 'velocity')
+
+    eager = mdtrj.load(chains_gsd, read_velo=True)
+    lazy = mdtrj.load(chains_gsd, read_velo=True, lazy=True, chunk_size=7)
+    assert lazy.is_lazy and not eager.is_lazy
+
+    assert np.allclose(eager.coords, positions)
+    assert np.allclose(np.asarray(lazy.coords), positions)
+    assert np.allclose(np.asarray(lazy.velos), velocities)
+    assert np.allclose(np.concatenate(list(lazy.iter_chunks())), positions)
+    assert [len(chunk) for chunk in lazy.coords.iter_chunks()] == [7, 7, 7, 7, 2]
+
+    assert np.allclose(lazy.coords[3], positions[3])
+    assert np.allclose(lazy.coords[-1, 5], positions[-1, 5])
+    assert np.allclose(np.asarray(lazy.coords[2:20:3]), positions[2:20:3])
+
+    part = mdtrj.load(chains_gsd, start=5, end=25, skip=2, lazy=True)
+    assert np.allclose(np.asarray(part.coords), positions[5:25:2])
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_atom_selection(chains_gsd, lazy):
+
+    positions, _, _ = _raw(chains_gsd)
+    ids = np.array([3, 4, 5, 30, 31])
+
+    trj = mdtrj.load(chains_gsd, atom_selection=ids, lazy=lazy)
+    assert trj.topology.atoms == 5
+    assert np.allclose(np.asarray(trj.coords), positions[:, ids])
+
+    trj = mdtrj.load(chains_gsd, atom_selection={'types' : 1}, lazy=lazy)
+    assert np.allclose(np.asarray(trj.coords), positions[:, 1::2])
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_unwrap(chains_gsd, lazy):
+
+    positions, images, box = _raw(chains_gsd)
+    expected = positions + images*box
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image', lazy=lazy)
+    assert np.allclose(np.asarray(trj.coords), expected, atol=1e-5)
+
+    # The first atom of every chain is inside the box, bonds give the same result
+    trj = mdtrj.load(chains_gsd, parse_boundary=True, lazy=lazy)
+    assert np.allclose(np.asarray(trj.coords), expected, atol=1e-4)
+
+def test_views_share_the_file(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, read_velo=True, lazy=True)
+    coords = trj.coords
+    views = [coords[i:i+5] for i in range(20)] + [coords[::2][1:]]
+
+    assert all(view.handle is coords.handle for view in views)
+    assert trj.velos.handle is coords.handle
+
+    expected = np.asarray(coords)
+    coords.close()
+    assert np.allclose(views[3][0], expected[3])
+    assert np.allclose(np.asarray(views[-1]), expected[::2][1:])
+
+    copy = pickle.loads(pickle.dumps(views[4]))
+    assert copy.handle is not coords.handle
+    assert np.allclose(np.asarray(copy), expected[4:9])
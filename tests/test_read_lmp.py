@@ -0,0 +1,82 @@
+import gsd.hoomd
+import numpy as np
+import pytest
+
+import mdtrj
+from mdtrj.core.read_lmp import lmp_to_gsd
+
+def write_dump(lmp_fn, nframes=6, natoms=8, box=10.0, seed=0):
+    '''A dump with unwrapped and image columns, atoms in shuffled order.'''
+
+    rng = np.random.default_rng(seed)
+    unwrapped = rng.uniform(-box, 2*box, size=(nframes, natoms, 3))
+    types = np.arange(natoms) % 2 + 1
+
+    with open(lmp_fn, 'w') as f:
+        for t in range(nframes):
+            images = np.floor(unwrapped[t]/box).astype(int)
+            wrapped = unwrapped[t] - images*box
+            f.write(f'ITEM: TIMESTEP\n{t*10}\nITEM: NUMBER OF ATOMS\n{natoms}\n'
+                    f'ITEM: BOX BOUNDS pp pp pp\n0 {box}\n0 {box}\n0 {box}\n'
+                    'ITEM: ATOMS id type x y z ix iy iz\n')
+            for i in rng.permutation(natoms):
+                f.write(f'{i+1} {types[i]} {wrapped[i, 0]:.6f} {wrapped[i, 1]:.6f} '
+                        f'{wrapped[i, 2]:.6f} {images[i, 0]} {images[i, 1]} {images[i, 2]}\n')
+
+    # Positions of the dump are relative to the lower bounds, the box is centered at 0
+    return lmp_fn, unwrapped - box/2
+
+@pytest.fixture
+def dump(tmp_path):
+    return write_dump(str(tmp_path/'dump.lammpstrj'))
+
+def test_load_lmp(dump):
+
+    lmp_fn, unwrapped = dump
+    box = 10.0
+
+    trj = mdtrj.load(lmp_fn, parse_boundary='image')
+    assert trj.topology.atoms == 8
+    assert np.allclose(trj.coords, unwrapped, atol=1e-5)
+
+    wrapped = mdtrj.load(lmp_fn, start=1, end=5, skip=2)
+    assert np.allclose(wrapped.coords, unwrapped[1:5:2] - box*np.floor(unwrapped[1:5:2]/box + 0.5),
+                       atol=1e-5)
+
+def test_convert_to_gsd(dump):
+
+    lmp_fn, unwrapped = dump
+
+    gsd_fn = mdtrj.convert_to_gsd(lmp_fn)
+    assert gsd_fn.endswith('dump.gsd')
+    trj = mdtrj.load(gsd_fn, parse_boundary='image')
+    assert np.allclose(trj.coords, unwrapped, atol=1e-5)
+    assert np.allclose(mdtrj.load(gsd_fn).coords, mdtrj.load(lmp_fn).coords, atol=1e-5)
+
+    with pytest.raises(FileExistsError):
+        mdtrj.convert_to_gsd(lmp_fn, start=2)
+    assert len(mdtrj.load(gsd_fn)) == 6
+
+    mdtrj.convert_to_gsd(lmp_fn, start=2, overwrite=True)
+    assert len(mdtrj.load(gsd_fn)) == 4
+
+def test_lmp_to_gsd_data(dump, tmp_path):
+
+    lmp_fn, unwrapped = dump
+    data_fn = str(tmp_path/'chains.data')
+    with open(data_fn, 'w') as f:
+        f.write('LAMMPS data file\n\n8 atoms\n3 bonds\n\nMasses\n\n1 1.5\n2 3.0 # B\n\n'
+                'Bonds\n\n1 1 1 2\n2 2 2 3\n3 1 7 8\n')
+
+    gsd_fn = str(tmp_path/'dump.gsd')
+    assert lmp_to_gsd(lmp_fn, gsd_fn, start=1, data_fn=data_fn) == 5
+
+    with gsd.hoomd.open(gsd_fn, 'r') as snaps:
+        assert len(snaps) == 5
+        for snap in snaps:
+            assert np.allclose(snap.particles.mass, np.where(np.arange(8) % 2, 3.0, 1.5))
+            assert np.array_equal(snap.bonds.group, [[0, 1], [1, 2], [6, 7]])
+            assert np.array_equal(snap.bonds.typeid, [0, 1, 0])
+            assert snap.bonds.types == ['1', '2']
+
+    assert np.allclose(mdtrj.load(gsd_fn, parse_boundary='image').coords, unwrapped[1:], atol=1e-5)
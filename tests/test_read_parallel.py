@@ -0,0 +1,101 @@
+import gc
+
+import gsd.hoomd
+import numpy as np
+import pytest
+
+import mdtrj
+from mdtrj.core import executor
+from mdtrj.core.executor import get_executor
+from mdtrj.core.read_gsd import read_gsd_file
+from mdtrj.core.read_lmp import read_lmp_file
+from mdtrj.core.read_parallel import read_parallel
+
+from conftest import write_chains
+from test_read_lmp import write_dump
+
+@pytest.fixture(scope='module')
+def pool():
+    yield get_executor(2)
+    executor._close_executor()
+
+def write_truncated(gsd_fn, src_fn, broken=4):
+    '''A copy of ``src_fn`` whose frame ``broken`` misses an atom.'''
+
+    with gsd.hoomd.open(src_fn, 'r') as src, gsd.hoomd.open(gsd_fn, 'w') as f:
+        for t, snap in enumerate(src):
+            natoms = snap.particles.N - (t == broken)
+            frame = gsd.hoomd.Frame()
+            frame.configuration.step = snap.configuration.step
+            frame.configuration.box = snap.configuration.box
+            frame.particles.N = natoms
+            frame.particles.types = snap.particles.types
+            for attr in ['typeid', 'mass', 'position', 'image', 'velocity']:
+                setattr(frame.particles, attr, getattr(snap.particles, attr)[:natoms])
+            frame.bonds.N = snap.bonds.N
+            frame.bonds.types = snap.bonds.types
+            frame.bonds.typeid = snap.bonds.typeid
+            frame.bonds.group = snap.bonds.group
+            f.append(frame)
+
+    return gsd_fn
+
+@pytest.mark.parametrize('options', [dict(),
+                                     dict(start=2, end=27, skip=3),
+                                     dict(unwrap_images=True),
+                                     dict(atom_selection=[5, 1, 40, 41, 42]),
+                                     dict(atom_selection={'types': 1}, start=-10, skip=2)])
+def test_gsd_matches_serial(pool, chains_gsd, options):
+
+    coords, velos, topo = read_parallel(chains_gsd, read_velo=True, **options)
+    ref_coords, ref_velos, ref_topo = read_gsd_file(chains_gsd, read_velo=True, **options)
+
+    assert np.array_equal(coords, ref_coords)
+    assert np.array_equal(velos, ref_velos)
+    assert topo.atoms == ref_topo.atoms
+    assert np.array_equal(np.asarray(topo.bonds), np.asarray(ref_topo.bonds))
+
+@pytest.mark.parametrize('options', [dict(),
+                                     dict(start=1, end=5, skip=2),
+                                     dict(unwrap_images=True),
+                                     dict(atom_selection=[6, 0, 3])])
+def test_lmp_matches_serial(pool, tmp_path, options):
+
+    lmp_fn, _ = write_dump(str(tmp_path/'dump.lammpstrj'), nframes=11)
+
+    coords, _, topo = read_parallel(lmp_fn, **options)
+    ref_coords, _, ref_topo = read_lmp_file(lmp_fn, **options)
+
+    assert np.array_equal(coords, ref_coords)
+    assert topo.atoms == ref_topo.atoms
+
+def test_load_parallel(pool, chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image', parallel=True, start=5)
+    ref = mdtrj.load(chains_gsd, parse_boundary='image', start=5)
+    assert np.array_equal(trj.coords, ref.coords)
+
+def test_lost_frames(pool, chains_gsd, tmp_path):
+
+    gsd_fn = write_truncated(str(tmp_path/'truncated.gsd'), chains_gsd)
+
+    with pytest.warns(UserWarning, match='Some atoms lost'):
+        coords, velos, _ = read_parallel(gsd_fn, read_velo=True)
+    with pytest.warns(UserWarning, match='Some atoms lost'):
+        ref_coords, ref_velos, _ = read_gsd_file(gsd_fn, read_velo=True)
+
+    assert coords.shape == (25, 60, 3)
+    assert np.array_equal(coords, ref_coords)
+    assert np.array_equal(velos, ref_velos)
+
+    # The frames kept are a view, the shared memory lives as long as it
+    gc.collect()
+    assert np.array_equal(coords, ref_coords)
+
+    # and the view is sent to the workers without a copy
+    trj = mdtrj.Trajectory(coords, mdtrj.load(chains_gsd).topology)
+    parallel = mdtrj.gyration_analyze([trj, trj], parallel=True, cache=False)
+    serial = mdtrj.gyration_analyze([trj, trj], parallel=False, cache=False)
+    for key in serial:
+        for res, exp in zip(parallel[key], serial[key]):
+            assert np.allclose(res, exp)
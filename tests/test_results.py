@@ -0,0 +1,62 @@
+import numpy as np
+
+import mdtrj
+
+from mdtrj.core.results import ResultCache, trajectory_fingerprint
+
+def _rg(coords):
+    coords = coords - coords.mean(axis=1, keepdims=True)
+    return np.sqrt((coords**2).sum(axis=-1).mean(axis=1))
+
+def test_rg_matches_brute_force(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    assert np.allclose(mdtrj.compute_rg(trj), _rg(np.asarray(trj.coords, dtype=float)))
+
+def test_in_place_edit_invalidates(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    before = mdtrj.compute_rg(trj)
+    key = trajectory_fingerprint(trj)
+
+    trj.coords[17] *= 3
+    assert trajectory_fingerprint(trj) != key
+    after = mdtrj.compute_rg(trj)
+    assert np.isclose(after[17], 3*before[17])
+    assert np.allclose(after, _rg(np.asarray(trj.coords, dtype=float)))
+
+def test_marked_edits_invalidate(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    before = mdtrj.compute_rg(trj)
+
+    # A single atom may not be in the sampled fingerprint
+    trj.coords[:, 21] += 5
+    trj.mark_modified()
+    assert np.allclose(mdtrj.compute_rg(trj), _rg(np.asarray(trj.coords, dtype=float)))
+    assert not np.allclose(mdtrj.compute_rg(trj), before)
+
+    trj.coords = trj.coords*2
+    assert np.allclose(mdtrj.compute_rg(trj), _rg(np.asarray(trj.coords, dtype=float)))
+
+def test_results_are_writable_copies(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    rg = mdtrj.compute_rg(trj)
+    expected = rg.copy()
+
+    rg -= 1
+    again = mdtrj.compute_rg(trj)
+    assert np.allclose(again, expected)
+    again[:] = 0
+    assert np.allclose(mdtrj.compute_rg(trj), expected)
+
+def test_lru_eviction():
+
+    cache = ResultCache(max_entries=2)
+    for i in range(3):
+        cache.put(('a', i), np.full(4, i))
+
+    assert ('a', 0) not in cache
+    assert np.array_equal(cache.get(('a', 2)), np.full(4, 2))
+    assert cache.get(('a', 0), 'missed') == 'missed'
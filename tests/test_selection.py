@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+from mdtrj.core.selection import Selection, as_index
+
+def test_as_index_forms():
+
+    assert as_index(None) is None
+    assert as_index([]) is None
+    assert as_index([2, 3, 4]) == slice(2, 5)
+    assert as_index(3) == slice(3, 4)
+    assert as_index(np.int64(0)) == slice(0, 1)
+    assert np.array_equal(as_index([4, 1]), [4, 1])
+
+    mask = np.array([False, True, False, True])
+    assert np.array_equal(as_index(mask), [1, 3])
+    assert as_index(np.array([False, True, True, False])) == slice(1, 3)
+    assert len(as_index(np.zeros(4, dtype=bool))) == 0
+
+    with pytest.raises(TypeError):
+        as_index([0.5, 1.5])
+
+def test_selection_forms_agree(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd, parse_boundary='image')
+    sel = trj.topology.select(types=1)
+    ids = np.arange(1, 60, 2)
+
+    assert np.array_equal(sel.indices, ids)
+    assert isinstance(sel, Selection)
+
+    expected = mdtrj.gyration_analyze(trj, ids, cache=False)['Rg']
+    for atoms in [sel, sel.mask, list(ids)]:
+        assert np.allclose(mdtrj.gyration_analyze(trj, atoms, cache=False)['Rg'], expected)
+
+    coords = np.asarray(trj.coords, dtype=float)
+    masses = np.full(60, 2.0)
+    rcm = (coords[:, ids]*masses[ids, None]).sum(axis=1)/masses[ids].sum()
+    for atoms in [sel, sel.mask, ids]:
+        assert np.allclose(mdtrj.compute_rcm(trj, atoms), rcm)
+
+def test_selection_algebra(chains_gsd):
+
+    topo = mdtrj.load(chains_gsd).topology
+    a = topo.select(index_range=(0, 10))
+    b = topo.select(types=0)
+
+    assert np.array_equal((a & b).indices, np.arange(0, 10, 2))
+    assert np.array_equal((a | b).indices, np.union1d(np.arange(10), np.arange(0, 60, 2)))
+    assert np.array_equal((a - b).indices, np.arange(1, 10, 2))
+    assert np.array_equal((~a).indices, np.arange(10, 60))
+    assert np.array_equal((a & (np.arange(60) < 5)).indices, np.arange(5))
+    assert topo.select(bonded_to=[0], hops=2).indices.tolist() == [0, 1, 2]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import mdtrj
+
+@pytest.fixture(params=[False, True], ids=['eager', 'lazy'])
+def trj(request, chains_gsd):
+    return mdtrj.load(chains_gsd, lazy=request.param, read_velo=True)
+
+@pytest.fixture
+def reference(chains_gsd):
+    trj = mdtrj.load(chains_gsd, read_velo=True)
+    return np.array(trj.coords), np.array(trj.velos)
+
+def test_atom_keys(trj, reference):
+
+    coords, velos = reference
+    mask = np.zeros(60, dtype=bool)
+    mask[[3, 7, 20]] = True
+
+    for key, ids in [(3, [3]),
+                     (np.int64(-1), [59]),
+                     (mask, [3, 7, 20]),
+                     (np.array([20, 3, 7]), [20, 3, 7]),
+                     ([5, 6, 7], [5, 6, 7]),
+                     (slice(10, 20), list(range(10, 20))),
+                     (trj.topology.select(types=1), list(range(1, 60, 2)))]:
+        view = trj[::3, key]
+        assert view.coords.shape == (10, len(ids), 3)
+        assert view.topology.atoms == len(ids)
+        assert np.allclose(np.asarray(view.coords), coords[::3][:, ids])
+        assert np.allclose(np.asarray(view.velos), velos[::3][:, ids])
+
+def test_empty_atom_key(trj):
+
+    view = trj[:, []]
+    assert view.coords.shape == (30, 0, 3)
+    assert view.topology.atoms == 0
+
+def test_subset_topology(trj):
+
+    view = trj[:, np.arange(5, 15)]
+    assert np.array_equal(view.topology.bonds, np.stack([np.arange(9), np.arange(1, 10)], axis=1))
+
+def test_frame_keys(trj, reference):
+
+    coords, _ = reference
+    frames = np.array([4, 1, 1, 20])
+
+    assert np.allclose(np.asarray(trj[5].coords), coords[5:6])
+    assert np.allclose(np.asarray(trj[-1].coords), coords[-1:])
+    assert np.allclose(np.asarray(trj[frames].coords), coords[frames])
+    assert np.allclose(np.asarray(trj[frames][::2].coords), coords[frames][::2])
+    assert np.allclose(np.asarray(trj[coords[:, 0, 0] > 0].coords), coords[coords[:, 0, 0] > 0])
+
+def test_copy_is_independent(chains_gsd):
+
+    trj = mdtrj.load(chains_gsd)
+    view = trj[2:4]
+    copy = trj[2:4].copy()
+
+    view.coords[0] += 1
+    assert np.array_equal(trj.coords[2], view.coords[0])
+    assert not np.array_equal(copy.coords[0], view.coords[0])
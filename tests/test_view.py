@@ -0,0 +1,71 @@
+import numpy as np
+
+import mdtrj
+
+from mdtrj.core.view import GatheredArray, ConcatenatedArray, take
+
+from conftest import write_chains
+
+def test_take_on_arrays():
+
+    arr = np.arange(10*4*3, dtype=float).reshape(10, 4, 3)
+
+    view = take(arr, slice(2, 8))
+    assert isinstance(view, np.ndarray) and np.shares_memory(view, arr)
+
+    for frames, atoms in [(np.array([7, 2, 2]), None),
+                          (slice(None, None, 3), np.array([3, 0])),
+                          (np.arange(10) % 2 == 0, slice(1, 3))]:
+        view = take(arr, frames, atoms)
+        expected = arr[frames] if atoms is None else arr[frames][:, atoms]
+        assert isinstance(view, GatheredArray)
+        assert view.shape == expected.shape
+        assert np.array_equal(np.asarray(view), expected)
+        assert np.array_equal(np.concatenate(list(view.iter_chunks(2))), expected)
+        assert np.array_equal(np.asarray(view[::-1]), expected[::-1])
+        assert np.array_equal(view[1], expected[1])
+
+def test_concatenated_keys():
+
+    arrays = [np.full((n, 2, 3), i, dtype=float) + np.arange(n)[:, None, None]/10
+              for i, n in enumerate([4, 3, 5])]
+    concat = ConcatenatedArray(arrays, chunk_size=2)
+    expected = np.concatenate(arrays)
+
+    assert concat.shape == expected.shape
+    assert np.array_equal(np.asarray(concat), expected)
+    assert np.array_equal(concat[5], expected[5])
+    assert np.array_equal(concat[-1, 1], expected[-1, 1])
+
+    view = concat[2:9]
+    assert isinstance(view, ConcatenatedArray)
+    assert np.array_equal(np.asarray(view), expected[2:9])
+
+    for key in [slice(None, None, 2), slice(None, None, -1), np.array([9, 0, 4, 4]),
+                np.arange(12) > 6]:
+        view = concat[key]
+        assert isinstance(view, GatheredArray)
+        assert np.array_equal(np.asarray(view), expected[key])
+        assert np.array_equal(np.concatenate(list(view.iter_chunks())), expected[key])
+
+    view = take(concat, slice(1, None, 3), np.array([1]))
+    assert isinstance(view, GatheredArray)
+    assert np.array_equal(np.asarray(view), expected[1::3][:, [1]])
+
+def test_load_segments(tmp_path):
+
+    fns = [write_chains(str(tmp_path/'s0.gsd'), nframes=10, seed=0),
+           write_chains(str(tmp_path/'s1.gsd'), nframes=10, seed=1, first_step=900),
+           write_chains(str(tmp_path/'s2.gsd'), nframes=10, seed=2, first_step=1800)]
+    parts = [np.asarray(mdtrj.load(fn, parse_boundary='image').coords) for fn in fns]
+    # The first frame of a restart repeats the last frame of the previous segment
+    expected = np.concatenate([parts[0], parts[1][1:], parts[2][1:]])
+
+    trj = mdtrj.load_segments(fns, parse_boundary='image')
+    assert trj.is_lazy
+    assert len(trj) == 28
+    assert np.allclose(np.asarray(trj.coords), expected)
+    assert np.allclose(np.asarray(trj[::3].coords), expected[::3])
+    assert np.allclose(np.asarray(trj[[27, 0, 12]].coords), expected[[27, 0, 12]])
+    assert np.allclose(mdtrj.compute_rcm(trj[1::2]),
+                       mdtrj.compute_rcm(mdtrj.Trajectory(expected[1::2], trj.topology)))